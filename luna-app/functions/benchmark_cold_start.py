@@ -0,0 +1,88 @@
+# Cold-start benchmark for the Firebase functions
+# Every run is a fresh interpreter that imports main.py and answers one
+# request, as a new function instance does. Two layouts are compared:
+#   eager - every model loads at import (the old layout, PRELOAD_MODELS=all)
+#   lazy  - only the models the route needs load, on first use
+#
+# Run from this directory (models/ as deployed, pickles or bundles):
+#   python benchmark_cold_start.py --runs 5 --json cold_start.json
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Route -> body of the first request a new instance answers
+ROUTES = {
+    '/health': {},
+    '/predict/cycle-length': {'Age': 30, 'BMI': 22.5, 'LengthofMenses': 5},
+    '/predict/menses-length': {'Age': 30, 'BMI': 22.5, 'LengthofCycle': 28},
+    '/predict/next-period': {'current_cycle_day': 10, 'Age': 30, 'cycles_logged': 3},
+    '/detect/irregular-cycle': {'recent_cycle_lengths': [28, 30, 27], 'age': 30, 'bmi': 22.5},
+    '/predict/symptoms': {'cycle_day': 2, 'cycle_length': 28, 'menses_length': 5, 'age': 30, 'bmi': 22.5},
+}
+
+LAYOUTS = {'eager': 'all', 'lazy': ''}
+
+# Runs in the child: import main, answer one request through the router
+CHILD = '''
+import json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+import flask
+path, body = sys.argv[1], json.loads(sys.argv[2])
+with flask.Flask('bench').test_request_context(path, method='POST', json=body):
+    status = main.luna(flask.request)[1]
+answered = time.perf_counter()
+with open('/proc/self/statm') as f:
+    rss = int(f.read().split()[1]) * 4096
+print(json.dumps({'import_ms': (imported - start) * 1000, 'request_ms': (answered - imported) * 1000,
+                  'status': status, 'rss_mb': rss / 1e6, 'models_loaded': sorted(main._models)}))
+'''
+
+
+def cold_start(layout, path, body):
+    env = dict(os.environ, PRELOAD_MODELS=LAYOUTS[layout], PYTHONDONTWRITEBYTECODE='1')
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', CHILD, path, json.dumps(body)],
+                            capture_output=True, text=True, env=env, check=True)
+    total = (time.perf_counter() - start) * 1000
+    run = json.loads(result.stdout.strip().splitlines()[-1])
+    run['total_ms'] = total
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold-start time per route: eager vs lazy model loading')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--json', help='also write the results here')
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'route':<26}{'layout':<8}{'total ms':>10}{'import ms':>11}{'request ms':>12}{'RSS MB':>9}  models")
+    for path, body in ROUTES.items():
+        for layout in LAYOUTS:
+            runs = [cold_start(layout, path, body) for _ in range(args.runs)]
+            summary = {
+                'route': path,
+                'layout': layout,
+                'status': runs[0]['status'],
+                'models_loaded': runs[0]['models_loaded'],
+                **{key: round(statistics.median(run[key] for run in runs), 1)
+                   for key in ('total_ms', 'import_ms', 'request_ms', 'rss_mb')},
+            }
+            results.append(summary)
+            print(f"{path:<26}{layout:<8}{summary['total_ms']:>10.0f}{summary['import_ms']:>11.0f}"
+                  f"{summary['request_ms']:>12.0f}{summary['rss_mb']:>9.0f}  {len(summary['models_loaded'])}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'runs': args.runs, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
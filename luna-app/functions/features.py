@@ -0,0 +1,328 @@
+# 🧬 Luna feature schemas
+# One declarative spec per model: which payload fields it reads (with their
+# defaults), which columns are derived from them, and the exact column order
+# the model was trained on.
+#
+# Used by the training scripts in models/, the Cloud Run API (app.py) and the
+# Firebase functions (luna-app/functions/main.py), so a feature is defined in
+# exactly one place.
+
+import math
+
+import numpy as np
+
+
+class Field:
+    """A raw input column, read from a request payload"""
+
+    def __init__(self, name, key=None, default=0, read=None):
+        self.name = name
+        self.key = key or name
+        self.default = default
+        # Custom reader for fields that are not a plain key lookup
+        self.read = read or (lambda data: data.get(self.key, self.default))
+
+
+class Derived:
+    """A column computed from fields and earlier derived columns
+
+    `compute` receives a dict of values - plain floats for a single row,
+    float64 arrays for a batch - and must only use operators and NumPy
+    functions, so the same expression serves both.
+    """
+
+    def __init__(self, name, compute):
+        self.name = name
+        self.compute = compute
+
+
+class FeatureSpec:
+    """Compiled feature builder for one model"""
+
+    def __init__(self, name, fields, columns):
+        self.name = name
+        self.fields = fields
+        self.derived = [column for column in columns if isinstance(column, Derived)]
+        self.columns = [column if isinstance(column, str) else column.name
+                        for column in columns]
+        self._readers = [field.read for field in fields]
+        self._field_names = [field.name for field in fields]
+        self._named_readers = list(zip(self._field_names, self._readers))
+        self._positions = {column: i for i, column in enumerate(self.columns)}
+
+        missing = set(self.columns) - set(self._field_names) - {d.name for d in self.derived}
+        if missing:
+            raise ValueError(f"{name}: columns without a field or derivation: {sorted(missing)}")
+
+    def index(self, column):
+        """Position of a column in the model's feature order"""
+        return self._positions[column]
+
+    def row(self, data):
+        """(1, n_features) float32 matrix for a single payload
+
+        Raises ValueError/TypeError when the payload cannot be scored.
+        """
+        # Plain floats: NumPy's per-call overhead would dominate a single row
+        values = {name: float(read(data)) for name, read in self._named_readers}
+        for column in self.derived:
+            values[column.name] = float(column.compute(values))
+
+        features = np.array([[values[column] for column in self.columns]], dtype=np.float32)
+        if not np.isfinite(features).all():
+            raise ValueError(f'Non-finite feature value for {self.name}')
+        return features
+
+    def rows(self, payloads):
+        """Batch version of row()
+
+        Returns (features, positions, errors): one feature row per valid payload,
+        the input index of each of those rows, and {input index: message} for
+        payloads that could not be scored.
+        """
+        raw = np.empty((len(payloads), len(self._readers)), dtype=np.float64)
+        valid = np.ones(len(payloads), dtype=bool)
+        errors = {}
+
+        for i, data in enumerate(payloads):
+            try:
+                if not isinstance(data, dict):
+                    raise ValueError('Each item must be a JSON object')
+                raw[i] = [float(read(data)) for read in self._readers]
+            except Exception as e:
+                valid[i] = False
+                errors[i] = str(e)
+
+        positions = np.flatnonzero(valid)
+        features = self._assemble(raw[positions])
+
+        finite = np.isfinite(features).all(axis=1)
+        if not finite.all():
+            for i in positions[~finite]:
+                errors[int(i)] = f'Non-finite feature value for {self.name}'
+            positions, features = positions[finite], features[finite]
+
+        return features, positions.tolist(), errors
+
+    def from_columns(self, columns, dtype=np.float32):
+        """Feature matrix from named field columns (e.g. a training DataFrame)"""
+        raw = np.column_stack([np.asarray(columns[name], dtype=np.float64)
+                               for name in self._field_names])
+        return self._assemble(raw, dtype)
+
+    def frame(self, df):
+        """Training helper: model-ordered DataFrame built from the field columns of `df`"""
+        import pandas as pd
+        return pd.DataFrame(self.from_columns(df, dtype=np.float64),
+                            columns=self.columns, index=df.index)
+
+    def check(self, model):
+        """Make sure a fitted model expects exactly this column order"""
+        expected = getattr(model, 'feature_names_in_', None)
+        if expected is not None and list(expected) != self.columns:
+            raise ValueError(f'{self.name}: model expects {list(expected)}, spec builds {self.columns}')
+
+    def _assemble(self, raw, dtype=np.float32):
+        values = {name: raw[:, j] for j, name in enumerate(self._field_names)}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for column in self.derived:
+                values[column.name] = np.broadcast_to(
+                    np.asarray(column.compute(values), dtype=np.float64), raw.shape[:1])
+
+        features = np.empty((raw.shape[0], len(self.columns)), dtype=dtype)
+        for j, column in enumerate(self.columns):
+            features[:, j] = values[column]
+        return features
+
+
+# ===================================
+# CYCLE LENGTH (train_cycle_length.py)
+# ===================================
+
+CYCLE_LENGTH = FeatureSpec('cycle_length', [
+    Field('LengthofMenses', default=5),
+    Field('Age', default=25),
+    Field('BMI', default=25),
+    Field('EstimatedDayofOvulation', default=14),
+    Field('LengthofLutealPhase', default=14),
+    Field('TotalDaysofFertility', default=6),
+], [
+    'LengthofMenses', 'Age', 'BMI', 'EstimatedDayofOvulation',
+    'LengthofLutealPhase', 'TotalDaysofFertility'
+])
+
+# ===================================
+# MENSES LENGTH (train_menses_length.py)
+# ===================================
+
+MENSES_LENGTH = FeatureSpec('menses_length', [
+    Field('Age', default=25),
+    Field('BMI', default=25),
+    Field('LengthofCycle', default=28),
+    Field('MeanBleedingIntensity', default=5),
+    Field('EstimatedDayofOvulation', default=14),
+], [
+    'Age', 'BMI', 'LengthofCycle', 'MeanBleedingIntensity', 'EstimatedDayofOvulation'
+])
+
+# ===================================
+# IRREGULAR CYCLE (irregular_cycle_detector.py)
+# ===================================
+
+# A user's stored statistics (user_stats.CycleStats, put in the payload as
+# 'cycle_stats' by the API) answer these without going over the history
+
+def _recent_cycle_lengths(data):
+    # An empty history falls back to a textbook 28-day cycle
+    return data.get('recent_cycle_lengths') or [28]
+
+def _last_cycle_length(data):
+    stats = data.get('cycle_stats')
+    if stats is not None:
+        return stats.last_cycle_length
+    return _recent_cycle_lengths(data)[0]
+
+def _mean_cycle_length(data):
+    stats = data.get('cycle_stats')
+    if stats is not None:
+        return stats.recent_stats.mean
+    lengths = _recent_cycle_lengths(data)
+    return sum(lengths) / len(lengths)
+
+def _cycle_variability(data):
+    stats = data.get('cycle_stats')
+    if stats is not None:
+        return stats.recent_stats.std()
+    lengths = _recent_cycle_lengths(data)
+    if len(lengths) < 2:
+        return 0
+    mean = sum(lengths) / len(lengths)
+    return math.sqrt(sum((length - mean) ** 2 for length in lengths) / len(lengths))
+
+IRREGULAR_CYCLE = FeatureSpec('irregular_cycle', [
+    Field('CycleLength', read=_last_cycle_length),
+    Field('MeanCycleLength', read=_mean_cycle_length),
+    Field('CycleVariability', read=_cycle_variability),   # std of recent lengths
+    Field('CycleWithPeak', 'cycle_with_peak', 1),
+    Field('LutealPhaseLength', 'luteal_phase_length', 14),
+    Field('MensesLength', 'menses_length', 5),
+    Field('UnusualBleeding', 'unusual_bleeding', 0),
+    Field('BleedingIntensity', 'bleeding_intensity', 5),
+    Field('Age', 'age', 25),
+    Field('BMI', 'bmi', 25),
+    Field('NumberPregnancies', 'number_pregnancies', 0),
+], [
+    'CycleLength', 'MeanCycleLength', 'CycleVariability',
+    Derived('CycleTooShort', lambda v: v['CycleLength'] < 21),
+    Derived('CycleTooLong', lambda v: v['CycleLength'] > 35),
+    'CycleWithPeak',
+    Derived('NoOvulationDetected', lambda v: v['CycleWithPeak'] == 0),
+    'LutealPhaseLength',
+    Derived('LutealPhaseTooShort', lambda v: v['LutealPhaseLength'] < 10),
+    Derived('LutealPhaseTooLong', lambda v: v['LutealPhaseLength'] > 16),
+    'MensesLength',
+    Derived('MensesTooShort', lambda v: v['MensesLength'] < 3),
+    Derived('MensesTooLong', lambda v: v['MensesLength'] > 7),
+    'UnusualBleeding', 'BleedingIntensity',
+    Derived('VeryHeavyBleeding', lambda v: v['BleedingIntensity'] > 10),
+    Derived('VeryLightBleeding', lambda v: v['BleedingIntensity'] < 3),
+    'Age', 'BMI',
+    Derived('UnderweightBMI', lambda v: v['BMI'] < 18.5),
+    Derived('OverweightBMI', lambda v: v['BMI'] > 25),
+    Derived('ObeseBMI', lambda v: v['BMI'] > 30),
+    'NumberPregnancies',
+    Derived('NullipariousAdult', lambda v: (v['Age'] > 30) & (v['NumberPregnancies'] == 0)),
+    Derived('TeenageYears', lambda v: v['Age'] < 20),
+    Derived('Perimenopause', lambda v: v['Age'] > 40),
+    Derived('PCOSRiskScore', lambda v: (
+        v['CycleTooLong'] + v['NoOvulationDetected'] + v['ObeseBMI'] + v['UnusualBleeding']
+    )),
+    Derived('HormonalImbalanceScore', lambda v: (
+        v['CycleVariability'] / 5 + v['LutealPhaseTooShort'] +
+        v['VeryHeavyBleeding'] + v['VeryLightBleeding']
+    )),
+])
+
+# ===================================
+# DAILY SYMPTOMS (symptom_predictor.py)
+# ===================================
+
+def _period_day(v):
+    day, menses = v['cycle_day'], v['menses_length']
+    return np.where(day <= menses, np.minimum(day, menses), 0)
+
+SYMPTOMS = FeatureSpec('symptoms', [
+    Field('cycle_day', default=1),
+    Field('cycle_length', default=28),
+    Field('menses_length', default=5),
+    Field('age', default=25),
+    Field('bmi', default=25),
+    Field('pregnancies', default=0),
+    Field('mean_bleeding_intensity', default=5),
+], [
+    'cycle_day', 'cycle_length', 'menses_length',
+    Derived('days_since_period_start', lambda v: np.maximum(0, v['cycle_day'] - 1)),
+    Derived('days_until_next_period', lambda v: np.maximum(0, v['cycle_length'] - v['cycle_day'])),
+    # Cycle phase flags
+    Derived('is_period_phase', lambda v: v['cycle_day'] <= v['menses_length']),
+    Derived('is_follicular_phase', lambda v: (v['menses_length'] < v['cycle_day']) &
+            (v['cycle_day'] <= v['cycle_length'] - 14 - 3)),
+    Derived('is_ovulation_phase', lambda v: (v['cycle_length'] - 14 - 3 < v['cycle_day']) &
+            (v['cycle_day'] <= v['cycle_length'] - 14 + 3)),
+    Derived('is_luteal_phase', lambda v: (v['cycle_length'] - 14 + 3 < v['cycle_day']) &
+            (v['cycle_day'] <= v['cycle_length'] - 5)),
+    Derived('is_pms_phase', lambda v: v['cycle_day'] > v['cycle_length'] - 5),
+    # Period day specific
+    Derived('period_day', _period_day),
+    Derived('period_day_normalized', lambda v: np.where(
+        (v['cycle_day'] <= v['menses_length']) & (v['menses_length'] > 0),
+        _period_day(v) / np.where(v['menses_length'] > 0, v['menses_length'], 1), 0)),
+    'age', 'bmi', 'pregnancies', 'mean_bleeding_intensity',
+    # Cycle position ratios
+    Derived('cycle_day_ratio', lambda v: v['cycle_day'] / v['cycle_length']),
+    Derived('ovulation_proximity', lambda v: (
+        np.abs(v['cycle_day'] - (v['cycle_length'] - 14)) / v['cycle_length'])),
+    # Age buckets
+    Derived('is_teenager', lambda v: v['age'] < 20),
+    Derived('is_adult', lambda v: (20 <= v['age']) & (v['age'] <= 35)),
+    Derived('is_older_adult', lambda v: v['age'] > 35),
+])
+
+# ===================================
+# NEXT PERIOD BACKUP MODEL (next_period_predictor.py)
+# ===================================
+
+NEXT_PERIOD = FeatureSpec('next_period', [
+    # Cycle the ratios are taken against: the current cycle in training data,
+    # the user's mean cycle when serving
+    Field('CurrentCycleLength',
+          read=lambda data: data.get('current_cycle_length', data.get('mean_cycle_length', 28))),
+    Field('MeanCycleLength', 'mean_cycle_length', 28),
+    Field('CycleVariability', 'cycle_variability', 2),
+    Field('EstimatedDayofOvulation',
+          read=lambda data: data.get('estimated_day_of_ovulation', data.get('mean_cycle_length', 28) - 14)),
+    Field('LutealPhaseLength', 'luteal_phase_length', 14),
+    Field('MensesLength', 'menses_length', 5),
+    Field('Age', 'age', 25),
+    Field('BMI', 'bmi', 25),
+    Field('NumberPregnancies', 'number_pregnancies', 0),
+    Field('CycleWithPeak', 'cycle_with_peak', 1),
+    Field('UnusualBleeding', 'unusual_bleeding', 0),
+], [
+    'MeanCycleLength', 'CycleVariability', 'EstimatedDayofOvulation',
+    'LutealPhaseLength', 'MensesLength', 'Age', 'BMI', 'NumberPregnancies',
+    'CycleWithPeak', 'UnusualBleeding',
+    Derived('OvulationTiming', lambda v: v['EstimatedDayofOvulation'] / v['CurrentCycleLength']),
+    Derived('LutealRatio', lambda v: v['LutealPhaseLength'] / v['CurrentCycleLength']),
+    Derived('MensesRatio', lambda v: v['MensesLength'] / v['CurrentCycleLength']),
+    Derived('AgeAdjustedCycle', lambda v: v['CurrentCycleLength'] * (v['Age'] / 28)),
+    Derived('FertilityRatio', lambda v: 6 / v['CurrentCycleLength']),   # 6 fertile days
+])
+
+SPECS = {
+    'cycle_length': CYCLE_LENGTH,
+    'menses_length': MENSES_LENGTH,
+    'irregular_cycle': IRREGULAR_CYCLE,
+    'symptom_predictor': SYMPTOMS,
+    'next_period': NEXT_PERIOD,
+}
@@ -2,25 +2,61 @@
 # Windows-compatible version (no emojis)
 
 import functions_framework
-import joblib
-import pandas as pd
 import numpy as np
 from flask import jsonify
 import json
+import os
+import threading
+import warnings
 
-# Load ALL your world-class models once when function starts
-print("Loading Luna's world-class ML models...")
+# Shared feature specs (copy of luna-ml-api/features.py, kept current by sync_shared.py)
+from features import CYCLE_LENGTH, MENSES_LENGTH, IRREGULAR_CYCLE, SYMPTOMS
+# Model bundles when deployed next to the pickles, else the pickles (copy of luna-ml-api/model_bundle.py)
+from model_bundle import bundle_path, load_model
 
-# Your champion models (the best ones!)
-cycle_model = joblib.load('models/cycle_length_model_minimal.pkl')  # 0.09 MAE champion!
-menses_model = joblib.load('models/menses_length_model.pkl')        # 0.26 MAE star!
+# Rows come from the feature specs, which own the column order
+warnings.filterwarnings('ignore', message='X does not have valid feature names')
 
-# Your health and symptom models
-irregular_model = joblib.load('models/irregular_cycle_detector.pkl')  # Perfect AUC!
-symptom_model = joblib.load('models/symptom_predictor.pkl')          # 90%+ accuracy!
-next_period_model = joblib.load('models/next_period_predictor.pkl')  # Backup model
+# Models load on first use, so an instance only pays for the models its routes need
+MODELS_DIR = os.environ.get('MODELS_DIR', 'models')
+MODEL_FILES = {
+    'cycle_length': 'cycle_length_model_minimal.pkl',    # 0.09 MAE champion!
+    'menses_length': 'menses_length_model.pkl',          # 0.26 MAE star!
+    'irregular_cycle': 'irregular_cycle_detector.pkl',   # Perfect AUC!
+    'symptom_predictor': 'symptom_predictor.pkl',        # 90%+ accuracy!
+    'next_period': 'next_period_predictor.pkl',          # Backup model
+}
+# Lite variants (models/lite_models.py) to serve instead, e.g. 'symptom_predictor' or
+# 'all', for memory-constrained instances; a model without a lite file serves the full one
+LITE_MODELS = os.environ.get('LITE_MODELS', '')
+_models = {}
+_model_lock = threading.Lock()
 
-print("All 5 world-class models loaded successfully!")
+def model_path(name):
+    """Where the named model is deployed: its lite variant when configured and present"""
+    path = os.path.join(MODELS_DIR, MODEL_FILES[name])
+    if LITE_MODELS == 'all' or name in LITE_MODELS.split(','):
+        lite = path.replace('.pkl', '.lite.pkl')
+        if os.path.exists(lite) or os.path.exists(bundle_path(lite)):
+            return lite
+    return path
+
+def get_model(name):
+    """The named model, loaded the first time any route asks for it"""
+    model = _models.get(name)
+    if model is None:
+        with _model_lock:
+            if name not in _models:
+                print(f"Loading {name}...")
+                _models[name] = load_model(model_path(name))
+            model = _models[name]
+    return model
+
+# Models to load at import instead (e.g. 'cycle_length,symptom_predictor', or 'all'),
+# for deployments that keep instances warm and would rather pay at startup
+PRELOAD_MODELS = os.environ.get('PRELOAD_MODELS', '')
+for _name in (MODEL_FILES if PRELOAD_MODELS == 'all' else [n for n in PRELOAD_MODELS.split(',') if n]):
+    get_model(_name)
 
 @functions_framework.http
 def predict_cycle_length(request):
@@ -41,20 +77,10 @@ def predict_cycle_length(request):
         data = request.get_json()
         
         # Use your champion cycle model's exact features
-        features = pd.DataFrame([[
-            data.get('LengthofMenses', 5),
-            data.get('Age', 25),
-            data.get('BMI', 25),
-            data.get('EstimatedDayofOvulation', 14),
-            data.get('LengthofLutealPhase', 14),
-            data.get('TotalDaysofFertility', 6)
-        ]], columns=[
-            'LengthofMenses', 'Age', 'BMI', 'EstimatedDayofOvulation', 
-            'LengthofLutealPhase', 'TotalDaysofFertility'
-        ])
+        features = CYCLE_LENGTH.row(data)
         
         # Use YOUR 0.09 MAE champion model!
-        prediction = cycle_model.predict(features)[0]
+        prediction = get_model('cycle_length').predict(features)[0]
         
         return jsonify({
             'predicted_cycle_length': round(prediction, 1),
@@ -89,18 +115,10 @@ def predict_menses_length(request):
         data = request.get_json()
         
         # Use your excellent menses model's exact features
-        features = pd.DataFrame([[
-            data.get('Age', 25),
-            data.get('BMI', 25),
-            data.get('LengthofCycle', 28),
-            data.get('MeanBleedingIntensity', 5),
-            data.get('EstimatedDayofOvulation', 14)
-        ]], columns=[
-            'Age', 'BMI', 'LengthofCycle', 'MeanBleedingIntensity', 'EstimatedDayofOvulation'
-        ])
+        features = MENSES_LENGTH.row(data)
         
         # Use YOUR 0.26 MAE excellent model!
-        prediction = menses_model.predict(features)[0]
+        prediction = get_model('menses_length').predict(features)[0]
         
         return jsonify({
             'predicted_menses_length': round(prediction, 1),
@@ -136,20 +154,10 @@ def predict_next_period(request):
         current_cycle_day = data.get('current_cycle_day', 1)
         
         # Use your CHAMPION cycle length model
-        cycle_features = pd.DataFrame([[
-            data.get('LengthofMenses', 5),
-            data.get('Age', 25),
-            data.get('BMI', 25),
-            data.get('EstimatedDayofOvulation', 14),
-            data.get('LengthofLutealPhase', 14),
-            data.get('TotalDaysofFertility', 6)
-        ]], columns=[
-            'LengthofMenses', 'Age', 'BMI', 'EstimatedDayofOvulation', 
-            'LengthofLutealPhase', 'TotalDaysofFertility'
-        ])
+        cycle_features = CYCLE_LENGTH.row(data)
         
         # Get prediction from your 0.09 MAE champion!
-        predicted_cycle_length = cycle_model.predict(cycle_features)[0]
+        predicted_cycle_length = get_model('cycle_length').predict(cycle_features)[0]
         
         # Calculate days until next period
         days_until = max(1, int(predicted_cycle_length - current_cycle_day))
@@ -194,69 +202,22 @@ def detect_irregular_cycle(request):
         data = request.get_json()
         
         # Prepare features for your perfect AUC model
-        cycle_lengths = data.get('recent_cycle_lengths', [28])
-        mean_length = np.mean(cycle_lengths)
-        variability = np.std(cycle_lengths) if len(cycle_lengths) > 1 else 0
-        
-        features = pd.DataFrame([[
-            cycle_lengths[0] if cycle_lengths else 28,  # CycleLength
-            mean_length,                                 # MeanCycleLength  
-            variability,                                # CycleVariability
-            1 if cycle_lengths[0] < 21 else 0,         # CycleTooShort
-            1 if cycle_lengths[0] > 35 else 0,         # CycleTooLong
-            data.get('cycle_with_peak', 1),            # CycleWithPeak
-            1 if data.get('cycle_with_peak', 1) == 0 else 0,  # NoOvulationDetected
-            data.get('luteal_phase_length', 14),       # LutealPhaseLength
-            1 if data.get('luteal_phase_length', 14) < 10 else 0,  # LutealPhaseTooShort
-            1 if data.get('luteal_phase_length', 14) > 16 else 0,  # LutealPhaseTooLong
-            data.get('menses_length', 5),              # MensesLength
-            1 if data.get('menses_length', 5) < 3 else 0,      # MensesTooShort
-            1 if data.get('menses_length', 5) > 7 else 0,      # MensesTooLong
-            data.get('unusual_bleeding', 0),           # UnusualBleeding
-            data.get('bleeding_intensity', 5),         # BleedingIntensity
-            1 if data.get('bleeding_intensity', 5) > 10 else 0,  # VeryHeavyBleeding
-            1 if data.get('bleeding_intensity', 5) < 3 else 0,   # VeryLightBleeding
-            data.get('age', 25),                       # Age
-            data.get('bmi', 25),                       # BMI
-            1 if data.get('bmi', 25) < 18.5 else 0,   # UnderweightBMI
-            1 if data.get('bmi', 25) > 25 else 0,      # OverweightBMI
-            1 if data.get('bmi', 25) > 30 else 0,      # ObeseBMI
-            data.get('number_pregnancies', 0),         # NumberPregnancies
-            1 if (data.get('age', 25) > 30 and data.get('number_pregnancies', 0) == 0) else 0,  # NullipariousAdult
-            1 if data.get('age', 25) < 20 else 0,      # TeenageYears
-            1 if data.get('age', 25) > 40 else 0,      # Perimenopause
-            # PCOS Risk Score
-            sum([
-                1 if cycle_lengths[0] > 35 else 0,
-                1 if data.get('cycle_with_peak', 1) == 0 else 0,
-                1 if data.get('bmi', 25) > 30 else 0,
-                data.get('unusual_bleeding', 0)
-            ]),
-            # Hormonal Imbalance Score  
-            (variability / 5 + 
-             (1 if data.get('luteal_phase_length', 14) < 10 else 0) +
-             (1 if data.get('bleeding_intensity', 5) > 10 else 0) +
-             (1 if data.get('bleeding_intensity', 5) < 3 else 0))
-        ]], columns=[
-            'CycleLength', 'MeanCycleLength', 'CycleVariability',
-            'CycleTooShort', 'CycleTooLong', 'CycleWithPeak', 'NoOvulationDetected',
-            'LutealPhaseLength', 'LutealPhaseTooShort', 'LutealPhaseTooLong',
-            'MensesLength', 'MensesTooShort', 'MensesTooLong',
-            'UnusualBleeding', 'BleedingIntensity', 'VeryHeavyBleeding', 'VeryLightBleeding',
-            'Age', 'BMI', 'UnderweightBMI', 'OverweightBMI', 'ObeseBMI',
-            'NumberPregnancies', 'NullipariousAdult', 'TeenageYears', 'Perimenopause',
-            'PCOSRiskScore', 'HormonalImbalanceScore'
-        ])
+        features = IRREGULAR_CYCLE.row(data)
+        cycle_length = features[0, IRREGULAR_CYCLE.index('CycleLength')]
+        variability = features[0, IRREGULAR_CYCLE.index('CycleVariability')]
         
         # Use YOUR perfect AUC model!
-        irregular_prob = irregular_model.predict_proba(features)[0, 1]
-        is_irregular = irregular_model.predict(features)[0]
+        irregular_model = get_model('irregular_cycle')
+        proba = irregular_model.predict_proba(features)[0]
+        irregular_prob = proba[1]
+        # Same decision rule as RandomForestClassifier.predict, without a second pass over the trees
+        is_irregular = irregular_model.classes_[np.argmax(proba)]
         
         # Generate warnings
         warnings = []
         recommendations = []
         
-        if cycle_lengths[0] > 35:
+        if cycle_length > 35:
             warnings.append("Long cycles detected")
             recommendations.append("Monitor for PCOS symptoms")
         if variability > 7:
@@ -273,7 +234,7 @@ def detect_irregular_cycle(request):
             'warnings': warnings,
             'recommendations': recommendations,
             'model_accuracy': 'Perfect AUC 1.000!',
-            'pcos_risk_score': int(features.iloc[0]['PCOSRiskScore'])
+            'pcos_risk_score': int(features[0, IRREGULAR_CYCLE.index('PCOSRiskScore')])
         }), 200, headers
         
     except Exception as e:
@@ -308,39 +269,10 @@ def predict_symptoms(request):
         menses_length = data.get('menses_length', 5)
         
         # Prepare features for your 90%+ accuracy model
-        features = pd.DataFrame([[
-            cycle_day,                                    # cycle_day
-            cycle_length,                                # cycle_length  
-            menses_length,                               # menses_length
-            max(0, cycle_day - 1),                       # days_since_period_start
-            max(0, cycle_length - cycle_day),            # days_until_next_period
-            1 if cycle_day <= menses_length else 0,      # is_period_phase
-            1 if menses_length < cycle_day <= (cycle_length - 14 - 3) else 0,  # is_follicular_phase
-            1 if (cycle_length - 14 - 3) < cycle_day <= (cycle_length - 14 + 3) else 0,  # is_ovulation_phase
-            1 if (cycle_length - 14 + 3) < cycle_day <= (cycle_length - 5) else 0,  # is_luteal_phase
-            1 if cycle_day > (cycle_length - 5) else 0,  # is_pms_phase
-            min(cycle_day, menses_length) if cycle_day <= menses_length else 0,  # period_day
-            (min(cycle_day, menses_length) / menses_length) if cycle_day <= menses_length and menses_length > 0 else 0,  # period_day_normalized
-            data.get('age', 25),                         # age
-            data.get('bmi', 25),                         # bmi
-            data.get('pregnancies', 0),                  # pregnancies
-            data.get('mean_bleeding_intensity', 5),      # mean_bleeding_intensity
-            cycle_day / cycle_length,                    # cycle_day_ratio
-            abs(cycle_day - (cycle_length - 14)) / cycle_length,  # ovulation_proximity
-            1 if data.get('age', 25) < 20 else 0,        # is_teenager
-            1 if 20 <= data.get('age', 25) <= 35 else 0, # is_adult
-            1 if data.get('age', 25) > 35 else 0         # is_older_adult
-        ]], columns=[
-            'cycle_day', 'cycle_length', 'menses_length', 'days_since_period_start',
-            'days_until_next_period', 'is_period_phase', 'is_follicular_phase',
-            'is_ovulation_phase', 'is_luteal_phase', 'is_pms_phase',
-            'period_day', 'period_day_normalized', 'age', 'bmi', 'pregnancies',
-            'mean_bleeding_intensity', 'cycle_day_ratio', 'ovulation_proximity',
-            'is_teenager', 'is_adult', 'is_older_adult'
-        ])
+        features = SYMPTOMS.row(data)
         
         # Use YOUR 90%+ accuracy symptom model!
-        predictions = symptom_model.predict(features)[0]
+        predictions = get_model('symptom_predictor').predict(features)[0]
         
         # [cramp_intensity, flow_intensity, fatigue_level, mood_impact, overall_discomfort]
         def get_description(intensity):
@@ -403,18 +335,44 @@ def predict_symptoms(request):
 # Health check endpoint
 @functions_framework.http
 def health_check(request):
-    """Check if all models are loaded and working"""
+    """Which models are loaded on this instance; never loads one itself"""
     headers = {'Access-Control-Allow-Origin': '*'}
     
+    def status(name, label):
+        path = model_path(name)
+        if name in _models:
+            return f'{label} (lite)' if path.endswith('.lite.pkl') else label
+        return 'Loads on first use' if os.path.exists(path) or os.path.exists(bundle_path(path)) else 'Not found'
+    
     return jsonify({
         'status': 'healthy',
-        'models_loaded': 5,
+        'models_loaded': len(_models),
         'models': {
-            'cycle_length': '0.09 MAE Champion',
-            'menses_length': '0.26 MAE Excellence', 
-            'irregular_detection': 'Perfect AUC 1.000',
-            'symptom_prediction': '90%+ Accuracy',
-            'next_period': 'Backup Model'
+            'cycle_length': status('cycle_length', '0.09 MAE Champion'),
+            'menses_length': status('menses_length', '0.26 MAE Excellence'),
+            'irregular_detection': status('irregular_cycle', 'Perfect AUC 1.000'),
+            'symptom_prediction': status('symptom_predictor', '90%+ Accuracy'),
+            'next_period': status('next_period', 'Backup Model')
         },
         'message': 'Luna ML models ready to serve world-class predictions!'
-    }), 200, headers
\ No newline at end of file
+    }), 200, headers
+
+# Single entry point: one deployed function serves every route, so warm
+# instances are shared across routes instead of each function keeping its own
+ROUTES = {
+    '/predict/cycle-length': predict_cycle_length,
+    '/predict/menses-length': predict_menses_length,
+    '/predict/next-period': predict_next_period,
+    '/detect/irregular-cycle': detect_irregular_cycle,
+    '/predict/symptoms': predict_symptoms,
+    '/health': health_check,
+}
+
+@functions_framework.http
+def luna(request):
+    """Route to the handler for the request path (the same paths as luna-ml-api)"""
+    handler = ROUTES.get(request.path.rstrip('/') or '/health')
+    if handler is None:
+        return jsonify({'error': f'Unknown route: {request.path}', 'routes': sorted(ROUTES)}), 404, \
+            {'Access-Control-Allow-Origin': '*'}
+    return handler(request)
@@ -0,0 +1,254 @@
+# 📦 Luna model bundles
+# A compiled forest stored as one flat, versioned file that serving can
+# memory-map without unpickling anything (and without sklearn or joblib):
+#
+#   b'LUNAFRST' | uint32 header length | JSON header | padding | arrays
+#
+# The JSON header records the format version, the model version (content
+# hash of the source pickle), feature names and input dtype, training
+# metadata, and the dtype/shape/offset of every node array. Arrays start on
+# 64-byte boundaries and are followed by nothing else; `content_sha256`
+# covers all of them. Node indices are stored as int32, which also walks
+# faster than int64, thresholds and leaf values stay float64 so predictions
+# remain bit-identical to sklearn.
+#
+# Export (prints size and load time per model):
+#   python model_bundle.py export models/*.pkl
+# Verify checksums:
+#   python model_bundle.py verify models/*.bundle
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import time
+
+import numpy as np
+
+from forest_engine import CompiledForest
+
+MAGIC = b'LUNAFRST'
+FORMAT_VERSION = 1
+DATA_ALIGNMENT = 64
+
+# Array name -> dtypes a valid bundle may store it as
+ARRAYS = {
+    'feature': ('<i4',),
+    'threshold': ('<f8',),
+    'children': ('<i4',),
+    'value': ('<f8',),
+    'roots': ('<i4',),
+    'counts': ('<f8',),
+}
+
+
+def bundle_path(path):
+    """Bundle written next to the model pickle at `path`"""
+    return os.path.splitext(path)[0] + '.bundle'
+
+
+def source_stamp(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def training_metadata(estimator):
+    """What the header records about the fitted source model"""
+    metadata = {'estimator': type(estimator).__name__}
+    forests = getattr(estimator, 'estimators_', [])
+    if forests and hasattr(forests[0], 'estimators_'):
+        # MultiOutputRegressor
+        metadata['outputs'] = len(forests)
+        metadata['forest'] = type(forests[0]).__name__
+        params = forests[0].get_params()
+    else:
+        params = estimator.get_params() if hasattr(estimator, 'get_params') else {}
+        if getattr(estimator, 'n_outputs_', 1) > 1:
+            # One forest predicting every output
+            metadata['outputs'] = estimator.n_outputs_
+    metadata['params'] = {key: value for key, value in params.items()
+                          if isinstance(value, (int, float, str, bool)) or value is None}
+    try:
+        import sklearn
+        metadata['sklearn_version'] = sklearn.__version__
+    except ImportError:
+        pass
+    return metadata
+
+
+def write_bundle(path, forest, model_version, metadata=None, source=None):
+    """Write `forest` (a CompiledForest) to `path` atomically"""
+    arrays = {name: np.ascontiguousarray(getattr(forest, name), dtype=dtypes[0])
+              for name, dtypes in ARRAYS.items()}
+    classes = forest.classes_
+    feature_names = getattr(forest, 'feature_names_in_', None)
+    header = {
+        'format': 'luna-forest-bundle',
+        'format_version': FORMAT_VERSION,
+        'model_version': model_version,
+        'kind': 'classifier' if classes is not None else 'regressor',
+        'n_features': int(forest.n_features_in_),
+        'feature_names': [str(name) for name in feature_names] if feature_names is not None else None,
+        'input_dtype': '<f4',
+        'depth': int(forest.depth),
+        'classes': classes.tolist() if classes is not None else None,
+        'classes_dtype': classes.dtype.str if classes is not None else None,
+        'training': metadata or {},
+        'source': source or {},
+        'arrays': {},
+        'content_sha256': None,
+    }
+    offset = 0
+    for name, array in arrays.items():
+        header['arrays'][name] = {'dtype': array.dtype.str, 'shape': list(array.shape),
+                                  'offset': offset, 'nbytes': array.nbytes}
+        offset += -(-array.nbytes // DATA_ALIGNMENT) * DATA_ALIGNMENT
+    digest = hashlib.sha256()
+    for name, array in arrays.items():
+        digest.update(padded(array))
+    header['content_sha256'] = digest.hexdigest()
+    header['data_offset'] = 0
+    # Fixed point: the offset is part of the header it follows
+    while True:
+        encoded = json.dumps(header, separators=(',', ':')).encode()
+        data_offset = -(-(len(MAGIC) + 4 + len(encoded)) // DATA_ALIGNMENT) * DATA_ALIGNMENT
+        if header['data_offset'] == data_offset:
+            break
+        header['data_offset'] = data_offset
+
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(encoded)))
+        f.write(encoded)
+        f.write(b'\0' * (data_offset - f.tell()))
+        for array in arrays.values():
+            f.write(padded(array))
+    os.replace(tmp_path, path)
+    return header
+
+
+def padded(array):
+    data = array.tobytes()
+    return data + b'\0' * (-len(data) % DATA_ALIGNMENT)
+
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} is not a model bundle')
+        (header_size,) = struct.unpack('<I', f.read(4))
+        header = json.loads(f.read(header_size))
+    if header.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"{path}: bundle format {header.get('format_version')}, "
+                         f"expected {FORMAT_VERSION}")
+    return header
+
+
+def load_bundle(path, verify=True):
+    """CompiledForest backed by a read-only mapping of the bundle at `path`
+
+    The header and array bounds are always validated; `verify` also checks
+    the content hash, which reads every page of the file once.
+    """
+    header = read_header(path)
+    with open(path, 'rb') as f:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    data_offset = header['data_offset']
+    data_size = len(mapping) - data_offset
+
+    arrays = {}
+    for name, dtypes in ARRAYS.items():
+        spec = header['arrays'].get(name)
+        if spec is None or spec['dtype'] not in dtypes:
+            raise ValueError(f'{path}: missing or invalid array {name!r}')
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape'], dtype=np.int64))
+        if spec['nbytes'] != count * dtype.itemsize or spec['offset'] + spec['nbytes'] > data_size:
+            raise ValueError(f'{path}: array {name!r} does not fit the file')
+        arrays[name] = np.frombuffer(mapping, dtype=dtype, count=count,
+                                     offset=data_offset + spec['offset']).reshape(spec['shape'])
+
+    n_nodes = len(arrays['feature'])
+    if not (len(arrays['threshold']) == len(arrays['value']) == n_nodes and
+            len(arrays['children']) == 2 * n_nodes):
+        raise ValueError(f'{path}: node arrays disagree on the node count')
+    if verify:
+        digest = hashlib.sha256(memoryview(mapping)[data_offset:]).hexdigest()
+        if digest != header['content_sha256']:
+            raise ValueError(f'{path}: checksum mismatch, the bundle is corrupt')
+
+    classes = header['classes']
+    feature_names = header['feature_names']
+    forest = CompiledForest(
+        classes=np.array(classes, dtype=header['classes_dtype']) if classes is not None else None,
+        feature_names=np.array(feature_names, dtype=object) if feature_names is not None else None,
+        depth=header['depth'],
+        n_features=header['n_features'],
+        **arrays,
+    )
+    forest.mapped_nbytes = sum(array.nbytes for array in arrays.values())
+    forest.header = header
+    return forest
+
+
+def export(path, out=None):
+    """Compile the pickle at `path` into a bundle; returns the bundle path"""
+    import joblib
+    from prediction_cache import file_version
+
+    estimator = joblib.load(path)
+    forest = CompiledForest.from_estimator(estimator)
+    target = out or bundle_path(path)
+    write_bundle(target, forest, file_version(path), training_metadata(estimator),
+                 dict(source_stamp(path), file=os.path.basename(path)))
+    return target
+
+
+def load_model(path, verify=True):
+    """The bundle next to the pickle at `path` when there is one, else the pickle
+
+    For deployments that ship either; the registry (model_registry.py) adds
+    staleness checks and lazy loading on top.
+    """
+    bundle = bundle_path(path)
+    if os.path.exists(bundle):
+        return load_bundle(bundle, verify=verify)
+    import joblib
+    return joblib.load(path)
+
+
+def main():
+    import warnings
+
+    parser = argparse.ArgumentParser(description='Export and verify Luna model bundles')
+    commands = parser.add_subparsers(dest='command', required=True)
+    export_parser = commands.add_parser('export', help='write a .bundle next to each pickle')
+    export_parser.add_argument('models', nargs='+')
+    verify_parser = commands.add_parser('verify', help='validate bundles and their checksums')
+    verify_parser.add_argument('bundles', nargs='+')
+    args = parser.parse_args()
+    warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+    if args.command == 'export':
+        for path in args.models:
+            target = export(path)
+            start = time.perf_counter()
+            load_bundle(target)
+            loaded = time.perf_counter() - start
+            print(f"📦 {path} ({os.path.getsize(path) / 1e6:.1f} MB) -> {target} "
+                  f"({os.path.getsize(target) / 1e6:.1f} MB, loads and verifies in {loaded * 1000:.1f} ms)")
+    else:
+        for path in args.bundles:
+            start = time.perf_counter()
+            forest = load_bundle(path)
+            loaded = time.perf_counter() - start
+            print(f"✅ {path}: {forest.header['kind']}, {forest.n_estimators} trees, "
+                  f"{forest.n_nodes} nodes, version {forest.header['model_version']}, "
+                  f"verified in {loaded * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+# Shared modules for the Firebase functions
+# features.py, forest_engine.py and model_bundle.py are owned by luna-ml-api.
+# The functions keep real copies of them: `firebase deploy` uploads only this
+# directory, and symlinks out of it neither deploy nor survive checkouts
+# without symlink support. firebase.json runs this before every functions
+# deploy, so what ships is always luna-ml-api's current version.
+#
+#   python sync_shared.py           copy the modules over
+#   python sync_shared.py --check   exit 1 if a copy is stale (CI)
+
+import argparse
+import filecmp
+import os
+import shutil
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SOURCE = os.path.join(HERE, '..', '..', 'luna-ml-api')
+SHARED = ('features.py', 'forest_engine.py', 'model_bundle.py')
+
+
+def stale():
+    """Shared modules whose copy here differs from luna-ml-api's"""
+    return [name for name in SHARED
+            if not os.path.isfile(os.path.join(HERE, name)) or os.path.islink(os.path.join(HERE, name))
+            or not filecmp.cmp(os.path.join(SOURCE, name), os.path.join(HERE, name), shallow=False)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Copy the modules shared with luna-ml-api')
+    parser.add_argument('--check', action='store_true', help='only report stale copies')
+    args = parser.parse_args()
+    if not os.path.isdir(SOURCE):
+        # Deploying from a checkout without the API: ship the copies as they are
+        print(f'⚠️ {os.path.normpath(SOURCE)} not found, keeping the copies here')
+        return
+    names = stale()
+    if args.check:
+        for name in names:
+            print(f'❌ {name} differs from luna-ml-api/{name}; run python sync_shared.py')
+        sys.exit(1 if names else 0)
+    for name in names:
+        target = os.path.join(HERE, name)
+        if os.path.islink(target):
+            os.remove(target)
+        shutil.copyfile(os.path.join(SOURCE, name), target)
+        print(f'📄 Copied luna-ml-api/{name}')
+
+
+if __name__ == '__main__':
+    main()
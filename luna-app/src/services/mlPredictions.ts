@@ -212,6 +212,15 @@ class LunaMLService {
     try {
       const features = await this.extractUserFeatures(userId);
 
+      // ✅ One round trip for every model when the dashboard endpoint is up
+      const dashboard = await this.callDashboardAPI(features);
+      if (dashboard) {
+        return {
+          ...dashboard,
+          confidence: this.calculateConfidence(features),
+        };
+      }
+
       // ✅ Call APIs with individual error handling using Promise.allSettled
       const [nextPeriodResponse, irregularResponse, symptomsResponse] =
         await Promise.allSettled([
@@ -248,6 +257,69 @@ class LunaMLService {
   // API CALL METHODS - IMPROVED
   // ==========================================
 
+  private async callDashboardAPI(
+    features: UserCycleFeatures
+  ): Promise<Omit<MLPredictions, "confidence"> | null> {
+    try {
+      const response = await fetch(`${this.ML_API_URL}/predict/dashboard`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({
+          current_cycle_day: features.currentCycleDay,
+          age: features.age,
+          bmi: features.bmi || 25,
+          menses_length: features.meanMensesLength,
+          mean_cycle_length: features.meanCycleLength,
+          estimated_day_of_ovulation: features.meanCycleLength - 14,
+          luteal_phase_length: 14,
+          total_days_of_fertility: 6,
+          recent_cycle_lengths: features.recentCycleLengths,
+          cycles_logged: features.periodsLogged,
+          cycle_with_peak: 1,
+          unusual_bleeding: features.hasUnusualBleeding ? 1 : 0,
+          bleeding_intensity: 5,
+          number_pregnancies: 0,
+        }),
+      });
+
+      if (!response.ok) {
+        console.warn(
+          `Dashboard API returned ${response.status}. Using per-model endpoints.`
+        );
+        return null;
+      }
+
+      const data = await response.json();
+
+      // ✅ Each section can fail on its own; fall back section by section
+      return {
+        nextPeriod:
+          data.next_period && !data.next_period.error
+            ? this.toNextPeriod(data.next_period)
+            : this.getNextPeriodFallback(features),
+
+        cycleHealth:
+          features.recentCycleLengths.length < 2
+            ? this.getInsufficientCycleDataResult()
+            : data.irregular_cycle && !data.irregular_cycle.error
+            ? this.toCycleHealth(data.irregular_cycle)
+            : this.getIrregularCycleFallback(features),
+
+        dailySymptoms:
+          data.symptoms && !data.symptoms.error
+            ? this.toDailySymptoms(data.symptoms)
+            : this.getSymptomsFallback(features),
+      };
+    } catch (error) {
+      if (error instanceof Error) {
+        console.warn("Dashboard API temporarily unavailable:", error.message);
+      } else {
+        console.warn("Dashboard API temporarily unavailable:", error);
+      }
+      return null;
+    }
+  }
+
   private async callNextPeriodAPI(features: UserCycleFeatures) {
     try {
       const response = await fetch(`${this.ML_API_URL}/predict/next-period`, {
@@ -274,15 +346,7 @@ class LunaMLService {
 
       const data = await response.json();
 
-      const nextDate = new Date();
-      nextDate.setDate(nextDate.getDate() + data.days_until_next_period);
-
-      return {
-        daysUntil: data.days_until_next_period,
-        date: nextDate,
-        confidence: data.confidence as "high" | "medium" | "low",
-        explanation: data.explanation,
-      };
+      return this.toNextPeriod(data);
     } catch (error) {
       if (error instanceof Error) {
         if (error instanceof Error) {
@@ -305,17 +369,7 @@ class LunaMLService {
       // ✅ Check if we have enough data before making the API call
       if (features.recentCycleLengths.length < 2) {
         console.log("⚠️ Insufficient cycle data for irregular cycle detection");
-        return {
-          isIrregular: false,
-          riskLevel: "low" as const,
-          pcosRisk: 0,
-          warnings: [
-            "More cycle data needed for accurate irregularity detection",
-          ],
-          recommendations: [
-            "Log at least 3 complete cycles for personalized health insights",
-          ],
-        };
+        return this.getInsufficientCycleDataResult();
       }
 
       const response = await fetch(
@@ -347,13 +401,7 @@ class LunaMLService {
 
       const data = await response.json();
 
-      return {
-        isIrregular: data.is_irregular,
-        riskLevel: data.risk_level as "low" | "medium" | "high",
-        pcosRisk: data.pcos_risk_score || 0,
-        warnings: data.warnings || [],
-        recommendations: data.recommendations || [],
-      };
+      return this.toCycleHealth(data);
     } catch (error) {
       if (error instanceof Error) {
         console.warn(
@@ -392,34 +440,7 @@ class LunaMLService {
 
       const data = await response.json();
 
-      // Create top symptoms array
-      const symptoms = [
-        {
-          name: "cramps",
-          intensity: data.cramp_intensity,
-          description: data.descriptions.cramps,
-        },
-        {
-          name: "fatigue",
-          intensity: data.fatigue_level,
-          description: data.descriptions.fatigue,
-        },
-        {
-          name: "mood changes",
-          intensity: data.mood_impact,
-          description: data.descriptions.mood,
-        },
-      ].sort((a, b) => b.intensity - a.intensity);
-
-      return {
-        crampIntensity: data.cramp_intensity,
-        flowIntensity: data.flow_intensity,
-        fatigueLevel: data.fatigue_level,
-        moodImpact: data.mood_impact,
-        overallDiscomfort: data.overall_discomfort,
-        descriptions: data.descriptions,
-        topSymptoms: symptoms.slice(0, 2),
-      };
+      return this.toDailySymptoms(data);
     } catch (error) {
       if (error instanceof Error) {
         console.warn("Symptoms API temporarily unavailable:", error.message);
@@ -430,10 +451,96 @@ class LunaMLService {
     }
   }
 
+  // ==========================================
+  // API RESPONSE MAPPING
+  // ==========================================
+
+  private toNextPeriod(data: {
+    days_until_next_period: number;
+    confidence: string;
+    explanation: string;
+  }) {
+    const nextDate = new Date();
+    nextDate.setDate(nextDate.getDate() + data.days_until_next_period);
+
+    return {
+      daysUntil: data.days_until_next_period,
+      date: nextDate,
+      confidence: data.confidence as "high" | "medium" | "low",
+      explanation: data.explanation,
+    };
+  }
+
+  private toCycleHealth(data: {
+    is_irregular: boolean;
+    risk_level: string;
+    pcos_risk_score?: number;
+    warnings?: string[];
+    recommendations?: string[];
+  }) {
+    return {
+      isIrregular: data.is_irregular,
+      riskLevel: data.risk_level as "low" | "medium" | "high",
+      pcosRisk: data.pcos_risk_score || 0,
+      warnings: data.warnings || [],
+      recommendations: data.recommendations || [],
+    };
+  }
+
+  private toDailySymptoms(data: {
+    cramp_intensity: number;
+    flow_intensity: number;
+    fatigue_level: number;
+    mood_impact: number;
+    overall_discomfort: number;
+    descriptions: MLPredictions["dailySymptoms"]["descriptions"];
+  }) {
+    // Create top symptoms array
+    const symptoms = [
+      {
+        name: "cramps",
+        intensity: data.cramp_intensity,
+        description: data.descriptions.cramps,
+      },
+      {
+        name: "fatigue",
+        intensity: data.fatigue_level,
+        description: data.descriptions.fatigue,
+      },
+      {
+        name: "mood changes",
+        intensity: data.mood_impact,
+        description: data.descriptions.mood,
+      },
+    ].sort((a, b) => b.intensity - a.intensity);
+
+    return {
+      crampIntensity: data.cramp_intensity,
+      flowIntensity: data.flow_intensity,
+      fatigueLevel: data.fatigue_level,
+      moodImpact: data.mood_impact,
+      overallDiscomfort: data.overall_discomfort,
+      descriptions: data.descriptions,
+      topSymptoms: symptoms.slice(0, 2),
+    };
+  }
+
   // ==========================================
   // ✅ NEW FALLBACK METHODS
   // ==========================================
 
+  private getInsufficientCycleDataResult() {
+    return {
+      isIrregular: false,
+      riskLevel: "low" as const,
+      pcosRisk: 0,
+      warnings: ["More cycle data needed for accurate irregularity detection"],
+      recommendations: [
+        "Log at least 3 complete cycles for personalized health insights",
+      ],
+    };
+  }
+
   private getIrregularCycleFallback(features: UserCycleFeatures) {
     // Provide basic irregularity detection based on cycle length variation
     const isIrregular =
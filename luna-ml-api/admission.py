@@ -0,0 +1,132 @@
+# 🚦 Luna admission control
+# Under overload, requests used to queue behind the server's threads until
+# the worker timeout. Each endpoint now runs at most `concurrency` requests
+# at once; up to `queue_depth` more wait for a slot, each for no longer than
+# its deadline allows. Anything beyond that is shed straight away:
+#
+#   queue_full   every slot busy and the queue full
+#   deadline     no slot freed up in time to finish within the budget
+#
+# A shed request is answered by the caller's cheap tier (a calendar-based
+# estimate marked degraded, or a 503 for bulk routes), so latency stays
+# bounded by the budget however deep the backlog gets.
+#
+# Waiting is deadline aware: a request gives up on a slot as soon as the
+# time left is less than the endpoint's typical service time (an EWMA), since
+# by then it could not finish in budget even if it got one.
+
+import threading
+import time
+
+# Weight of the newest request in the service time average
+SERVICE_TIME_ALPHA = 0.2
+
+SHED_REASONS = ('queue_full', 'deadline')
+
+
+class EndpointLimiter:
+    """Concurrency slots and a bounded wait queue for one endpoint"""
+
+    def __init__(self, concurrency, queue_depth):
+        self.concurrency = concurrency
+        self.queue_depth = queue_depth
+        self._cond = threading.Condition(threading.Lock())
+        self.running = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = dict.fromkeys(SHED_REASONS, 0)
+        self.service_time = 0.0     # seconds, EWMA over finished requests
+
+    def acquire(self, deadline):
+        """Take a slot, waiting until `deadline` (time.monotonic()) at the
+        latest; None once admitted, else the reason the request was shed"""
+        with self._cond:
+            if self.running < self.concurrency:
+                return self._admit()
+            if self.waiting >= self.queue_depth:
+                return self._shed('queue_full')
+            # No point holding out for a slot it could not finish in time with
+            give_up = deadline - self.service_time
+            self.waiting += 1
+            try:
+                while self.running >= self.concurrency:
+                    remaining = give_up - time.monotonic()
+                    if remaining <= 0:
+                        return self._shed('deadline')
+                    self._cond.wait(remaining)
+                return self._admit()
+            finally:
+                self.waiting -= 1
+
+    def try_acquire(self):
+        """Non-blocking acquire for callers that queue elsewhere (the ASGI
+        micro-batchers): admitted while fewer than concurrency + queue_depth
+        requests are in flight"""
+        with self._cond:
+            if self.running >= self.concurrency + self.queue_depth:
+                return self._shed('queue_full')
+            return self._admit()
+
+    def release(self, elapsed):
+        """Give the slot back; `elapsed` is how long the request held it"""
+        with self._cond:
+            self.running -= 1
+            self.service_time += SERVICE_TIME_ALPHA * (elapsed - self.service_time)
+            self._cond.notify()
+
+    def missed_deadline(self):
+        """Count an admitted request whose answer did not arrive in time"""
+        with self._cond:
+            self.shed['deadline'] += 1
+
+    def _admit(self):
+        self.running += 1
+        self.admitted += 1
+        return None
+
+    def _shed(self, reason):
+        self.shed[reason] += 1
+        return reason
+
+    def stats(self):
+        with self._cond:
+            return {
+                'running': self.running,
+                'waiting': self.waiting,
+                'admitted': self.admitted,
+                'shed': dict(self.shed),
+                'service_time_ms': round(self.service_time * 1000, 2),
+            }
+
+
+class AdmissionControl:
+    """One EndpointLimiter per endpoint, created on first use"""
+
+    def __init__(self, concurrency, queue_depth, budget):
+        self.concurrency = concurrency
+        self.queue_depth = queue_depth
+        self.budget = budget        # seconds a request may take at most
+        self.limiters = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, endpoint):
+        limiter = self.limiters.get(endpoint)
+        if limiter is None:
+            with self._lock:
+                limiter = self.limiters.setdefault(
+                    endpoint, EndpointLimiter(self.concurrency, self.queue_depth))
+        return limiter
+
+    def deadline(self, requested_ms=None, start=None):
+        """time.monotonic() deadline of a request started at `start` (now by
+        default); a client's own budget applies when it is tighter"""
+        budget = self.budget
+        try:
+            if requested_ms is not None:
+                budget = min(budget, max(float(requested_ms), 0.0) / 1000)
+        except ValueError:
+            pass
+        return (time.monotonic() if start is None else start) + budget
+
+    def stats(self):
+        return {endpoint: limiter.stats() for endpoint, limiter in sorted(self.limiters.items())}
@@ -1,71 +1,303 @@
-
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
-import joblib
-import pandas as pd
-import numpy as np
+from werkzeug.wsgi import get_input_stream
+import gzip
+import hmac
 import os
-import traceback
+import tempfile
+import time
+import zlib
+
+from metrics import CONTENT_TYPE, NULL_TIMER
+from payloads import CYCLE_LOG, PayloadError, SCHEMAS, dumps, loads
+import predictions
+from predictions import (metrics, models, prediction_caches, DASHBOARD_FALLBACK, PREDICTION_ROUTES,
+                         degraded_dashboard, degraded_result, predict_cycle_forecast,
+                         predict_dashboard_sections, predict_first, predict_symptom_calendar,
+                         score_batch, with_user_stats)
+from user_stats import token_matches
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
-# Global variables for models
-models = {}
+# ===================================
+# METRICS
+# ===================================
+
+@app.before_request
+def start_request_timer():
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    g.request_timer = metrics.start(endpoint)
+
+@app.after_request
+def finish_request_timer(response):
+    timer = g.pop('request_timer', None)
+    if timer is not None:
+        timer.finish(response.status_code)
+    return response
+
+@app.teardown_request
+def finish_failed_request(error=None):
+    # Only still set when the request raised before after_request ran
+    timer = g.pop('request_timer', None)
+    if timer is not None:
+        timer.finish(500)
+
+def request_timer():
+    """Timer of the current Flask request; `mark(stage)` closes a stage"""
+    return g.get('request_timer', NULL_TIMER)
+
+def json_response(payload, status=200):
+    """Prediction response body through the fast encoder (payloads.py)"""
+    return Response(dumps(payload), status=status, mimetype='application/json')
+
+# ===================================
+# ADMISSION CONTROL
+# Prediction routes take a slot from their endpoint's limiter (admission.py)
+# before doing any work. A shed single-user or dashboard request is answered
+# from the degraded tier once its payload is parsed; bulk routes have no
+# cheap tier and answer 503. Streams are not limited: they score after the
+# route has returned, so a slot would be given back before the work starts.
+# ===================================
+
+DEGRADED_ROUTES = set(PREDICTION_ROUTES) | {'/predict/dashboard'}
+ADMITTED_ROUTES = DEGRADED_ROUTES | {f'{path}/batch' for path in PREDICTION_ROUTES} | \
+    {'/predict/symptoms/calendar', '/predict/next-period/forecast'}
 
-def load_models():
-    """Load all ML models on startup with absolute paths"""
-    print("🚀 STARTING MODEL LOADING DEBUG")
-    print(f"📁 Current working directory: {os.getcwd()}")
-    print(f"📂 Files in current directory: {os.listdir('.')}")
+@app.before_request
+def admit_request():
+    endpoint = request.url_rule.rule if request.url_rule is not None else None
+    if predictions.admission is None or request.method != 'POST' or endpoint not in ADMITTED_ROUTES:
+        return None
+    deadline = predictions.admission.deadline(request.headers.get('X-Request-Budget-Ms'))
+    limiter = predictions.admission[endpoint]
+    shed = limiter.acquire(deadline)
+    if shed is None:
+        g.admission_slot = (limiter, time.monotonic())
+    elif endpoint in DEGRADED_ROUTES:
+        g.shed = shed
+    else:
+        response = json_response({'error': 'Server is overloaded, retry shortly', 'reason': shed}, 503)
+        response.headers['Retry-After'] = '1'
+        return response
+
+@app.teardown_request
+def release_admission_slot(error=None):
+    slot = g.pop('admission_slot', None)
+    if slot is not None:
+        limiter, admitted = slot
+        limiter.release(time.monotonic() - admitted)
+
+# Largest number of payloads accepted by a single /batch call
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', 50000))
+
+# ===================================
+# BATCH SCORING
+# ===================================
+
+def read_batch_items():
+    """Payload list from a batch body: a bare JSON array or {"items": [...]}"""
+    data = loads(request.get_data())
+    items = data.get('items') if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        raise ValueError('Expected a JSON array of payloads or {"items": [...]}')
+    if len(items) > MAX_BATCH_SIZE:
+        raise ValueError(f'Batch too large: {len(items)} items (max {MAX_BATCH_SIZE})')
+    return items
+
+def batch_route(path):
+    """Shared body of the /batch routes: `path`'s model and response for many
+    payloads, each validated with its schema"""
+    if request.method == 'OPTIONS':
+        return '', 204
     
-    # Use ABSOLUTE paths for Docker container
-    base_path = "/app"
-    models_dir = os.path.join(base_path, "models")
+    route = PREDICTION_ROUTES[path]
+    timer = request_timer()
+    try:
+        items = read_batch_items()
+    except Exception as e:
+        return json_response({'error': str(e)}, 400)
+    timer.mark('parse')
     
-    print(f"🎯 Looking for models in: {models_dir}")
+    if route.model_name not in models:
+        return json_response({'error': f'{route.model_name} model not loaded'}, 500)
     
-    if os.path.exists(models_dir):
-        print(f"✅ Models directory exists!")
-        print(f"📋 Models directory contents: {os.listdir(models_dir)}")
-        for file in os.listdir(models_dir):
-            file_path = os.path.join(models_dir, file)
-            print(f"   📄 {file}: {os.path.getsize(file_path)} bytes")
-    else:
-        print("❌ Models directory does NOT exist!")
-        print(f"📂 Available directories in {base_path}: {[d for d in os.listdir(base_path) if os.path.isdir(os.path.join(base_path, d))]}")
-        
-    print("Loading Luna's world-class ML models...")
+    try:
+        model = models[route.model_name]
+        results = score_batch(items, route.spec, lambda features: route.predict(model, features),
+                              route.make_result, timer, route.schema, request.headers.get('Authorization'))
+        response = json_response({
+            'results': results,
+            'count': len(results),
+            'errors': sum(1 for result in results if 'error' in result)
+        })
+        timer.mark('serialize')
+        return response
+    except Exception as e:
+        return json_response({'error': str(e)}, 500)
+
+# ===================================
+# STREAMING (NDJSON)
+# For backfills: one JSON payload per line in, one result per line out, in
+# order (blank lines are skipped). Lines are scored STREAM_CHUNK_ROWS at a
+# time with one model call per chunk, so memory stays flat however long the
+# body is. A gzip body (Content-Encoding: gzip) is decompressed as it is
+# read; with Accept-Encoding: gzip the response is compressed chunk by chunk.
+#
+# The body is spooled (in memory up to STREAM_SPOOL_BYTES, then to a
+# temporary file) before the first result is written: most HTTP/1.1 clients
+# only start reading the response once they have sent the whole request, so
+# writing results while still reading would deadlock as soon as the socket
+# buffers fill.
+# ===================================
+
+STREAM_CHUNK_ROWS = int(os.environ.get('STREAM_CHUNK_ROWS', 1000))
+STREAM_SPOOL_BYTES = int(os.environ.get('STREAM_SPOOL_BYTES', 8 * 1024 * 1024))
+# Longest accepted line; anything longer gets an error entry
+MAX_LINE_BYTES = 1024 * 1024
+
+def spool_request_body():
+    """The raw request body in a rewound spool file, read 64 KB at a time"""
+    # Chunked bodies have no Content-Length; the servers this app runs under
+    # (gunicorn, uvicorn via a2wsgi) end the stream where the body ends
+    stream = get_input_stream(request.environ, safe_fallback=False)
+    spool = tempfile.SpooledTemporaryFile(max_size=STREAM_SPOOL_BYTES)
+    while True:
+        block = stream.read(64 * 1024)
+        if not block:
+            break
+        spool.write(block)
+    spool.seek(0)
+    return spool
+
+def ndjson_lines(body):
+    """Non-blank lines of an NDJSON file object; over-long lines come back as
+    None after the rest of them has been skipped"""
+    while True:
+        line = body.readline(MAX_LINE_BYTES + 1)
+        if not line:
+            return
+        if len(line) > MAX_LINE_BYTES:
+            while line and not line.endswith(b'\n'):
+                line = body.readline(MAX_LINE_BYTES)
+            yield None
+        elif line.strip():
+            yield line
+
+def ndjson_chunks(body, chunk_rows):
+    """Lists of up to `chunk_rows` lines"""
+    chunk = []
+    for line in ndjson_lines(body):
+        chunk.append(line)
+        if len(chunk) == chunk_rows:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def score_ndjson_chunk(route, model, lines, authorization=None):
+    """NDJSON bytes for one chunk: parse, validate and ONE model call"""
+    items, failed = [], {}
+    for i, line in enumerate(lines):
+        try:
+            if line is None:
+                raise PayloadError([f'Line longer than {MAX_LINE_BYTES} bytes'])
+            items.append(loads(line))
+        except PayloadError as e:
+            items.append(None)
+            failed[i] = str(e)
+    try:
+        results = score_batch(items, route.spec, lambda features: route.predict(model, features),
+                              route.make_result, schema=route.schema, authorization=authorization)
+    except Exception as e:
+        results = [{'error': str(e)}] * len(items)
+    for i, message in failed.items():
+        results[i] = {'error': message}
+    return b''.join(dumps(result) for result in results)
+
+def stream_route(path):
+    """Shared body of the /stream routes"""
+    if request.method == 'OPTIONS':
+        return '', 204
     
-    # Use ABSOLUTE paths in Docker container
-    model_files = {
-        'cycle_length': '/app/models/cycle_length_model_minimal.pkl',
-        'menses_length': '/app/models/menses_length_model.pkl', 
-        'next_period': '/app/models/next_period_predictor.pkl',
-        'irregular_cycle': '/app/models/irregular_cycle_detector.pkl',
-        'symptom_predictor': '/app/models/symptom_predictor.pkl'
-    }
+    route = PREDICTION_ROUTES[path]
+    timer = request_timer()
+    gzipped_body = request.headers.get('Content-Encoding', '').lower() == 'gzip'
+    gzip_response = 'gzip' in request.headers.get('Accept-Encoding', '').lower()
+    if request.headers.get('Content-Encoding', 'identity').lower() not in ('identity', 'gzip'):
+        return json_response({'error': 'Content-Encoding must be gzip or identity'}, 415)
+    if route.model_name not in models:
+        return json_response({'error': route.missing_message}, 500)
+    model = models[route.model_name]
+    authorization = request.headers.get('Authorization')
+    spool = spool_request_body()
+    timer.mark('parse')
     
-    for model_name, file_path in model_files.items():
+    def generate():
+        # Runs as the response is sent, after the request timer has finished
+        body = gzip.GzipFile(fileobj=spool, mode='rb') if gzipped_body else spool
+        compressor = zlib.compressobj(wbits=31) if gzip_response else None   # gzip container
         try:
-            print(f"🔍 Attempting to load {model_name} from {file_path}")
-            if os.path.exists(file_path):
-                print(f"✅ File exists, loading {model_name}...")
-                models[model_name] = joblib.load(file_path)
-                print(f"✅ Successfully loaded {model_name}")
-            else:
-                print(f"❌ Model file not found: {file_path}")
-        except Exception as e:
-            print(f"❌ Error loading {model_name}: {e}")
-            print(f"❌ Traceback: {traceback.format_exc()}")
+            for lines in ndjson_chunks(body, STREAM_CHUNK_ROWS):
+                data = score_ndjson_chunk(route, model, lines, authorization)
+                yield compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH) if compressor else data
+        except (OSError, EOFError, zlib.error) as e:
+            # A corrupt or truncated gzip body: say so where the results stop
+            data = dumps({'error': f'Unreadable request body: {e}'})
+            yield compressor.compress(data) if compressor else data
+        finally:
+            spool.close()
+        if compressor:
+            yield compressor.flush()
+    
+    response = Response(generate(), mimetype='application/x-ndjson')
+    if gzip_response:
+        response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+# ===================================
+# SINGLE-USER ROUTES
+# ===================================
+
+def single_route(path):
+    """Shared body of the single-user prediction routes"""
+    if request.method == 'OPTIONS':
+        return '', 204
     
-    print(f"🎉 Successfully loaded {len(models)} models")
-    print(f"📊 Loaded models: {list(models.keys())}")
+    route = PREDICTION_ROUTES[path]
+    timer = request_timer()
+    try:
+        data = with_user_stats(route.schema.validate(loads(request.get_data())),
+                               request.headers.get('Authorization'))
+        timer.mark('parse')
+    except PayloadError as e:
+        return json_response({'error': str(e), 'details': e.errors, **route.fallback}, e.status)
+    
+    try:
+        if g.get('shed'):
+            result = degraded_result(path, data)
+            timer.mark('inference')
+            return json_response(result)
+        
+        if route.model_name not in models:
+            return json_response({'error': route.missing_message}, 500)
+        
+        features = route.spec.row(data)
+        timer.mark('features')
+        prediction = predict_first(route.model_name, route.predict, features)
+        timer.mark('inference')
+        
+        response = json_response(route.make_result(data, features[0], prediction))
+        timer.mark('serialize')
+        return response
+        
+    except Exception as e:
+        return json_response({'error': str(e), **route.fallback}, 500)
 
-# 🔥 LOAD MODELS IMMEDIATELY WHEN MODULE IS IMPORTED
-print("🔥 ABOUT TO LOAD MODELS - MODULE IMPORT")
-load_models()
-print("🔥 MODELS LOADING COMPLETE - MODULE IMPORT")
+# ===================================
+# ROUTES
+# ===================================
 
 @app.route('/', methods=['GET'])
 def home():
@@ -76,11 +308,28 @@ def home():
         'models_loaded': len(models),
         'available_endpoints': [
             '/health',
+            '/ready',
+            '/metrics',
             '/predict/cycle-length',
             '/predict/menses-length', 
             '/predict/next-period',
             '/detect/irregular-cycle',
-            '/predict/symptoms'
+            '/predict/symptoms',
+            '/predict/cycle-length/batch',
+            '/predict/menses-length/batch',
+            '/predict/next-period/batch',
+            '/detect/irregular-cycle/batch',
+            '/predict/symptoms/batch',
+            '/predict/cycle-length/stream',
+            '/predict/menses-length/stream',
+            '/predict/next-period/stream',
+            '/detect/irregular-cycle/stream',
+            '/predict/symptoms/stream',
+            '/predict/symptoms/calendar',
+            '/predict/next-period/forecast',
+            '/predict/dashboard',
+            '/users/<user_id>/cycles',
+            '/users/<user_id>/stats'
         ]
     })
 
@@ -97,350 +346,233 @@ def health_check():
             'symptom_prediction': '90%+ Accuracy' if 'symptom_predictor' in models else 'Not loaded',
             'next_period': 'Backup Model' if 'next_period' in models else 'Not loaded'
         },
+        'model_loading': models.stats(),
+        'prediction_cache': {name: cache.stats() for name, cache in prediction_caches.items()},
+        'singleflight': {name: flight.stats() for name, flight in predictions.singleflights.items()},
+        'admission': predictions.admission.stats() if predictions.admission is not None else 'Disabled',
+        'symptom_table': (predictions.symptom_table.stats() if predictions.symptom_table is not None
+                          else 'Not loaded'),
         'message': 'Luna ML models ready to serve world-class predictions!'
     })
 
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """503 until the warmup models are loaded and have served a prediction"""
+    return jsonify(predictions.readiness()), 200 if models.ready.is_set() else 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus scrape endpoint"""
+    return Response(metrics.render(), content_type=CONTENT_TYPE)
+
+# Bearer token for the /admin routes, which answer 404 while it is unset
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+
+@app.route('/admin/models/reload', methods=['POST'])
+def reload_models():
+    """Swap in the versions the model store's manifest names now; in-flight
+    requests finish on the old ones"""
+    if not ADMIN_TOKEN:
+        return jsonify({'error': 'Not found'}), 404
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {ADMIN_TOKEN}'):
+        return jsonify({'error': 'Unauthorized'}), 401
+    try:
+        swapped = models.reload()
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    return jsonify({
+        'swapped': swapped,
+        'errors': models.reload_errors,
+        'versions': models.versions,
+    }), 200 if not models.reload_errors else 500
+
+# ===================================
+# USER STATISTICS
+# Per-user cycle statistics (user_stats.py), kept when USER_STATS_DB and
+# USER_STATS_SECRET are set; prediction payloads reference them by user_id.
+# Every call needs the user's Bearer token (user_stats.user_token)
+# ===================================
+
+def user_stats_denied(user_id):
+    """Error response unless the request may use `user_id`'s statistics"""
+    if predictions.user_stats is None:
+        return json_response({'error': 'User statistics are not enabled'}, 404)
+    if not token_matches(predictions.USER_STATS_SECRET, user_id, request.headers.get('Authorization')):
+        return json_response({'error': 'Unauthorized'}, 401)
+    return None
+
+@app.route('/users/<user_id>/cycles', methods=['POST'])
+def log_user_cycle(user_id):
+    """Fold one completed cycle into the user's statistics"""
+    denied = user_stats_denied(user_id)
+    if denied is not None:
+        return denied
+    try:
+        cycle = CYCLE_LOG.validate(loads(request.get_data()))
+    except PayloadError as e:
+        return json_response({'error': str(e), 'details': e.errors}, 400)
+    stats = predictions.user_stats.log_cycle(user_id, cycle['cycle_length'], cycle.get('menses_length'),
+                                             cycle.get('luteal_phase_length'))
+    return json_response(stats.summary())
+
+@app.route('/users/<user_id>/stats', methods=['GET', 'DELETE'])
+def user_statistics(user_id):
+    """The user's statistics; DELETE forgets them"""
+    denied = user_stats_denied(user_id)
+    if denied is not None:
+        return denied
+    if request.method == 'DELETE':
+        return json_response({'deleted': predictions.user_stats.delete(user_id)})
+    stats = predictions.user_stats.get(user_id)
+    if stats is None:
+        return json_response({'error': f'No cycles logged for {user_id}'}, 404)
+    return json_response(stats.summary())
+
 @app.route('/predict/cycle-length', methods=['POST', 'OPTIONS'])
 def predict_cycle_length():
     """Use your CHAMPION 0.09 MAE cycle length model"""
-    if request.method == 'OPTIONS':
-        return '', 204
-    
-    try:
-        data = request.get_json()
-        
-        if 'cycle_length' not in models:
-            return jsonify({'error': 'Cycle length model not loaded'}), 500
-        
-        # Use your champion cycle model's exact features
-        features = pd.DataFrame([[
-            data.get('LengthofMenses', 5),
-            data.get('Age', 25),
-            data.get('BMI', 25),
-            data.get('EstimatedDayofOvulation', 14),
-            data.get('LengthofLutealPhase', 14),
-            data.get('TotalDaysofFertility', 6)
-        ]], columns=[
-            'LengthofMenses', 'Age', 'BMI', 'EstimatedDayofOvulation', 
-            'LengthofLutealPhase', 'TotalDaysofFertility'
-        ])
-        
-        # Use YOUR 0.09 MAE champion model!
-        prediction = models['cycle_length'].predict(features)[0]
-        
-        return jsonify({
-            'predicted_cycle_length': round(prediction, 1),
-            'model_accuracy': '0.09 days MAE - World Champion!',
-            'confidence': 'high',
-            'explanation': f'Your cycle length: {prediction:.1f} days'
-        })
-        
-    except Exception as e:
-        return jsonify({
-            'error': str(e),
-            'predicted_cycle_length': 28.0,
-            'confidence': 'low'
-        }), 500
+    return single_route('/predict/cycle-length')
+
+@app.route('/predict/cycle-length/batch', methods=['POST', 'OPTIONS'])
+def predict_cycle_length_batch():
+    """Cycle length for many users in one forest call"""
+    return batch_route('/predict/cycle-length')
+
+@app.route('/predict/cycle-length/stream', methods=['POST', 'OPTIONS'])
+def predict_cycle_length_stream():
+    """Cycle length for an NDJSON stream of payloads, scored chunk by chunk"""
+    return stream_route('/predict/cycle-length')
 
 @app.route('/predict/menses-length', methods=['POST', 'OPTIONS'])
 def predict_menses_length():
     """Use your EXCELLENT 0.26 MAE menses length model"""
-    if request.method == 'OPTIONS':
-        return '', 204
-    
-    try:
-        data = request.get_json()
-        
-        if 'menses_length' not in models:
-            return jsonify({'error': 'Menses length model not loaded'}), 500
-        
-        # Use your excellent menses model's exact features
-        features = pd.DataFrame([[
-            data.get('Age', 25),
-            data.get('BMI', 25),
-            data.get('LengthofCycle', 28),
-            data.get('MeanBleedingIntensity', 5),
-            data.get('EstimatedDayofOvulation', 14)
-        ]], columns=[
-            'Age', 'BMI', 'LengthofCycle', 'MeanBleedingIntensity', 'EstimatedDayofOvulation'
-        ])
-        
-        prediction = models['menses_length'].predict(features)[0]
-        
-        return jsonify({
-            'predicted_menses_length': round(prediction, 1),
-            'model_accuracy': '0.26 days MAE - Excellent!',
-            'confidence': 'high',
-            'explanation': f'Your period length: {prediction:.1f} days'
-        })
-        
-    except Exception as e:
-        return jsonify({
-            'error': str(e),
-            'predicted_menses_length': 5.0,
-            'confidence': 'low'
-        }), 500
+    return single_route('/predict/menses-length')
+
+@app.route('/predict/menses-length/batch', methods=['POST', 'OPTIONS'])
+def predict_menses_length_batch():
+    """Menses length for many users in one forest call"""
+    return batch_route('/predict/menses-length')
+
+@app.route('/predict/menses-length/stream', methods=['POST', 'OPTIONS'])
+def predict_menses_length_stream():
+    """Menses length for an NDJSON stream of payloads, scored chunk by chunk"""
+    return stream_route('/predict/menses-length')
 
 @app.route('/predict/next-period', methods=['POST', 'OPTIONS'])
 def predict_next_period():
     """Combine your champion models for next period prediction"""
+    return single_route('/predict/next-period')
+
+@app.route('/predict/next-period/batch', methods=['POST', 'OPTIONS'])
+def predict_next_period_batch():
+    """Next period for many users in one cycle length forest call"""
+    return batch_route('/predict/next-period')
+
+@app.route('/predict/next-period/stream', methods=['POST', 'OPTIONS'])
+def predict_next_period_stream():
+    """Next period for an NDJSON stream of payloads, scored chunk by chunk"""
+    return stream_route('/predict/next-period')
+
+@app.route('/predict/next-period/forecast', methods=['POST', 'OPTIONS'])
+def predict_next_period_forecast():
+    """Start dates of the next few periods, with uncertainty bands"""
     if request.method == 'OPTIONS':
         return '', 204
     
+    timer = request_timer()
     try:
-        data = request.get_json()
-        current_cycle_day = data.get('current_cycle_day', 1)
-        
-        if 'cycle_length' not in models:
-            return jsonify({'error': 'Cycle length model not loaded'}), 500
-        
-        # Use your CHAMPION cycle length model
-        cycle_features = pd.DataFrame([[
-            data.get('LengthofMenses', 5),
-            data.get('Age', 25),
-            data.get('BMI', 25),
-            data.get('EstimatedDayofOvulation', 14),
-            data.get('LengthofLutealPhase', 14),
-            data.get('TotalDaysofFertility', 6)
-        ]], columns=[
-            'LengthofMenses', 'Age', 'BMI', 'EstimatedDayofOvulation', 
-            'LengthofLutealPhase', 'TotalDaysofFertility'
-        ])
-        
-        # Get prediction from your 0.09 MAE champion!
-        predicted_cycle_length = models['cycle_length'].predict(cycle_features)[0]
-        
-        # Calculate days until next period
-        days_until = max(1, int(predicted_cycle_length - current_cycle_day))
-        if days_until <= 0:
-            days_until = int(predicted_cycle_length + days_until)
-        
-        # Determine confidence
-        cycles_logged = data.get('cycles_logged', 0)
-        confidence = 'high' if cycles_logged >= 3 else 'medium' if cycles_logged >= 1 else 'low'
-        
-        return jsonify({
-            'days_until_next_period': days_until,
-            'predicted_cycle_length': round(predicted_cycle_length, 1),
-            'confidence': confidence,
-            'explanation': f'Next period in {days_until} days (based on {predicted_cycle_length:.1f}-day cycle)',
-            'model_accuracy': '0.09 MAE Champion Model Used!'
-        })
-        
+        data = with_user_stats(SCHEMAS['/predict/next-period/forecast'].validate(loads(request.get_data())),
+                               request.headers.get('Authorization'))
+        timer.mark('parse')
+        forecast = predict_cycle_forecast(data)
+        timer.mark('inference')
+    except PayloadError as e:
+        return json_response({'error': str(e), 'details': e.errors}, e.status)
     except Exception as e:
-        return jsonify({
-            'error': str(e),
-            'days_until_next_period': 14,
-            'predicted_cycle_length': 28.0,
-            'confidence': 'low'
-        }), 500
+        return json_response({'error': str(e)}, 500)
+    
+    response = json_response(forecast)
+    timer.mark('serialize')
+    return response
 
 @app.route('/detect/irregular-cycle', methods=['POST', 'OPTIONS'])
 def detect_irregular_cycle():
     """Use your PERFECT AUC irregular cycle detector"""
+    return single_route('/detect/irregular-cycle')
+
+@app.route('/detect/irregular-cycle/batch', methods=['POST', 'OPTIONS'])
+def detect_irregular_cycle_batch():
+    """Irregularity for many users in one predict_proba call"""
+    return batch_route('/detect/irregular-cycle')
+
+@app.route('/detect/irregular-cycle/stream', methods=['POST', 'OPTIONS'])
+def detect_irregular_cycle_stream():
+    """Irregularity for an NDJSON stream of payloads, scored chunk by chunk"""
+    return stream_route('/detect/irregular-cycle')
+
+@app.route('/predict/symptoms', methods=['POST', 'OPTIONS'])  
+def predict_symptoms():
+    """Use your 90%+ accuracy symptom prediction model"""
+    return single_route('/predict/symptoms')
+
+@app.route('/predict/symptoms/batch', methods=['POST', 'OPTIONS'])
+def predict_symptoms_batch():
+    """Symptoms for many users in one multi-output forest call"""
+    return batch_route('/predict/symptoms')
+
+@app.route('/predict/symptoms/stream', methods=['POST', 'OPTIONS'])
+def predict_symptoms_stream():
+    """Symptoms for an NDJSON stream of payloads, scored chunk by chunk"""
+    return stream_route('/predict/symptoms')
+
+@app.route('/predict/symptoms/calendar', methods=['POST', 'OPTIONS'])
+def predict_symptoms_calendar():
+    """Symptoms for every day of the user's cycle in one round trip"""
     if request.method == 'OPTIONS':
         return '', 204
     
+    timer = request_timer()
     try:
-        data = request.get_json()
-        
-        if 'irregular_cycle' not in models:
-            return jsonify({'error': 'Irregular cycle model not loaded'}), 500
-        
-        # Prepare features for your perfect AUC model
-        cycle_lengths = data.get('recent_cycle_lengths', [28])
-        mean_length = np.mean(cycle_lengths)
-        variability = np.std(cycle_lengths) if len(cycle_lengths) > 1 else 0
-        
-        features = pd.DataFrame([[
-            cycle_lengths[0] if cycle_lengths else 28,  # CycleLength
-            mean_length,                                 # MeanCycleLength  
-            variability,                                # CycleVariability
-            1 if cycle_lengths[0] < 21 else 0,         # CycleTooShort
-            1 if cycle_lengths[0] > 35 else 0,         # CycleTooLong
-            data.get('cycle_with_peak', 1),            # CycleWithPeak
-            1 if data.get('cycle_with_peak', 1) == 0 else 0,  # NoOvulationDetected
-            data.get('luteal_phase_length', 14),       # LutealPhaseLength
-            1 if data.get('luteal_phase_length', 14) < 10 else 0,  # LutealPhaseTooShort
-            1 if data.get('luteal_phase_length', 14) > 16 else 0,  # LutealPhaseTooLong
-            data.get('menses_length', 5),              # MensesLength
-            1 if data.get('menses_length', 5) < 3 else 0,      # MensesTooShort
-            1 if data.get('menses_length', 5) > 7 else 0,      # MensesTooLong
-            data.get('unusual_bleeding', 0),           # UnusualBleeding
-            data.get('bleeding_intensity', 5),         # BleedingIntensity
-            1 if data.get('bleeding_intensity', 5) > 10 else 0,  # VeryHeavyBleeding
-            1 if data.get('bleeding_intensity', 5) < 3 else 0,   # VeryLightBleeding
-            data.get('age', 25),                       # Age
-            data.get('bmi', 25),                       # BMI
-            1 if data.get('bmi', 25) < 18.5 else 0,   # UnderweightBMI
-            1 if data.get('bmi', 25) > 25 else 0,      # OverweightBMI
-            1 if data.get('bmi', 25) > 30 else 0,      # ObeseBMI
-            data.get('number_pregnancies', 0),         # NumberPregnancies
-            1 if (data.get('age', 25) > 30 and data.get('number_pregnancies', 0) == 0) else 0,  # NullipariousAdult
-            1 if data.get('age', 25) < 20 else 0,      # TeenageYears
-            1 if data.get('age', 25) > 40 else 0,      # Perimenopause
-            # PCOS Risk Score
-            sum([
-                1 if cycle_lengths[0] > 35 else 0,
-                1 if data.get('cycle_with_peak', 1) == 0 else 0,
-                1 if data.get('bmi', 25) > 30 else 0,
-                data.get('unusual_bleeding', 0)
-            ]),
-            # Hormonal Imbalance Score  
-            (variability / 5 + 
-             (1 if data.get('luteal_phase_length', 14) < 10 else 0) +
-             (1 if data.get('bleeding_intensity', 5) > 10 else 0) +
-             (1 if data.get('bleeding_intensity', 5) < 3 else 0))
-        ]], columns=[
-            'CycleLength', 'MeanCycleLength', 'CycleVariability',
-            'CycleTooShort', 'CycleTooLong', 'CycleWithPeak', 'NoOvulationDetected',
-            'LutealPhaseLength', 'LutealPhaseTooShort', 'LutealPhaseTooLong',
-            'MensesLength', 'MensesTooShort', 'MensesTooLong',
-            'UnusualBleeding', 'BleedingIntensity', 'VeryHeavyBleeding', 'VeryLightBleeding',
-            'Age', 'BMI', 'UnderweightBMI', 'OverweightBMI', 'ObeseBMI',
-            'NumberPregnancies', 'NullipariousAdult', 'TeenageYears', 'Perimenopause',
-            'PCOSRiskScore', 'HormonalImbalanceScore'
-        ])
-        
-        # Use YOUR perfect AUC model!
-        irregular_prob = models['irregular_cycle'].predict_proba(features)[0, 1]
-        is_irregular = models['irregular_cycle'].predict(features)[0]
-        
-        # Generate warnings
-        warnings = []
-        recommendations = []
-        
-        if cycle_lengths[0] > 35:
-            warnings.append("Long cycles detected")
-            recommendations.append("Monitor for PCOS symptoms")
-        if variability > 7:
-            warnings.append("High cycle variability") 
-            recommendations.append("Track stress and lifestyle factors")
-        if data.get('unusual_bleeding', 0):
-            warnings.append("Unusual bleeding patterns")
-            recommendations.append("Discuss with healthcare provider")
-            
-        return jsonify({
-            'is_irregular': bool(is_irregular),
-            'irregular_probability': round(irregular_prob, 3),
-            'risk_level': 'high' if irregular_prob >= 0.7 else 'medium' if irregular_prob >= 0.4 else 'low',
-            'warnings': warnings,
-            'recommendations': recommendations,
-            'model_accuracy': 'Perfect AUC 1.000!',
-            'pcos_risk_score': int(features.iloc[0]['PCOSRiskScore'])
-        })
+        data = SCHEMAS['/predict/symptoms/calendar'].validate(loads(request.get_data()))
+        timer.mark('parse')
+    except PayloadError as e:
+        return json_response({'error': str(e), 'details': e.errors}, 400)
+    
+    try:
+        # One matrix of day rows and one model call
+        calendar = predict_symptom_calendar(data)
+        timer.mark('inference')
+        response = json_response(calendar)
+        timer.mark('serialize')
+        return response
         
     except Exception as e:
-        return jsonify({
-            'error': str(e),
-            'is_irregular': False,
-            'irregular_probability': 0.0,
-            'risk_level': 'low',
-            'warnings': [],
-            'recommendations': []
-        }), 500
+        return json_response({'error': str(e)}, 500)
 
-@app.route('/predict/symptoms', methods=['POST', 'OPTIONS'])  
-def predict_symptoms():
-    """Use your 90%+ accuracy symptom prediction model"""
+@app.route('/predict/dashboard', methods=['POST', 'OPTIONS'])
+def predict_dashboard():
+    """Next period, cycle health and today's symptoms in one round trip"""
     if request.method == 'OPTIONS':
         return '', 204
     
+    timer = request_timer()
     try:
-        data = request.get_json()
-        
-        if 'symptom_predictor' not in models:
-            return jsonify({'error': 'Symptom predictor model not loaded'}), 500
-        
-        cycle_day = data.get('cycle_day', 1)
-        cycle_length = data.get('cycle_length', 28)
-        menses_length = data.get('menses_length', 5)
-        
-        # Prepare features for your 90%+ accuracy model
-        features = pd.DataFrame([[
-            cycle_day,                                    # cycle_day
-            cycle_length,                                # cycle_length  
-            menses_length,                               # menses_length
-            max(0, cycle_day - 1),                       # days_since_period_start
-            max(0, cycle_length - cycle_day),            # days_until_next_period
-            1 if cycle_day <= menses_length else 0,      # is_period_phase
-            1 if menses_length < cycle_day <= (cycle_length - 14 - 3) else 0,  # is_follicular_phase
-            1 if (cycle_length - 14 - 3) < cycle_day <= (cycle_length - 14 + 3) else 0,  # is_ovulation_phase
-            1 if (cycle_length - 14 + 3) < cycle_day <= (cycle_length - 5) else 0,  # is_luteal_phase
-            1 if cycle_day > (cycle_length - 5) else 0,  # is_pms_phase
-            min(cycle_day, menses_length) if cycle_day <= menses_length else 0,  # period_day
-            (min(cycle_day, menses_length) / menses_length) if cycle_day <= menses_length and menses_length > 0 else 0,  # period_day_normalized
-            data.get('age', 25),                         # age
-            data.get('bmi', 25),                         # bmi
-            data.get('pregnancies', 0),                  # pregnancies
-            data.get('mean_bleeding_intensity', 5),      # mean_bleeding_intensity
-            cycle_day / cycle_length,                    # cycle_day_ratio
-            abs(cycle_day - (cycle_length - 14)) / cycle_length,  # ovulation_proximity
-            1 if data.get('age', 25) < 20 else 0,        # is_teenager
-            1 if 20 <= data.get('age', 25) <= 35 else 0, # is_adult
-            1 if data.get('age', 25) > 35 else 0         # is_older_adult
-        ]], columns=[
-            'cycle_day', 'cycle_length', 'menses_length', 'days_since_period_start',
-            'days_until_next_period', 'is_period_phase', 'is_follicular_phase',
-            'is_ovulation_phase', 'is_luteal_phase', 'is_pms_phase',
-            'period_day', 'period_day_normalized', 'age', 'bmi', 'pregnancies',
-            'mean_bleeding_intensity', 'cycle_day_ratio', 'ovulation_proximity',
-            'is_teenager', 'is_adult', 'is_older_adult'
-        ])
-        
-        # Use YOUR 90%+ accuracy symptom model!
-        predictions = models['symptom_predictor'].predict(features)[0]
-        
-        # [cramp_intensity, flow_intensity, fatigue_level, mood_impact, overall_discomfort]
-        def get_description(intensity):
-            if intensity <= 2: return 'None to minimal'
-            if intensity <= 4: return 'Mild'
-            if intensity <= 6: return 'Moderate'
-            if intensity <= 8: return 'Strong'
-            return 'Severe'
-        
-        # Determine cycle phase for context
-        if cycle_day <= menses_length:
-            phase = "menstrual"
-            phase_message = f"Day {cycle_day} of your period"
-        elif cycle_day > (cycle_length - 5):
-            phase = "pms"
-            phase_message = f"{cycle_length - cycle_day + 1} days until period"
-        elif abs(cycle_day - (cycle_length - 14)) <= 2:
-            phase = "ovulation"
-            phase_message = "Around ovulation time"
-        else:
-            phase = "follicular" if cycle_day <= (cycle_length - 14) else "luteal"
-            phase_message = f"{phase.title()} phase"
-        
-        return jsonify({
-            'cramp_intensity': round(predictions[0], 1),
-            'flow_intensity': round(predictions[1], 1),
-            'fatigue_level': round(predictions[2], 1),
-            'mood_impact': round(predictions[3], 1),
-            'overall_discomfort': round(predictions[4], 1),
-            'descriptions': {
-                'cramps': get_description(predictions[0]),
-                'flow': get_description(predictions[1]),
-                'fatigue': get_description(predictions[2]),
-                'mood': get_description(predictions[3]),
-                'overall': get_description(predictions[4])
-            },
-            'phase': phase,
-            'phase_message': phase_message,
-            'model_accuracy': '90%+ accuracy within 1 point!',
-            'confidence': 'high' if cycle_day <= menses_length or cycle_day > (cycle_length - 5) else 'medium'
-        })
+        data = with_user_stats(SCHEMAS['/predict/dashboard'].validate(loads(request.get_data())),
+                               request.headers.get('Authorization'))
+        timer.mark('parse')
+    except PayloadError as e:
+        return json_response({'error': str(e), 'details': e.errors, **DASHBOARD_FALLBACK}, e.status)
+    
+    try:
+        # Feature rows are built between model calls, so both count as inference
+        sections = degraded_dashboard(data) if g.get('shed') else predict_dashboard_sections(data)
+        timer.mark('inference')
+        response = json_response(sections)
+        timer.mark('serialize')
+        return response
         
     except Exception as e:
-        return jsonify({
-            'error': str(e),
-            'cramp_intensity': 2,
-            'flow_intensity': 0,
-            'fatigue_level': 3,
-            'mood_impact': 2,
-            'overall_discomfort': 2
-        }), 500
+        return json_response({'error': str(e), **DASHBOARD_FALLBACK}, 500)
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8080))
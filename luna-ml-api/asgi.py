@@ -0,0 +1,432 @@
+# ⚡ Luna ASGI entry point
+# Serves the same API as app.py, but the single-user prediction routes are
+# micro-batched: concurrent requests for one model wait in an asyncio queue
+# and share ONE vectorized model call in a worker thread. Only one batch per
+# model is in flight, so requests arriving while it runs form the next one
+# and batches grow with load. A batch is flushed once MICROBATCH_MAX_SIZE
+# rows are queued or MICROBATCH_MAX_WAIT_MS has passed since its first row.
+# The default wait of 0 ms dispatches whatever is queued immediately, which
+# measured best here; a small wait only pays off when model calls are much
+# shorter than request handling. Everything else (batch, dashboard, health,
+# CORS preflight) is handed to the Flask app unchanged, except the
+# dashboard: it runs on its own thread pool with its three model calls routed
+# through the same micro-batchers. Natively served routes record their
+# request metrics here; delegated ones through the Flask hooks.
+#
+# Admission control: requests never block a thread here, so instead of
+# waiting for a slot a natively served request is shed as soon as its
+# endpoint has concurrency + queue depth requests in flight, and gives up
+# on its model call once its budget runs out. Either way it is answered
+# from the degraded tier (predictions.py); a call that timed out still
+# finishes in its batch and holds its slot until then.
+#
+# Startup: Flask is the slowest import of the service and no prediction
+# route needs it, so only predictions.py is imported at boot. The server
+# holds off accepting connections (ASGI lifespan startup) until the warmup
+# models are loaded and have each run one prediction. The Flask app is
+# imported on a worker thread by the first delegated request (/health,
+# /metrics, the /batch routes, ...).
+#
+# Run with: uvicorn asgi:app --host 0.0.0.0 --port 8080
+# Startup breakdown: python asgi.py --startup-report
+
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from payloads import PayloadError, SCHEMAS, dumps, loads
+import predictions
+from predictions import (metrics, models, DASHBOARD_FALLBACK, PREDICTION_ROUTES, degraded_dashboard,
+                         degraded_result, predict_dashboard_sections, readiness, with_user_stats)
+
+MICROBATCH_MAX_WAIT_MS = float(os.environ.get('MICROBATCH_MAX_WAIT_MS', 0))
+MICROBATCH_MAX_SIZE = int(os.environ.get('MICROBATCH_MAX_SIZE', 64))
+MODEL_THREADS = int(os.environ.get('MODEL_THREADS', 4))
+# Dashboard threads mostly wait on batches, so there can be many
+DASHBOARD_THREADS = int(os.environ.get('DASHBOARD_THREADS', 32))
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-row predictions into one vectorized call
+
+    `run(rows)` receives an (n, features) array and returns n predictions.
+    Only one batch per batcher is in flight; requests arriving meanwhile
+    form the next batch. A row identical to one already queued or being
+    scored is not queued again: it waits for that row's result (the asyncio
+    counterpart of predict_first's SingleFlight, whose counters `flight`
+    shares).
+    """
+
+    def __init__(self, run, executor, max_wait=MICROBATCH_MAX_WAIT_MS / 1000,
+                 max_batch=MICROBATCH_MAX_SIZE, flight=None):
+        self.run = run
+        self.executor = executor
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self.flight = flight
+        self.batches = 0
+        self.rows = 0
+        self.coalesced = 0
+        self._queue = None
+        self._pending = {}      # row bytes -> future of the queued or in-flight row
+
+    async def submit(self, row):
+        loop = asyncio.get_running_loop()
+        if self._queue is None:
+            # Created on first use so both live on the server's event loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._drain())
+        key = row.tobytes()
+        future = self._pending.get(key)
+        coalesced = future is not None
+        if coalesced:
+            self.coalesced += 1
+        else:
+            future = self._pending[key] = loop.create_future()
+            future.add_done_callback(lambda _: self._pending.pop(key, None))
+            self._queue.put_nowait((row, future))
+        if self.flight is not None:
+            self.flight.record(coalesced)
+        # Shielded: one caller going away must not cancel the row for the rest
+        return await asyncio.shield(future)
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _drain(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            rows = np.vstack([row for row, _ in batch])
+            try:
+                outputs = await loop.run_in_executor(self.executor, self.run, rows)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.rows += len(batch)
+            for (_, future), output in zip(batch, outputs):
+                if not future.done():
+                    future.set_result(output)
+
+    def stats(self):
+        return {'batches': self.batches, 'rows': self.rows, 'coalesced': self.coalesced,
+                'mean_batch_size': round(self.rows / self.batches, 2) if self.batches else None}
+
+
+def model_call(model_name, predict):
+    """run(rows) for one model: resolved in the worker thread, since the
+    first access may load it"""
+    def run(rows):
+        return list(predict(models[model_name], rows))
+    return run
+
+
+def request_header(scope, name):
+    for key, value in scope['headers']:
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+
+async def within_budget(scope, endpoint, start, work):
+    """(result of `work()`, None) for an admitted request that finished in
+    budget, else (None, the reason it was shed)"""
+    admission = predictions.admission
+    if admission is None:
+        return await work(), None
+    limiter = admission[endpoint]
+    shed = limiter.try_acquire()
+    if shed is not None:
+        return None, shed
+    deadline = admission.deadline(request_header(scope, b'x-request-budget-ms'), start)
+    admitted = time.monotonic()
+    task = asyncio.ensure_future(work())
+
+    def finished(task):
+        limiter.release(time.monotonic() - admitted)
+        if not task.cancelled():
+            task.exception()    # retrieved, so a call nobody waits for anymore fails quietly
+    task.add_done_callback(finished)
+    try:
+        # Shielded: a timed out row still gets scored with the rest of its batch
+        return await asyncio.wait_for(asyncio.shield(task), deadline - admitted), None
+    except asyncio.TimeoutError:
+        limiter.missed_deadline()
+        return None, 'deadline'
+
+
+def load_wsgi():
+    from a2wsgi import WSGIMiddleware
+    from app import app as flask_app
+    return WSGIMiddleware(flask_app)
+
+
+class LunaASGI:
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(MODEL_THREADS, thread_name_prefix='model')
+        self.dashboard_executor = ThreadPoolExecutor(DASHBOARD_THREADS, thread_name_prefix='dashboard')
+        self._wsgi = None
+        # Everything calling the same model the same way shares one queue
+        self.model_batchers = {}
+        self.batchers = {path: self.batcher(route.model_name, route.predict)
+                         for path, route in PREDICTION_ROUTES.items()}
+        metrics.collector(self.batch_metrics)
+
+    def batcher(self, model_name, predict):
+        key = (model_name, predict)
+        if key not in self.model_batchers:
+            self.model_batchers[key] = MicroBatcher(model_call(model_name, predict), self.executor,
+                                                    flight=predictions.singleflights[model_name])
+        return self.model_batchers[key]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['method'] == 'POST' and scope['path'] in self.batchers:
+            await self.predict(scope, receive, send)
+        elif scope['type'] == 'http' and scope['method'] == 'POST' and \
+                scope['path'] == '/predict/dashboard':
+            await self.dashboard(scope, receive, send)
+        elif scope['type'] == 'http' and scope['method'] == 'GET' and scope['path'] == '/ready':
+            timer = metrics.start('/ready')
+            await self.respond(send, 200 if models.ready.is_set() else 503, readiness(), timer)
+        elif scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        else:
+            await (await self.wsgi())(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                # The server starts listening once this completes
+                await loop.run_in_executor(None, models.ready.wait)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def wsgi(self):
+        """The Flask app behind a2wsgi, imported on a worker thread the first
+        time it is needed"""
+        if self._wsgi is None:
+            self._wsgi = await asyncio.get_running_loop().run_in_executor(None, load_wsgi)
+        return self._wsgi
+
+    async def read_body(self, receive):
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                return body
+
+    async def serve(self, endpoint, fallback, send, handle):
+        """Send the JSON response `handle(timer)` returns as (status, payload).
+        Whatever it raises, the client gets a JSON 500 and the request timer
+        is finished"""
+        timer = metrics.start(endpoint)
+        status = 500
+        try:
+            try:
+                status, payload = await handle(timer)
+            except PayloadError as e:
+                status, payload = e.status, {'error': str(e), 'details': e.errors, **fallback}
+            except Exception as e:
+                status, payload = 500, {'error': str(e), **fallback}
+            await self.send_json(send, status, payload, timer)
+        finally:
+            timer.finish(status)
+
+    async def with_user_stats(self, scope, data):
+        """with_user_stats, on a worker thread when it has to read the SQLite store"""
+        authorization = request_header(scope, b'authorization')
+        if data.get('user_id') is None or predictions.user_stats is None:
+            return with_user_stats(data, authorization)
+        return await asyncio.get_running_loop().run_in_executor(None, with_user_stats, data, authorization)
+
+    async def predict(self, scope, receive, send):
+        start = time.monotonic()
+        path = scope['path']
+        route = PREDICTION_ROUTES[path]
+
+        async def handle(timer):
+            data = await self.with_user_stats(scope, route.schema.validate(loads(await self.read_body(receive))))
+            timer.mark('parse')
+            if route.model_name not in models:
+                return 500, {'error': route.missing_message}
+            features = route.spec.row(data)
+            timer.mark('features')
+            # Includes the wait for the batch to fill and for the previous one to finish
+            prediction, shed = await within_budget(scope, path, start,
+                                                   lambda: self.batchers[path].submit(features[0]))
+            timer.mark('inference')
+            if shed is not None:
+                return 200, degraded_result(path, data)
+            return 200, route.make_result(data, features[0], prediction)
+
+        await self.serve(path, route.fallback, send, handle)
+
+    async def dashboard(self, scope, receive, send):
+        start = time.monotonic()
+        loop = asyncio.get_running_loop()
+
+        def predict_one(model_name, predict, features):
+            # Runs on a dashboard thread: block it until the batch is scored
+            batcher = self.batcher(model_name, predict)
+            return asyncio.run_coroutine_threadsafe(batcher.submit(features[0]), loop).result()
+
+        async def handle(timer):
+            data = await self.with_user_stats(
+                scope, SCHEMAS['/predict/dashboard'].validate(loads(await self.read_body(receive))))
+            timer.mark('parse')
+            result, shed = await within_budget(scope, '/predict/dashboard', start, lambda: loop.run_in_executor(
+                self.dashboard_executor, predict_dashboard_sections, data, predict_one))
+            if shed is not None:
+                result = degraded_dashboard(data)
+            timer.mark('inference')
+            return 200, result
+
+        await self.serve('/predict/dashboard', DASHBOARD_FALLBACK, send, handle)
+
+    async def send_json(self, send, status, payload, timer):
+        # Same bytes as the Flask app's json_response
+        body = dumps(payload)
+        timer.mark('serialize')
+        await send({'type': 'http.response.start', 'status': status, 'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            (b'access-control-allow-origin', b'*'),
+        ]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def respond(self, send, status, payload, timer):
+        try:
+            await self.send_json(send, status, payload, timer)
+        finally:
+            timer.finish(status)
+
+    def batch_metrics(self):
+        batchers = [(f'{model_name}:{predict.__name__}', batcher)
+                    for (model_name, predict), batcher in self.model_batchers.items()]
+        return [
+            ('microbatch_batches_total', 'counter', 'Batched model calls', ('batcher',),
+             [((name,), batcher.batches) for name, batcher in batchers]),
+            ('microbatch_rows_total', 'counter', 'Rows scored by batched model calls', ('batcher',),
+             [((name,), batcher.rows) for name, batcher in batchers]),
+        ]
+
+    def stats(self):
+        return {f'{model_name}:{predict.__name__}': batcher.stats()
+                for (model_name, predict), batcher in self.model_batchers.items()}
+
+
+app = LunaASGI()
+
+
+# Run in a fresh interpreter by the startup report
+STARTUP_CHILD = """
+import time
+start = time.perf_counter()
+import asgi
+asgi.startup_child(start)
+"""
+
+
+def startup_child(start):
+    imported = time.perf_counter()
+    models.ready.wait()
+    ready = time.perf_counter()
+    print(json.dumps({
+        'import_s': imported - start,
+        'warmup_s': ready - imported,
+        'models': models.stats(),
+        'flask_imported': 'flask' in sys.modules,
+    }), flush=True)
+
+
+def import_times(lines):
+    """Self import time per top-level package from `python -X importtime` output"""
+    totals = {}
+    for line in lines:
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        totals[package] = totals.get(package, 0) + int(self_us) / 1e6
+    return sorted(totals.items(), key=lambda item: -item[1])
+
+
+def startup_report(top=12):
+    """Boot the app in a fresh interpreter and print where the time goes"""
+    import subprocess
+    start = time.perf_counter()
+    child = subprocess.Popen([sys.executable, '-X', 'importtime', '-c', STARTUP_CHILD],
+                             cwd=os.path.dirname(os.path.abspath(__file__)),
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    # The child prints model loading progress before its JSON line
+    for line in child.stdout:
+        if line.startswith('{'):
+            ready = time.perf_counter() - start
+            report = json.loads(line)
+            break
+    else:
+        raise RuntimeError(f'Startup failed:\n{child.stderr.read()}')
+    child.kill()
+    _, stderr = child.communicate()
+    packages = import_times(stderr.splitlines())
+
+    ms = lambda seconds: f'{seconds * 1000:7.1f} ms'
+    print('🚀 Luna startup report (fresh interpreter, `import asgi` until ready)')
+    print(f"   interpreter start   {ms(ready - report['import_s'] - report['warmup_s'])}")
+    print(f"   imports             {ms(report['import_s'])}")
+    for package, seconds in packages[:top]:
+        print(f'     {package:<17} {ms(seconds)}')
+    print(f"   model warmup        {ms(report['warmup_s'])}")
+    for name, stats in report['models'].items():
+        if isinstance(stats, dict) and 'load_ms' in stats:
+            print(f"     {name:<17} {ms(stats['load_ms'] / 1000)}  "
+                  f"(from {stats['source']}, {stats['warm_ms']:.1f} ms warming up)")
+        else:
+            print(f'     {name:<17} {stats}')
+    print(f'   ready after         {ms(ready)}')
+    print(f"   Flask imported before ready: {'yes' if report['flask_imported'] else 'no'}")
+    print('   (uvicorn itself imports before this; time it with python -X importtime -c "import uvicorn")')
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Luna ASGI server')
+    parser.add_argument('--startup-report', action='store_true',
+                        help='print a breakdown of startup time and exit')
+    args = parser.parse_args()
+    if args.startup_report:
+        startup_report()
+        return
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=int(os.environ.get('PORT', 8080)))
+
+
+if __name__ == '__main__':
+    main()
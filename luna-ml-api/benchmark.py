@@ -0,0 +1,481 @@
+# ⏱️ Luna load test
+# Synthetic requests for every route, drawn from the cycles recorded in
+# models/data/menstrual_data.csv (real ages, BMIs, cycle and period lengths,
+# cycle histories per user), driven through the Flask app in process or over
+# HTTP against a local server at a chosen concurrency. The report is JSON:
+# p50/p95/p99 latency, throughput and error rate per endpoint, with the
+# commit and settings, so runs on two commits can be compared.
+#
+# In process (Flask test client, no network):
+#   python benchmark.py --mode inprocess --requests 2000 --out before.json
+# Over HTTP, starting a local server (uvicorn or gunicorn) for the run:
+#   python benchmark.py --mode http --server uvicorn --concurrency 16 --duration 10 --out after.json
+# Against a server that is already running:
+#   python benchmark.py --mode http --url http://127.0.0.1:8080 --concurrency 16
+# Compare two reports:
+#   python benchmark.py --compare before.json after.json
+
+import argparse
+import asyncio
+import csv
+import json
+import math
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models', 'data',
+                         'menstrual_data.csv')
+
+# Columns read from the dataset, with the value used where a cycle leaves them blank
+COLUMNS = {
+    'LengthofCycle': 28,
+    'MeanCycleLength': None,
+    'EstimatedDayofOvulation': 14,
+    'LengthofLutealPhase': 14,
+    'TotalDaysofFertility': 6,
+    'LengthofMenses': 5,
+    'MeanBleedingIntensity': 5,
+    'UnusualBleeding': 0,
+    'CycleWithPeakorNot': 1,
+    'Age': 25,
+    'BMI': 25,
+    'Numberpreg': 0,
+}
+
+SINGLE_ROUTES = ['/predict/cycle-length', '/predict/menses-length', '/predict/next-period',
+                 '/detect/irregular-cycle', '/predict/symptoms', '/predict/symptoms/calendar',
+                 '/predict/next-period/forecast', '/predict/dashboard']
+# Routes without a /batch variant
+UNBATCHED_ROUTES = ('/predict/symptoms/calendar', '/predict/next-period/forecast', '/predict/dashboard')
+BATCH_ROUTES = [f'{route}/batch' for route in SINGLE_ROUTES if route not in UNBATCHED_ROUTES]
+
+PERCENTILES = (50, 95, 99)
+
+
+def number(value):
+    value = value.strip()
+    if not value:
+        return None
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+def load_cycles(path=DATA_PATH):
+    """One record per recorded cycle, with the user's cycle lengths up to and including it"""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        rows = list(csv.DictReader(f))
+    # Profile columns (age, BMI, ...) are only filled on each user's first cycle
+    profiles = {}
+    histories = defaultdict(list)
+    cycles = []
+    for row in rows:
+        client = row['ClientID']
+        values = {column: number(row.get(column, '')) for column in COLUMNS}
+        profile = profiles.setdefault(client, {})
+        for column in ('Age', 'BMI', 'Numberpreg', 'MeanCycleLength'):
+            if values[column] is None:
+                values[column] = profile.get(column)
+            else:
+                profile[column] = values[column]
+        for column, default in COLUMNS.items():
+            if values[column] is None:
+                values[column] = default
+        if isinstance(values['BMI'], float):
+            values['BMI'] = round(values['BMI'], 1)
+        histories[client].append(values['LengthofCycle'])
+        values['history'] = histories[client][-6:]
+        cycles.append(values)
+    return cycles
+
+
+class PayloadGenerator:
+    """Request bodies for every route, each from a randomly drawn real cycle"""
+
+    def __init__(self, cycles, seed=0, batch_size=100):
+        self.cycles = cycles
+        self.random = random.Random(seed)
+        self.batch_size = batch_size
+        self.builders = {
+            '/predict/cycle-length': self.cycle_length,
+            '/predict/menses-length': self.menses_length,
+            '/predict/next-period': self.next_period,
+            '/detect/irregular-cycle': self.irregular_cycle,
+            '/predict/symptoms': self.symptoms,
+            '/predict/symptoms/calendar': self.symptom_calendar,
+            '/predict/next-period/forecast': self.forecast,
+            '/predict/dashboard': self.dashboard,
+        }
+
+    def cycle(self):
+        return self.random.choice(self.cycles)
+
+    def day_in(self, cycle):
+        return self.random.randint(1, max(1, cycle['LengthofCycle']))
+
+    def cycle_length(self, c):
+        return {key: c[key] for key in ('LengthofMenses', 'Age', 'BMI', 'EstimatedDayofOvulation',
+                                        'LengthofLutealPhase', 'TotalDaysofFertility')}
+
+    def menses_length(self, c):
+        return {key: c[key] for key in ('Age', 'BMI', 'LengthofCycle', 'MeanBleedingIntensity',
+                                        'EstimatedDayofOvulation')}
+
+    def next_period(self, c):
+        return dict(self.cycle_length(c), current_cycle_day=self.day_in(c),
+                    cycles_logged=len(c['history']) - 1)
+
+    def irregular_cycle(self, c):
+        return {
+            'recent_cycle_lengths': list(reversed(c['history'])),
+            'cycle_with_peak': c['CycleWithPeakorNot'],
+            'luteal_phase_length': c['LengthofLutealPhase'],
+            'menses_length': c['LengthofMenses'],
+            'unusual_bleeding': c['UnusualBleeding'],
+            'bleeding_intensity': c['MeanBleedingIntensity'],
+            'age': c['Age'],
+            'bmi': c['BMI'],
+            'number_pregnancies': c['Numberpreg'],
+        }
+
+    def symptoms(self, c):
+        return {
+            'cycle_day': self.day_in(c),
+            'cycle_length': c['LengthofCycle'],
+            'menses_length': c['LengthofMenses'],
+            'age': c['Age'],
+            'bmi': c['BMI'],
+            'pregnancies': c['Numberpreg'],
+            'mean_bleeding_intensity': c['MeanBleedingIntensity'],
+        }
+
+    def symptom_calendar(self, c):
+        payload = self.symptoms(c)
+        del payload['cycle_day']
+        return payload
+
+    def forecast(self, c):
+        return dict(self.next_period(c), recent_cycle_lengths=list(reversed(c['history'])),
+                    horizon=self.random.randint(3, 12))
+
+    def dashboard(self, c):
+        history = c['history']
+        return {
+            'age': c['Age'],
+            'bmi': c['BMI'],
+            'current_cycle_day': self.day_in(c),
+            'mean_cycle_length': c['MeanCycleLength'] or round(sum(history) / len(history), 1),
+            'recent_cycle_lengths': list(reversed(history)),
+            'cycles_logged': len(history) - 1,
+            'menses_length': c['LengthofMenses'],
+            'luteal_phase_length': c['LengthofLutealPhase'],
+        }
+
+    def payload(self, route):
+        if route.endswith('/batch'):
+            build = self.builders[route[:-len('/batch')]]
+            return {'items': [build(self.cycle()) for _ in range(self.batch_size)]}
+        return self.builders[route](self.cycle())
+
+    def bodies(self, route, n):
+        return [json.dumps(self.payload(route)).encode() for _ in range(n)]
+
+
+def percentile(ordered, q):
+    """Nearest-rank percentile of an ascending list"""
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+def summarize(latencies, statuses, elapsed):
+    """Report entry for one endpoint: latencies in seconds, one status per request"""
+    ordered = sorted(latencies)
+    counts = defaultdict(int)
+    for status in statuses:
+        counts[str(status)] += 1
+    errors = sum(count for status, count in counts.items() if not status.startswith('2'))
+    summary = {
+        'requests': len(statuses),
+        'errors': errors,
+        'error_rate': round(errors / len(statuses), 4) if statuses else 0.0,
+        'throughput_rps': round(len(statuses) / elapsed, 1) if elapsed else 0.0,
+        'statuses': dict(sorted(counts.items())),
+        'latency_ms': {},
+    }
+    if ordered:
+        summary['latency_ms'] = {f'p{q}': round(percentile(ordered, q) * 1000, 3) for q in PERCENTILES}
+        summary['latency_ms']['mean'] = round(sum(ordered) / len(ordered) * 1000, 3)
+        summary['latency_ms']['max'] = round(ordered[-1] * 1000, 3)
+    return summary
+
+
+# ===================================
+# IN PROCESS
+# ===================================
+
+def run_inprocess(route, bodies, concurrency):
+    """Drive the Flask app through its test client from `concurrency` threads"""
+    from app import app
+
+    latencies, statuses = [], []
+    lock = threading.Lock()
+    shares = [bodies[i::concurrency] for i in range(concurrency)]
+
+    def worker(share):
+        client = app.test_client()
+        local = []
+        for body in share:
+            start = time.perf_counter()
+            response = client.post(route, data=body, content_type='application/json')
+            response.get_data()
+            local.append((time.perf_counter() - start, response.status_code))
+        with lock:
+            for latency, status in local:
+                latencies.append(latency)
+                statuses.append(status)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(share,)) for share in shares]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, statuses, time.perf_counter() - start)
+
+
+# ===================================
+# OVER HTTP
+# ===================================
+
+async def read_response(reader):
+    """(status, body) of one HTTP/1.1 response; Content-Length or chunked"""
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split(' ')[1])
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        body = bytearray()
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            chunk = await reader.readexactly(size + 2)
+            if size == 0:
+                break
+            body += chunk[:-2]
+        return status, bytes(body)
+    return status, await reader.readexactly(int(headers.get('content-length', 0)))
+
+
+async def http_load(url, route, bodies, concurrency, duration=None):
+    """Keep-alive connections posting `bodies` in turn; for `duration` seconds
+    when given, else until every body has been sent once"""
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    latencies, statuses = [], []
+    queue = iter(range(len(bodies) if duration is None else sys.maxsize))
+    deadline = time.perf_counter() + duration if duration else None
+
+    async def worker():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            for i in queue:
+                if deadline and time.perf_counter() >= deadline:
+                    break
+                body = bodies[i % len(bodies)]
+                request = (f'POST {route} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n'
+                           f'Content-Length: {len(body)}\r\n\r\n').encode() + body
+                start = time.perf_counter()
+                try:
+                    writer.write(request)
+                    await writer.drain()
+                    status, _ = await read_response(reader)
+                except (OSError, asyncio.IncompleteReadError):
+                    # Count it and reconnect
+                    status = 'connection_error'
+                    writer.close()
+                    reader, writer = await asyncio.open_connection(host, port)
+                latencies.append(time.perf_counter() - start)
+                statuses.append(status)
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return summarize(latencies, statuses, time.perf_counter() - start)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(kind, port):
+    """Start a local server on `port` and wait for GET /ready; returns the process"""
+    commands = {
+        'uvicorn': ['uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(port),
+                    '--log-level', 'warning', '--no-access-log'],
+        'gunicorn': ['gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', '1', '--threads', '32',
+                     '--timeout', '600', 'app:app'],
+    }
+    process = subprocess.Popen([sys.executable, '-m'] + commands[kind],
+                               cwd=os.path.dirname(os.path.abspath(__file__)),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'{kind} exited with status {process.returncode}')
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/ready', timeout=1) as response:
+                if response.status == 200:
+                    return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f'{kind} did not become ready on port {port}')
+
+
+# ===================================
+# REPORT
+# ===================================
+
+def git_commit():
+    root = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=root, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+
+def run(args):
+    generator = PayloadGenerator(load_cycles(args.data), seed=args.seed, batch_size=args.batch_size)
+    routes = args.routes or SINGLE_ROUTES + BATCH_ROUTES
+    commit, dirty = git_commit()
+    report = {
+        'meta': {
+            'commit': commit,
+            'dirty': dirty,
+            'mode': args.mode,
+            'server': args.server if args.mode == 'http' else None,
+            'url': args.url if args.mode == 'http' else None,
+            'concurrency': args.concurrency,
+            'requests': args.requests,
+            'duration_s': args.duration,
+            'batch_size': args.batch_size,
+            'seed': args.seed,
+            'python': platform.python_version(),
+            'machine': platform.platform(),
+            'cpus': os.cpu_count(),
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        },
+        'endpoints': {},
+    }
+
+    process = None
+    if args.mode == 'http' and args.server:
+        port = free_port()
+        process = start_server(args.server, port)
+        args.url = report['meta']['url'] = f'http://127.0.0.1:{port}'
+    try:
+        for route in routes:
+            requests = args.requests
+            if route.endswith('/batch'):
+                requests = max(10, args.concurrency, requests // args.batch_size)
+            bodies = generator.bodies(route, requests)
+            # Warm the route (lazy model loads, caches of code paths) before measuring
+            warm = bodies[:max(1, min(len(bodies), args.concurrency))]
+            if args.mode == 'inprocess':
+                run_inprocess(route, warm, 1)
+                summary = run_inprocess(route, bodies, args.concurrency)
+            else:
+                asyncio.run(http_load(args.url, route, warm, 1))
+                duration = args.duration if not route.endswith('/batch') else None
+                summary = asyncio.run(http_load(args.url, route, bodies, args.concurrency, duration))
+            if route.endswith('/batch'):
+                summary['rows_per_s'] = round(summary['throughput_rps'] * args.batch_size, 1)
+            report['endpoints'][route] = summary
+            latency = summary['latency_ms']
+            print(f"{route:<34}{summary['requests']:>7} req {summary['throughput_rps']:>9.1f} rps  "
+                  f"p50 {latency.get('p50', 0):>8.2f}  p95 {latency.get('p95', 0):>8.2f}  "
+                  f"p99 {latency.get('p99', 0):>8.2f} ms  errors {summary['error_rate']:.1%}",
+                  file=sys.stderr)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    return report
+
+
+def compare(before_path, after_path):
+    """Per-endpoint change from one report to another, as printable lines"""
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+
+    def change(old, new):
+        return f'{(new - old) / old:+.1%}' if old else 'n/a'
+
+    lines = [f"{before['meta'].get('commit', '?')[:10]} -> {after['meta'].get('commit', '?')[:10]}"]
+    for route, new in after['endpoints'].items():
+        old = before['endpoints'].get(route)
+        if old is None:
+            lines.append(f'{route}: only in {after_path}')
+            continue
+        cells = [f"rps {change(old['throughput_rps'], new['throughput_rps'])}"]
+        for key in [f'p{q}' for q in PERCENTILES]:
+            if key in old['latency_ms'] and key in new['latency_ms']:
+                cells.append(f"{key} {old['latency_ms'][key]:.2f}->{new['latency_ms'][key]:.2f} ms "
+                             f"({change(old['latency_ms'][key], new['latency_ms'][key])})")
+        cells.append(f"errors {old['error_rate']:.1%}->{new['error_rate']:.1%}")
+        lines.append(f'{route:<34}' + '  '.join(cells))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test the Luna API and report latency per endpoint')
+    parser.add_argument('--mode', choices=('inprocess', 'http'), default='inprocess')
+    parser.add_argument('--url', default='http://127.0.0.1:8080', help='server to load (http mode)')
+    parser.add_argument('--server', choices=('uvicorn', 'gunicorn'),
+                        help='start this server locally for the run (http mode)')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--requests', type=int, default=1000, help='requests per endpoint')
+    parser.add_argument('--duration', type=float,
+                        help='seconds per endpoint instead of a request count (http mode)')
+    parser.add_argument('--batch-size', type=int, default=100, help='payloads per /batch request')
+    parser.add_argument('--routes', nargs='+', help=f'default: all of {SINGLE_ROUTES + BATCH_ROUTES}')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data', default=DATA_PATH)
+    parser.add_argument('--out', help='write the JSON report here instead of stdout')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+                        help='print the change between two reports and exit')
+    args = parser.parse_args()
+
+    if args.compare:
+        print('\n'.join(compare(*args.compare)))
+        return
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+# 🌲 Luna forest engine
+# Flattens a fitted scikit-learn forest into a few contiguous node arrays and
+# walks every tree at once with NumPy, level by level. A single-row request
+# then costs ~depth vectorized steps instead of one Python-level tree call per
+# estimator, which is where sklearn spends most of its time for small inputs.
+#
+# Predictions match sklearn to the last bit: thresholds stay float64 and are
+# compared against float32 inputs exactly like sklearn's tree code, and tree
+# outputs are accumulated in estimator order before dividing by the count.
+
+from bisect import bisect_left
+
+import numpy as np
+
+# Rows walked per step, bounding the (rows x trees) scratch arrays for batches
+CHUNK_ROWS = 1024
+
+# From about this many rows sklearn's compiled per-tree loop overtakes the
+# level-by-level NumPy walk, so large batches go back to the source estimator
+ESTIMATOR_MIN_ROWS = 256
+
+
+class CompiledForest:
+    """Tree ensemble stored as flat node arrays
+
+    Supports RandomForest/ExtraTrees regressors (natively multi-output ones
+    included) and single-output classifiers, and MultiOutputRegressor wrapping
+    either regressor, which is compiled into one ensemble whose leaves carry
+    one value slot per output.
+    """
+
+    def __init__(self, feature, threshold, children, value, roots, depth,
+                 n_features, counts, classes=None, feature_names=None, estimator=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self.depth = depth
+        self.n_features_in_ = n_features
+        self.counts = counts
+        self.classes_ = classes
+        self._estimator = estimator
+        # Zero-argument callable returning the source estimator, for forests
+        # loaded from a compiled file without it
+        self.estimator_loader = None
+        if feature_names is not None:
+            self.feature_names_in_ = feature_names
+
+    def __getstate__(self):
+        # Only the flat arrays are persisted; the source estimator and the
+        # split-edge lookups are rebuilt on demand
+        state = self.__dict__.copy()
+        for key in ('_estimator', 'estimator_loader', '_split_edges', '_edge_lists'):
+            state.pop(key, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._estimator = None
+        self.estimator_loader = None
+
+    @property
+    def estimator(self):
+        if self._estimator is None and self.estimator_loader is not None:
+            self._estimator = self.estimator_loader()
+        return self._estimator
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    @classmethod
+    def from_estimator(cls, model):
+        """Compile a fitted forest, or raise TypeError for anything else"""
+        if hasattr(model, 'estimators_') and model.estimators_ and \
+                hasattr(model.estimators_[0], 'estimators_'):
+            # MultiOutputRegressor: one single-output forest per target
+            forests = model.estimators_
+        else:
+            forests = [model]
+
+        classes = getattr(model, 'classes_', None)
+        if classes is not None and len(forests) != 1:
+            raise TypeError('Multi-output classifiers are not supported')
+
+        groups = []
+        for forest in forests:
+            trees = getattr(forest, 'estimators_', None)
+            if not trees or not hasattr(trees[0], 'tree_'):
+                raise TypeError(f'{type(forest).__name__} is not a fitted tree ensemble')
+            if getattr(forest, 'n_outputs_', 1) != 1 and classes is not None:
+                raise TypeError('Multi-output classifiers are not supported')
+            groups.append([tree.tree_ for tree in trees])
+
+        n_slots = len(classes) if classes is not None else \
+            sum(getattr(forest, 'n_outputs_', 1) for forest in forests)
+
+        features, thresholds, children, values, roots, counts = [], [], [], [], [], []
+        depth, offset, slot = 0, 0, 0
+        for trees in groups:
+            for tree in trees:
+                n = tree.node_count
+                leaf = tree.children_left == -1
+                local = np.arange(n)
+                # Leaves point at themselves with an always-true split, so
+                # every tree can be walked for the same number of steps
+                left = np.where(leaf, local, tree.children_left) + offset
+                right = np.where(leaf, local, tree.children_right) + offset
+                features.append(np.where(leaf, 0, tree.feature))
+                thresholds.append(np.where(leaf, np.inf, tree.threshold))
+                # Index 1 is taken when the row goes left (x <= threshold)
+                children.append(np.stack([right, left], axis=1))
+
+                # Classifier trees already store class fractions per node
+                raw = tree.value[:, :, 0] if classes is None else tree.value[:, 0, :]
+                node_values = np.zeros((n, n_slots))
+                node_values[:, slot:slot + raw.shape[1]] = raw
+                values.append(node_values)
+
+                roots.append(offset)
+                depth = max(depth, tree.max_depth)
+                offset += n
+            width = n_slots if classes is not None else tree.value.shape[1]
+            counts[slot:slot + width] = [len(trees)] * width
+            slot += width
+
+        # int32 node indices: half the memory traffic of intp, and faster to walk
+        return cls(
+            feature=np.concatenate(features).astype(np.int32),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            children=np.ascontiguousarray(np.concatenate(children), dtype=np.int32).ravel(),
+            value=np.ascontiguousarray(np.concatenate(values)),
+            roots=np.asarray(roots, dtype=np.int32),
+            depth=depth,
+            n_features=model.n_features_in_,
+            counts=np.asarray(counts, dtype=np.float64),
+            classes=classes,
+            feature_names=getattr(model, 'feature_names_in_', None),
+            estimator=model,
+        )
+
+    @property
+    def split_edges(self):
+        """Sorted distinct split thresholds used on each feature"""
+        if getattr(self, '_split_edges', None) is None:
+            splits = np.isfinite(self.threshold)
+            self._split_edges = [np.unique(self.threshold[splits & (self.feature == f)])
+                                 for f in range(self.n_features_in_)]
+        return self._split_edges
+
+    def split_bins(self, X):
+        """(n, n_features) index of the split interval each value falls into
+
+        Rows with equal bins take the same path through every tree, so the
+        bins are an exact, coarse canonical form of the input.
+        """
+        X = self._check(X)
+        if len(X) <= 16:
+            # bisect on lists beats one searchsorted call per feature for a few rows
+            edges = self._split_edge_lists
+            return np.array([[bisect_left(edges[f], value) for f, value in enumerate(row)]
+                             for row in X.tolist()], dtype=np.int32).reshape(len(X), -1)
+        return np.column_stack([np.searchsorted(edges, X[:, f])
+                                for f, edges in enumerate(self.split_edges)]).astype(np.int32)
+
+    @property
+    def _split_edge_lists(self):
+        if getattr(self, '_edge_lists', None) is None:
+            self._edge_lists = [edges.tolist() for edges in self.split_edges]
+        return self._edge_lists
+
+    def _check(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f'X has shape {X.shape}, expected (n, {self.n_features_in_})')
+        return np.ascontiguousarray(X)
+
+    def apply(self, X):
+        """Leaf node (in the flat arrays) reached by every row in every tree"""
+        X = self._check(X)
+        return np.concatenate([self._apply(X[i:i + CHUNK_ROWS])
+                               for i in range(0, max(len(X), 1), CHUNK_ROWS)])
+
+    def _apply(self, X):
+        flat = X.ravel()
+        rows = (np.arange(len(X)) * X.shape[1])[:, np.newaxis]
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        for _ in range(self.depth):
+            go_left = flat.take(rows + self.feature.take(nodes)) <= self.threshold.take(nodes)
+            nodes = self.children.take(2 * nodes + go_left)
+        return nodes
+
+    def _mean(self, X):
+        """(n, slots) ensemble average, one chunk of rows at a time"""
+        X = self._check(X)
+        out = np.empty((len(X), self.value.shape[1]))
+        for i in range(0, len(X), CHUNK_ROWS):
+            leaves = self._apply(X[i:i + CHUNK_ROWS])
+            # Running sum in estimator order, as sklearn accumulates it
+            totals = np.add.accumulate(self.value[leaves], axis=1)[:, -1]
+            out[i:i + CHUNK_ROWS] = totals / self.counts
+        return out
+
+    def predict_trees(self, X):
+        """(n, n_estimators, slots) raw per-tree outputs"""
+        return self.value[self.apply(X)]
+
+    def _use_estimator(self, X):
+        return len(X) >= ESTIMATOR_MIN_ROWS and \
+            (self._estimator is not None or self.estimator_loader is not None)
+
+    def predict(self, X):
+        if self._use_estimator(X):
+            return self.estimator.predict(self._check(X))
+        if self.classes_ is not None:
+            return self.classes_.take(np.argmax(self._mean(X), axis=1))
+        out = self._mean(X)
+        return out[:, 0] if out.shape[1] == 1 else out
+
+    def predict_proba(self, X):
+        if self.classes_ is None:
+            raise AttributeError('predict_proba is only available for classifiers')
+        if self._use_estimator(X):
+            return self.estimator.predict_proba(self._check(X))
+        return self._mean(X)
+
+
+def compile_model(model):
+    """CompiledForest for `model`, or the model itself if it cannot be compiled"""
+    try:
+        return CompiledForest.from_estimator(model)
+    except TypeError:
+        return model
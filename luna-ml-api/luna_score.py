@@ -0,0 +1,258 @@
+# 🧮 Luna offline scoring
+# Scores a whole table (CSV, or Parquet with pyarrow installed) through one
+# of the prediction routes, without a server: the same schema, feature rows,
+# model and response body as the route's /batch endpoint (predictions.py),
+# one row per payload. The input is read CHUNK_ROWS rows at a time and the
+# chunks are shared out to a pool of worker processes, each of which loads
+# the route's model once and scores a chunk with one model call; results
+# are written as the chunks come back, in input order, so memory stays flat
+# however large the table is.
+#
+# Columns are the payload's fields (NaN/empty cells keep the feature
+# defaults); list fields such as recent_cycle_lengths are JSON arrays in a
+# CSV cell. Output is NDJSON (one response body per line, as /stream writes
+# it), or a flat table for a .csv or .parquet path: nested fields become
+# dotted columns, lists JSON strings, and a failed row fills `error` only.
+#
+#   python luna_score.py /predict/symptoms users.csv symptoms.ndjson
+#   python luna_score.py /detect/irregular-cycle users.parquet irregular.csv --id-column user_id --workers 8
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+try:
+    import pyarrow
+    import pyarrow.parquet as pq
+except ImportError:     # Parquet input/output needs it; CSV and NDJSON do not
+    pq = None
+
+# Rows per chunk: one task for a worker and one model call
+CHUNK_ROWS = 10000
+
+# ===================================
+# WORKERS
+# ===================================
+
+_worker = {}
+
+def scoring_environment(models_dir=None):
+    """Settings for importing predictions.py here: one pass over every row
+    needs no warmup thread, store watcher or prediction cache"""
+    if models_dir:
+        os.environ['MODELS_DIR'] = models_dir
+    os.environ['MODEL_WARMUP'] = ''
+    os.environ['MODEL_RELOAD_INTERVAL'] = '0'
+    os.environ['PREDICTION_CACHE_SIZE'] = '0'
+
+def init_worker(path, models_dir):
+    """Load `path`'s model once for this worker process"""
+    scoring_environment(models_dir)
+    from predictions import PREDICTION_ROUTES, models
+
+    route = PREDICTION_ROUTES[path]
+    try:
+        if route.model_name not in models:
+            raise RuntimeError(route.missing_message)
+        _worker.update(route=route, model=models[route.model_name], error=None)
+    except Exception as e:
+        # Raised with the first chunk, where the parent sees the message
+        _worker.update(error=f'{route.model_name}: {e}')
+
+def cell(value):
+    """Payload value of one table cell; None for an empty one"""
+    if value is None:
+        return None
+    if isinstance(value, float):
+        return None if math.isnan(value) else value
+    if hasattr(value, 'tolist'):    # NumPy scalars and Parquet list cells
+        return value.tolist()
+    if isinstance(value, str) and value.startswith('['):
+        try:
+            return json.loads(value)
+        except ValueError:
+            pass
+    return value
+
+def table_rows(results, ids, id_column):
+    """Flat table of response bodies: dotted columns for nested fields,
+    JSON strings for lists"""
+    import pandas as pd
+    frame = pd.json_normalize(results)
+    for column in frame.columns:
+        if frame[column].map(lambda value: isinstance(value, list)).any():
+            frame[column] = frame[column].map(
+                lambda value: json.dumps(value) if isinstance(value, list) else value)
+    if 'error' not in frame.columns:
+        frame['error'] = None
+    if id_column:
+        frame.insert(0, id_column, ids)
+    return frame
+
+def score_chunk(frame, output_format, id_column=None):
+    """(output, rows, errors) for one chunk of the input table: NDJSON bytes,
+    or a DataFrame for tabular output"""
+    from payloads import dumps
+    from predictions import score_batch
+
+    if _worker['error']:
+        raise RuntimeError(_worker['error'])
+    route, model = _worker['route'], _worker['model']
+    columns = list(frame.columns)
+    items = [{key: value for key, value in zip(columns, map(cell, row)) if value is not None}
+             for row in frame.itertuples(index=False, name=None)]
+    results = score_batch(items, route.spec, lambda features: route.predict(model, features),
+                          route.make_result, schema=route.schema)
+    errors = sum(1 for result in results if 'error' in result)
+    ids = frame[id_column].tolist() if id_column else None
+
+    if output_format == 'ndjson':
+        if id_column:
+            results = [{id_column: cell(value), **result} for value, result in zip(ids, results)]
+        return b''.join(dumps(result) for result in results), len(results), errors
+    return table_rows(results, ids, id_column), len(results), errors
+
+# ===================================
+# INPUT AND OUTPUT
+# ===================================
+
+def file_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.parquet':
+        if pq is None:
+            raise SystemExit('❌ Parquet files need pyarrow (pip install pyarrow)')
+        return 'parquet'
+    return 'csv' if extension == '.csv' else 'ndjson'
+
+def read_chunks(path, chunk_rows):
+    """(DataFrames of up to `chunk_rows` rows, total rows if known)"""
+    import pandas as pd
+    if file_format(path) == 'parquet':
+        source = pq.ParquetFile(path)
+        batches = source.iter_batches(batch_size=chunk_rows)
+        return (batch.to_pandas() for batch in batches), source.metadata.num_rows
+    if file_format(path) != 'csv':
+        raise SystemExit(f'❌ Input must be a .csv or .parquet file: {path}')
+    return pd.read_csv(path, chunksize=chunk_rows), None
+
+class OutputWriter:
+    """Appends scored chunks to NDJSON, CSV or Parquet as they arrive"""
+
+    def __init__(self, path):
+        self.format = file_format(path)
+        self.path = path
+        self.columns = None
+        self._parquet = None
+        self._file = None
+        if self.format == 'ndjson':
+            self._file = open(path, 'wb')
+        elif self.format == 'csv':
+            self._file = open(path, 'w', newline='')
+
+    def write(self, output):
+        if self.format == 'ndjson':
+            self._file.write(output)
+            return
+        # Columns are fixed by the first chunk; later chunks are aligned to them
+        if self.columns is None:
+            self.columns = list(output.columns)
+        output = output.reindex(columns=self.columns)
+        if self.format == 'csv':
+            output.to_csv(self._file, header=self._file.tell() == 0, index=False)
+            return
+        table = pyarrow.Table.from_pandas(output, preserve_index=False)
+        if self._parquet is None:
+            self._parquet = pq.ParquetWriter(self.path, table.schema)
+        self._parquet.write_table(table.cast(self._parquet.schema))
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        if self._parquet is not None:
+            self._parquet.close()
+
+# ===================================
+# SCORING
+# ===================================
+
+def score_file(path, input_path, output_path, workers=None, chunk_rows=CHUNK_ROWS,
+               id_column=None, models_dir=None, progress=sys.stderr):
+    """Score every row of `input_path` through route `path` into `output_path`;
+    returns {'rows', 'errors', 'seconds', 'rows_per_second', 'workers'}"""
+    workers = workers or os.cpu_count() or 1
+    chunks, total = read_chunks(input_path, chunk_rows)
+    writer = OutputWriter(output_path)
+    # Spawned workers start clean: no copy of this process's pandas state
+    # or threads, and each one imports only what scoring needs
+    pool = ProcessPoolExecutor(workers, mp_context=get_context('spawn'),
+                               initializer=init_worker, initargs=(path, models_dir))
+    rows = errors = 0
+    start = last_report = time.perf_counter()
+    pending = deque()
+
+    def collect():
+        nonlocal rows, errors, last_report
+        output, chunk_rows_scored, chunk_errors = pending.popleft().result()
+        writer.write(output)
+        rows += chunk_rows_scored
+        errors += chunk_errors
+        now = time.perf_counter()
+        if progress is not None and now - last_report >= 1:
+            last_report = now
+            done = f'{rows:,}/{total:,} rows ({rows / total:.0%})' if total else f'{rows:,} rows'
+            print(f'   {done}, {rows / (now - start):,.0f} rows/s', file=progress, flush=True)
+
+    try:
+        for frame in chunks:
+            if id_column and id_column not in frame.columns:
+                raise SystemExit(f'❌ No column {id_column!r} in {input_path}')
+            pending.append(pool.submit(score_chunk, frame, writer.format, id_column))
+            # Enough chunks queued to keep every worker busy, but no more in memory
+            while len(pending) > 2 * workers:
+                collect()
+        while pending:
+            collect()
+    finally:
+        pool.shutdown(cancel_futures=True)
+        writer.close()
+
+    seconds = time.perf_counter() - start
+    return {'rows': rows, 'errors': errors, 'seconds': round(seconds, 3),
+            'rows_per_second': round(rows / seconds, 1) if seconds else 0.0, 'workers': workers}
+
+def build_parser():
+    # Models load lazily, so this only reads the route table
+    scoring_environment()
+    from predictions import PREDICTION_ROUTES
+    parser = argparse.ArgumentParser(description="Score a CSV or Parquet table through one of Luna's prediction routes")
+    # The single-user routes, each of which has a /batch endpoint (the dashboard,
+    # symptom calendar and forecast have none)
+    parser.add_argument('route', choices=list(PREDICTION_ROUTES))
+    parser.add_argument('input', help='.csv or .parquet, one payload per row')
+    parser.add_argument('output', help='.ndjson, .csv or .parquet')
+    parser.add_argument('--workers', type=int, help='worker processes (default: one per core)')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--id-column', help='input column copied to every output row')
+    parser.add_argument('--models-dir', help='overrides MODELS_DIR')
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    print(f'🧮 Scoring {args.input} through {args.route}')
+    report = score_file(args.route, args.input, args.output, args.workers, args.chunk_rows,
+                        args.id_column, args.models_dir)
+    print(f"✅ {report['rows']:,} rows -> {args.output} in {report['seconds']:.1f}s "
+          f"({report['rows_per_second']:,.0f} rows/s, {report['workers']} workers, "
+          f"{report['errors']:,} errors)")
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+# 📈 Luna metrics
+# Prometheus text-format metrics without a client library dependency:
+# per-endpoint request and error counts, in-flight gauges, and latency
+# histograms for the whole request and for each stage of it
+# (parse -> features -> inference -> serialize).
+#
+# A stage mark is one perf_counter() call and a list append; everything is
+# folded into the shared series under a single lock when the request
+# finishes - a few microseconds per request, cheap enough to leave on in
+# the hot path. Everything else (model load times, cache hit rates, ...) is
+# read from its owner by collectors at scrape time.
+
+import threading
+import time
+from bisect import bisect_left
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; single predictions take ~0.1-2 ms, batches and cold loads far longer
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 10.0)
+
+STAGES = ('parse', 'features', 'inference', 'serialize')
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{escape(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count per label tuple"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._inc(labels, amount)
+
+    def _inc(self, labels, amount=1):
+        # Caller holds the lock
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels=()):
+        return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, labels, value) for labels, value in self._values.items()]
+
+
+class Gauge(Counter):
+    """Value per label tuple that can go down as well as up"""
+
+    kind = 'gauge'
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label tuple"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            self._observe(labels, value)
+
+    def _observe(self, labels, value):
+        # Caller holds the lock
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def count(self, labels=()):
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def samples(self):
+        with self._lock:
+            snapshot = [(labels, list(counts), total, count)
+                        for labels, (counts, total, count) in self._series.items()]
+        samples = []
+        for labels, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                samples.append((f'{self.name}_bucket', labels + (format_value(bound),), cumulative))
+            samples.append((f'{self.name}_sum', labels, total))
+            samples.append((f'{self.name}_count', labels, count))
+        return samples
+
+
+class RequestTimer:
+    """Times one request; `mark(stage)` closes the stage that just ran"""
+
+    __slots__ = ('metrics', 'endpoint', 'start', 'last', 'stages')
+
+    def __init__(self, metrics, endpoint):
+        self.metrics = metrics
+        self.endpoint = endpoint
+        self.start = self.last = time.perf_counter()
+        self.stages = []
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.stages.append((stage, now - self.last))
+        self.last = now
+
+    def finish(self, status):
+        self.metrics.finish(self, status)
+
+
+class NullTimer:
+    """Stands in for a RequestTimer outside of a tracked request"""
+
+    def mark(self, stage):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+class Metrics:
+    """Request metrics plus scrape-time collectors, rendered as Prometheus text"""
+
+    def __init__(self, prefix='luna'):
+        self.prefix = prefix
+        self.requests = Counter(f'{prefix}_requests_total', 'Requests handled',
+                                ('endpoint', 'status'))
+        self.errors = Counter(f'{prefix}_request_errors_total',
+                              'Requests answered with a 4xx or 5xx status', ('endpoint', 'status'))
+        self.in_flight = Gauge(f'{prefix}_requests_in_flight', 'Requests being handled',
+                               ('endpoint',))
+        self.request_seconds = Histogram(f'{prefix}_request_duration_seconds',
+                                         'Request latency', ('endpoint',))
+        self.stage_seconds = Histogram(f'{prefix}_request_stage_duration_seconds',
+                                       'Latency of each request stage: ' + ', '.join(STAGES),
+                                       ('endpoint', 'stage'))
+        self.families = [self.requests, self.errors, self.in_flight,
+                         self.request_seconds, self.stage_seconds]
+        # One lock for every family, so finishing a request takes it once
+        self._lock = threading.Lock()
+        for family in self.families:
+            family._lock = self._lock
+        self.collectors = []
+
+    def start(self, endpoint):
+        self.in_flight.inc((endpoint,))
+        return RequestTimer(self, endpoint)
+
+    def finish(self, timer, status):
+        elapsed = time.perf_counter() - timer.start
+        endpoint = timer.endpoint
+        labels = (endpoint, str(status))
+        with self._lock:
+            self.in_flight._inc((endpoint,), -1)
+            self.requests._inc(labels)
+            if status >= 400:
+                self.errors._inc(labels)
+            self.request_seconds._observe((endpoint,), elapsed)
+            for stage, seconds in timer.stages:
+                self.stage_seconds._observe((endpoint, stage), seconds)
+
+    def collector(self, collect):
+        """Register `collect()`, which returns [(name, kind, help, labels, samples)]
+        with samples as [(label values, value)]; called on every scrape"""
+        self.collectors.append(collect)
+        return collect
+
+    def render(self):
+        lines = []
+        for family in self.families:
+            extra = ('le',) if family.kind == 'histogram' else ()
+            lines.append(f'# HELP {family.name} {family.help}')
+            lines.append(f'# TYPE {family.name} {family.kind}')
+            for name, labels, value in family.samples():
+                names = family.labels + extra if name.endswith('_bucket') else family.labels
+                lines.append(f'{name}{format_labels(names, labels)} {format_value(value)}')
+        for collect in self.collectors:
+            try:
+                collected = collect()
+            except Exception as e:
+                lines.append(f'# collector {getattr(collect, "__name__", collect)} failed: {e}')
+                continue
+            for name, kind, help, labels, samples in collected:
+                name = f'{self.prefix}_{name}'
+                lines.append(f'# HELP {name} {help}')
+                lines.append(f'# TYPE {name} {kind}')
+                for values, value in samples:
+                    lines.append(f'{name}{format_labels(labels, values)} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
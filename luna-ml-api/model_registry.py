@@ -0,0 +1,296 @@
+# 📦 Luna model registry
+# Models are loaded on first use (or ahead of time by a warmup thread)
+# instead of all at import, so a cold start only pays for what the first
+# request needs.
+#
+# Models are registered by their pickle path, and served from the bundle
+# next to it (<model>.bundle, see model_bundle.py) when there is one: the
+# node arrays are mapped straight from the file, shared through the page
+# cache and faulted in as trees are walked, with no sklearn or joblib
+# import. The pickle is only read when there is no valid bundle, or when a
+# large batch needs the source estimator. A deployment may ship the bundles
+# alone; large batches then stay on the compiled engine.
+#
+# With a model store (model_store.py), a model the store's manifest names is
+# served from the store's bundle for that version instead, and `reload()`
+# swaps in whatever the manifest names now: the new version is loaded and
+# warmed off the request path, then replaces the old one in a single dict
+# assignment. Requests that already hold the old model finish on it.
+
+import os
+import threading
+import time
+
+from forest_engine import compile_model
+from model_bundle import bundle_path, load_bundle, source_stamp
+from prediction_cache import file_version
+
+# MODEL_VERIFY=0 skips the bundle checksum (header and bounds are always checked)
+MODEL_VERIFY = os.environ.get('MODEL_VERIFY', '1') != '0'
+
+# Longest wait between retries of a manifest that failed to load, in watch intervals
+WATCH_MAX_BACKOFF = 8
+
+
+def load_pickle(path):
+    import joblib
+    return joblib.load(path)
+
+
+def import_pickle_deps():
+    """Import what unpickling the forests needs in the calling thread: a
+    background load importing sklearn while the main thread imports it too
+    can deadlock on the module locks"""
+    import joblib  # noqa: F401
+    import sklearn.ensemble  # noqa: F401
+
+
+def resident_bytes():
+    """Current resident set size, where /proc is available"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def mapped_bytes(model):
+    return getattr(model, 'mapped_nbytes', 0)
+
+
+class ModelRegistry:
+    """Dict-like view of the models, loading each one on first access
+
+    `prepare(name, model, version)` turns a freshly loaded model into what
+    the app serves (feature checks, caching, ...). `warm(name, model)` runs
+    a throwaway prediction on it first, so lazy setup inside the model is not
+    paid by the first request. `name in registry` is true for models that are
+    loaded or still loadable. `ready` is set once the warmup thread is done.
+    `store` (a ModelStore) takes precedence over the files for the models its
+    manifest names.
+    """
+
+    def __init__(self, model_files, prepare=None, warm=None, store=None):
+        self.files = dict(model_files)
+        self.prepare = prepare or (lambda name, model, version: model)
+        self.warm = warm
+        self.store = store
+        self.ready = threading.Event()
+        self.closed = threading.Event()
+        self.versions = {}
+        self.errors = {}
+        self.reload_errors = {}
+        self.reloads = 0
+        self.load_stats = {}
+        self._models = {}
+        self._locks = {name: threading.Lock() for name in self.files}
+
+    def __contains__(self, name):
+        if name in self._models:
+            return True
+        return name in self.files and name not in self.errors and self._exists(name)
+
+    def _exists(self, name):
+        return self._exists_outside_store(name) or self._stored_version(name) is not None
+
+    def _exists_outside_store(self, name):
+        path = self.files[name]
+        return os.path.exists(path) or os.path.exists(bundle_path(path))
+
+    def _stored_version(self, name):
+        if self.store is None:
+            return None
+        try:
+            return self.store.active(name)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not read the model store manifest: {e}")
+            return None
+
+    def __getitem__(self, name):
+        model = self._models.get(name)
+        if model is None:
+            with self._locks[name]:
+                if name not in self._models:
+                    self._load(name)
+            model = self._models[name]
+        return model
+
+    def __len__(self):
+        return len(self._models)
+
+    def keys(self):
+        return list(self._models)
+
+    def items(self):
+        return list(self._models.items())
+
+    def _read(self, name, version=None):
+        """(model, version, source) from the store when it names the model, else
+        from the bundle when valid, else the pickle"""
+        path = self.files[name]
+        requested = version
+        version = version or self._stored_version(name)
+        if version is not None:
+            try:
+                forest = load_bundle(self.store.object_path(version), verify=MODEL_VERIFY)
+                self._attach_estimator(forest, path)
+                return forest, version, 'store'
+            except Exception as e:
+                # A reload asks for that version and nothing else
+                if requested is not None or not self._exists_outside_store(name):
+                    raise
+                print(f"⚠️ Could not read {name} {version} from the model store: {e}")
+        bundle = bundle_path(path)
+        has_pickle = os.path.exists(path)
+        if os.path.exists(bundle):
+            try:
+                forest = load_bundle(bundle, verify=MODEL_VERIFY)
+                if not has_pickle or self._attach_estimator(forest, path):
+                    return forest, forest.header['model_version'], 'bundle'
+                print(f"⚠️ {bundle} is stale, loading {name} from the pickle")
+            except Exception as e:
+                if not has_pickle:
+                    raise
+                print(f"⚠️ Could not read {bundle}: {e}")
+        return compile_model(load_pickle(path)), file_version(path), 'pickle'
+
+    @staticmethod
+    def _attach_estimator(forest, path):
+        """Let large batches load the pickle `forest` was exported from, if it is
+        the one at `path`; returns whether it is"""
+        if not os.path.exists(path):
+            return False
+        source = forest.header['source']
+        if {key: source.get(key) for key in ('size', 'mtime_ns')} != source_stamp(path):
+            return False
+        forest.estimator_loader = lambda: load_pickle(path)
+        return True
+
+    def _load(self, name, version=None):
+        if version is None and not self._exists(name):
+            raise KeyError(f'Model file not found: {self.files[name]}')
+        rss_before = resident_bytes()
+        start = time.perf_counter()
+        try:
+            model, version, source = self._read(name, version)
+            loaded = time.perf_counter()
+            if self.warm is not None:
+                self.warm(name, model)
+            warmed = time.perf_counter()
+            served = self.prepare(name, model, version)
+        except Exception as e:
+            if name not in self._models:
+                self.errors[name] = str(e)
+            print(f"❌ Error loading {name}: {e}")
+            raise
+        seconds = time.perf_counter() - start
+        rss_after = resident_bytes()
+        replaced = self.versions.get(name)
+        self.load_stats[name] = {
+            'source': source,
+            'version': version,
+            'load_ms': round(seconds * 1000, 1),
+            'warm_ms': round((warmed - loaded) * 1000, 1),
+            # Approximate when two models load at the same time
+            'rss_delta_mb': round((rss_after - rss_before) / 1e6, 1) if rss_before else None,
+            'mapped_mb': round(mapped_bytes(model) / 1e6, 1),
+        }
+        self.versions[name] = version
+        # The swap: requests holding the old model keep it until they finish
+        self._models[name] = served
+        action = f"Swapped {name} {replaced[:12]} -> {version[:12]}" if replaced else f"Loaded {name}"
+        print(f"✅ {action} from {source} in {seconds * 1000:.0f} ms "
+              f"({self.load_stats[name]['warm_ms']:.0f} ms warming up, "
+              f"+{self.load_stats[name]['rss_delta_mb']} MB resident, "
+              f"{self.load_stats[name]['mapped_mb']} MB mapped)")
+
+    def reload(self):
+        """Swap in the store's active version of every loaded model whose version
+        changed; returns {name: version} for the models swapped. A version that
+        fails to load leaves the old one serving and is reported in
+        `reload_errors`. Models not loaded yet pick up the new version on first use.
+        """
+        if self.store is None:
+            return {}
+        swapped = {}
+        for name, version in self.store.read_manifest().items():
+            if name not in self.files:
+                continue
+            if version == self.versions.get(name):
+                self.reload_errors.pop(name, None)   # back on the version being served
+                continue
+            with self._locks[name]:
+                if name not in self._models or version == self.versions.get(name):
+                    continue
+                try:
+                    self._load(name, version)
+                except Exception as e:
+                    self.reload_errors[name] = {'version': version, 'error': str(e)}
+                    continue
+            self.reload_errors.pop(name, None)
+            self.reloads += 1
+            swapped[name] = version
+        return swapped
+
+    def watch(self, interval):
+        """Check the store's manifest every `interval` seconds in a background
+        thread and reload when it has been replaced; stops on close().
+        
+        A manifest only counts as handled once every version it names has
+        loaded. Until then (an upload still being written, a checksum
+        mismatch) the reload is retried, backing off up to
+        WATCH_MAX_BACKOFF intervals apart.
+        """
+        def run():
+            stamp = None
+            delay = interval
+            while not self.closed.wait(delay):
+                current = self.store.manifest_stamp()
+                if current == stamp:
+                    continue
+                try:
+                    self.reload()
+                except Exception as e:
+                    print(f"⚠️ Model reload failed: {e}")
+                else:
+                    if not self.reload_errors:
+                        stamp, delay = current, interval
+                        continue
+                    for name, error in list(self.reload_errors.items()):
+                        print(f"⚠️ Still serving the old {name}: version {error['version']} failed "
+                              f"to load ({error['error']})")
+                delay = min(delay * 2, interval * WATCH_MAX_BACKOFF)
+        thread = threading.Thread(target=run, name='model-watcher', daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        self.closed.set()
+
+    def warmup(self, names):
+        """Load `names` in a background thread and set `ready` when done; request
+        threads never wait on it for other models"""
+        if any(name in self and not os.path.exists(bundle_path(self.files[name])) and
+               self._stored_version(name) is None for name in names):
+            import_pickle_deps()
+
+        def run():
+            for name in names:
+                if name in self:
+                    try:
+                        self[name]
+                    except Exception:
+                        pass
+            self.ready.set()
+        thread = threading.Thread(target=run, name='model-warmup', daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        return {
+            name: self.load_stats.get(name) or
+            ({'error': self.errors[name]} if name in self.errors else
+             'not loaded' if name in self else 'missing')
+            for name in self.files
+        }
+
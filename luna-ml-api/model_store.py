@@ -0,0 +1,153 @@
+# 🗄️ Luna model store
+# Content-addressed home for model bundles, so a new model can go live
+# without rebuilding the image or restarting the server:
+#
+#   <store>/objects/<version>.bundle   bundle named by its model version
+#                                      (content hash of the source pickle)
+#   <store>/objects/<version>.table    symptom table built for that version
+#   <store>/manifest.json              active version of each model
+#
+# Objects are only ever added, never changed, and the manifest is replaced
+# atomically, so a reader always sees a complete manifest naming complete
+# files. A running server notices a new manifest (ModelRegistry.watch, or
+# POST /admin/models/reload) and swaps each changed model in once the new
+# version has loaded and warmed up. One publisher at a time.
+#
+# Publish a model and make it active:
+#   python model_store.py publish --store models/store cycle_length models/cycle_length_model_minimal.pkl
+# Point a model back at a version already in the store:
+#   python model_store.py activate --store models/store cycle_length <version>
+# Show the active versions:
+#   python model_store.py list --store models/store
+
+import argparse
+import json
+import os
+import shutil
+import time
+
+from model_bundle import export, load_bundle
+
+MANIFEST_FORMAT = 1
+
+
+class ModelStore:
+    """Bundles keyed by model version, plus the manifest naming the active ones"""
+
+    def __init__(self, root):
+        self.root = root
+        self.objects = os.path.join(root, 'objects')
+        self.manifest_path = os.path.join(root, 'manifest.json')
+
+    def object_path(self, version, kind='bundle'):
+        return os.path.join(self.objects, f'{version}.{kind}')
+
+    def manifest_stamp(self):
+        """Changes whenever the manifest is replaced; None while there is none"""
+        try:
+            stat = os.stat(self.manifest_path)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def read_manifest(self):
+        """{model name: active version}; empty while there is no manifest"""
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return {}
+        if manifest.get('format_version') != MANIFEST_FORMAT:
+            raise ValueError(f"{self.manifest_path}: manifest format "
+                             f"{manifest.get('format_version')}, expected {MANIFEST_FORMAT}")
+        return manifest['models']
+
+    def active(self, name):
+        return self.read_manifest().get(name)
+
+    def add(self, path):
+        """Store the bundle at `path`, or one exported from the pickle at `path`;
+        returns its version. Bundles are verified before they are stored."""
+        os.makedirs(self.objects, exist_ok=True)
+        incoming = os.path.join(self.objects, f'incoming-{os.getpid()}.bundle')
+        try:
+            if path.endswith('.bundle'):
+                shutil.copyfile(path, incoming)
+            else:
+                export(path, out=incoming)
+            version = load_bundle(incoming).header['model_version']
+            if not os.path.exists(self.object_path(version)):
+                os.replace(incoming, self.object_path(version))
+        finally:
+            if os.path.exists(incoming):
+                os.remove(incoming)
+        return version
+
+    def add_table(self, version, path):
+        """Store the symptom table at `path` for model `version`"""
+        from symptom_table import SymptomTable
+
+        table_version = SymptomTable.load(path).model_version
+        if table_version != version:
+            raise ValueError(f'{path} was built for model version {table_version}, not {version}')
+        target = self.object_path(version, 'table')
+        shutil.copyfile(path, f'{target}.tmp')
+        os.replace(f'{target}.tmp', target)
+
+    def activate(self, name, version):
+        """Make `version` (already in the store) the active version of `name`"""
+        if not os.path.exists(self.object_path(version)):
+            raise KeyError(f'{version} is not in the store at {self.root}')
+        models = self.read_manifest()
+        models[name] = version
+        tmp_path = f'{self.manifest_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'format_version': MANIFEST_FORMAT, 'updated_at': time.time(),
+                       'models': models}, f, indent=2, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+    def publish(self, name, path, table=None, activate=True):
+        """Add a model (and optionally its symptom table); returns its version"""
+        version = self.add(path)
+        if table:
+            self.add_table(version, table)
+        if activate:
+            self.activate(name, version)
+        return version
+
+
+def main():
+    import warnings
+
+    parser = argparse.ArgumentParser(description='Publish and activate Luna model versions')
+    parser.add_argument('--store', default='models/store')
+    commands = parser.add_subparsers(dest='command', required=True)
+    publish_parser = commands.add_parser('publish', help='add a pickle or bundle and make it active')
+    publish_parser.add_argument('name')
+    publish_parser.add_argument('path')
+    publish_parser.add_argument('--table', help='symptom table built for this model')
+    publish_parser.add_argument('--no-activate', dest='activate', action='store_false')
+    activate_parser = commands.add_parser('activate', help='make a stored version active')
+    activate_parser.add_argument('name')
+    activate_parser.add_argument('version')
+    commands.add_parser('list', help='show the active versions')
+    args = parser.parse_args()
+    warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+    store = ModelStore(args.store)
+    if args.command == 'publish':
+        version = store.publish(args.name, args.path, args.table, args.activate)
+        state = 'active' if args.activate else 'stored, not active'
+        print(f"🗄️ {args.name} {version} ({state}) in {args.store}")
+    elif args.command == 'activate':
+        store.activate(args.name, args.version)
+        print(f"🗄️ {args.name} -> {args.version}")
+    else:
+        for name, version in sorted(store.read_manifest().items()):
+            print(f"{name}: {version}")
+
+
+if __name__ == '__main__':
+    main()
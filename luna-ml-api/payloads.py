@@ -0,0 +1,403 @@
+# 📨 Luna request and response bodies
+# Every prediction endpoint has a schema, compiled once into a validator that
+# coerces types (numeric strings, integral floats, booleans for 0/1 flags),
+# enforces plausible bounds and rejects a payload with every problem listed -
+# before any feature work or model call, so bad input is a 400 rather than
+# whatever the feature row or the model made of it. Missing and null fields
+# keep the defaults of the feature specs (features.py); fields no schema
+# names pass through untouched.
+#
+# Bodies are parsed and written with orjson when it is installed (NumPy
+# scalars included) and with the standard library otherwise. Either way the
+# response bytes are the ones Flask's jsonify produces: sorted keys, compact
+# separators and a trailing newline.
+#
+# Parse + validate and serialize cost per endpoint, stdlib vs this module:
+#   python payloads.py --requests 2000
+
+import datetime
+import json
+import math
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:     # the standard library path below is used instead
+    orjson = None
+
+
+class PayloadError(ValueError):
+    """A request body that cannot be scored; `errors` lists every problem"""
+
+    status = 400
+
+    def __init__(self, errors):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+
+class Unauthorized(PayloadError):
+    """A payload naming a user_id the caller holds no token for"""
+
+    status = 401
+
+
+# ===================================
+# JSON
+# ===================================
+
+def loads(body):
+    """Parsed request body, or PayloadError when it is not JSON"""
+    if not body:
+        raise PayloadError(['Request body must be JSON'])
+    try:
+        return orjson.loads(body) if orjson is not None else json.loads(body)
+    except ValueError as e:     # orjson.JSONDecodeError and json's are both ValueErrors
+        raise PayloadError([f'Invalid JSON: {e}']) from None
+
+
+def _numpy_default(value):
+    if isinstance(value, (np.generic, np.ndarray)):
+        return value.tolist()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE
+
+    def dumps(payload):
+        """Response body bytes, as jsonify writes them"""
+        return orjson.dumps(payload, default=_numpy_default, option=_ORJSON_OPTIONS)
+else:
+    def dumps(payload):
+        """Response body bytes, as jsonify writes them"""
+        return (json.dumps(payload, sort_keys=True, separators=(',', ':'),
+                           default=_numpy_default) + '\n').encode()
+
+
+# ===================================
+# FIELD RULES
+# Each returns coerce(value) -> clean value, raising ValueError with the
+# message the client sees
+# ===================================
+
+def _as_number(value):
+    if isinstance(value, bool):
+        raise ValueError('expected a number, got a boolean')
+    if isinstance(value, str):
+        try:
+            value = float(value)
+        except ValueError:
+            raise ValueError(f'expected a number, got {value!r}') from None
+    elif not isinstance(value, (int, float)):
+        raise ValueError(f'expected a number, got {type(value).__name__}')
+    try:
+        finite = math.isfinite(value)
+    except OverflowError:   # an integer too large for a float
+        finite = False
+    if not finite:
+        raise ValueError('must be finite')
+    return value
+
+
+def number(low, high):
+    """A float in [low, high]"""
+    def coerce(value):
+        value = _as_number(value)
+        if not low <= value <= high:
+            raise ValueError(f'must be between {low} and {high}, got {value}')
+        return value
+    return coerce
+
+
+def integer(low, high):
+    """A whole number in [low, high]; 12.0 and '12' become 12"""
+    def coerce(value):
+        value = _as_number(value)
+        if value != int(value):
+            raise ValueError(f'expected a whole number, got {value}')
+        value = int(value)
+        if not low <= value <= high:
+            raise ValueError(f'must be between {low} and {high}, got {value}')
+        return value
+    return coerce
+
+
+def cycle_day(low, high):
+    """A day of the cycle in [low, high], as a whole number. The app works the
+    day out as days since the last period modulo a mean cycle length, which
+    is usually fractional: 12.7 is day 12"""
+    def coerce(value):
+        value = _as_number(value)
+        if not low <= value <= high:
+            raise ValueError(f'must be between {low} and {high}, got {value}')
+        return math.floor(value)
+    return coerce
+
+
+def flag():
+    """0 or 1; true/false are accepted"""
+    def coerce(value):
+        value = int(value) if isinstance(value, bool) else _as_number(value)
+        if value not in (0, 1):
+            raise ValueError(f'must be 0 or 1, got {value}')
+        return int(value)
+    return coerce
+
+
+def number_list(low, high, max_items):
+    """A list of up to `max_items` floats in [low, high]"""
+    item = number(low, high)
+
+    def coerce(value):
+        if not isinstance(value, list):
+            raise ValueError(f'expected a list of numbers, got {type(value).__name__}')
+        if len(value) > max_items:
+            raise ValueError(f'at most {max_items} values, got {len(value)}')
+        return [item(entry) for entry in value]
+    return coerce
+
+
+def iso_date():
+    """A 'YYYY-MM-DD' date, as a datetime.date"""
+    def coerce(value):
+        if not isinstance(value, str):
+            raise ValueError(f'expected a YYYY-MM-DD date, got {type(value).__name__}')
+        try:
+            return datetime.date.fromisoformat(value)
+        except ValueError:
+            raise ValueError(f'expected a YYYY-MM-DD date, got {value!r}') from None
+    return coerce
+
+
+def identifier(max_length=128):
+    """A non-empty string id of up to `max_length` characters"""
+    def coerce(value):
+        if not isinstance(value, str) or not value:
+            raise ValueError('expected a non-empty string')
+        if len(value) > max_length:
+            raise ValueError(f'at most {max_length} characters, got {len(value)}')
+        return value
+    return coerce
+
+
+class Schema:
+    """Validator for one endpoint's payload, built once from {key: rule};
+    `required` keys must be present and not null"""
+
+    def __init__(self, fields, required=()):
+        self.fields = fields
+        self.required = tuple(required)
+        self._rules = tuple(fields.items())
+
+    def validate(self, data):
+        """Copy of `data` with every known field coerced; PayloadError otherwise"""
+        if not isinstance(data, dict):
+            raise PayloadError(['Expected a JSON object'])
+        clean = dict(data)
+        errors = None
+        for key, coerce in self._rules:
+            value = data.get(key)
+            if value is None:
+                if key in self.required:
+                    errors = errors or []
+                    errors.append(f'{key}: required')
+                # Missing or null: the feature spec's default applies
+                clean.pop(key, None)
+                continue
+            try:
+                clean[key] = coerce(value)
+            except ValueError as e:
+                errors = errors or []
+                errors.append(f'{key}: {e}')
+        if errors:
+            raise PayloadError(errors)
+        return clean
+
+
+# ===================================
+# SCHEMAS
+# Bounds are generous physiological limits, not the training data's range
+# ===================================
+
+AGE = number(8, 70)
+BMI = number(10, 80)
+CYCLE_DAYS = number(10, 120)
+CYCLE_DAY = cycle_day(1, 120)
+MENSES_DAYS = number(1, 20)
+OVULATION_DAY = number(1, 100)
+LUTEAL_DAYS = number(0, 60)
+FERTILE_DAYS = number(0, 40)
+BLEEDING = number(0, 30)
+PREGNANCIES = integer(0, 30)
+CYCLES_LOGGED = integer(0, 10000)
+RECENT_CYCLES = number_list(10, 120, max_items=120)
+# Names the user whose stored cycle statistics fill in the history (user_stats.py)
+USER_ID = identifier()
+
+CYCLE_LENGTH_FIELDS = {
+    'LengthofMenses': MENSES_DAYS,
+    'Age': AGE,
+    'BMI': BMI,
+    'EstimatedDayofOvulation': OVULATION_DAY,
+    'LengthofLutealPhase': LUTEAL_DAYS,
+    'TotalDaysofFertility': FERTILE_DAYS,
+}
+
+IRREGULAR_CYCLE_FIELDS = {
+    'recent_cycle_lengths': RECENT_CYCLES,
+    'cycle_with_peak': flag(),
+    'luteal_phase_length': LUTEAL_DAYS,
+    'menses_length': MENSES_DAYS,
+    'unusual_bleeding': flag(),
+    'bleeding_intensity': BLEEDING,
+    'age': AGE,
+    'bmi': BMI,
+    'number_pregnancies': PREGNANCIES,
+}
+
+# Route -> schema; a /batch route validates each item with its single route's schema
+SCHEMAS = {
+    '/predict/cycle-length': Schema(CYCLE_LENGTH_FIELDS),
+    '/predict/menses-length': Schema({
+        'Age': AGE,
+        'BMI': BMI,
+        'LengthofCycle': CYCLE_DAYS,
+        'MeanBleedingIntensity': BLEEDING,
+        'EstimatedDayofOvulation': OVULATION_DAY,
+    }),
+    '/predict/next-period': Schema({
+        **CYCLE_LENGTH_FIELDS,
+        'current_cycle_day': CYCLE_DAY,
+        'cycles_logged': CYCLES_LOGGED,
+        'user_id': USER_ID,
+    }),
+    '/predict/next-period/forecast': Schema({
+        **CYCLE_LENGTH_FIELDS,
+        'current_cycle_day': CYCLE_DAY,
+        'recent_cycle_lengths': RECENT_CYCLES,
+        'horizon': integer(1, 12),
+        'last_period_start': iso_date(),
+        'today': iso_date(),
+        'user_id': USER_ID,
+    }),
+    '/detect/irregular-cycle': Schema({**IRREGULAR_CYCLE_FIELDS, 'user_id': USER_ID}),
+    '/predict/symptoms': Schema({
+        'cycle_day': CYCLE_DAY,
+        'cycle_length': CYCLE_DAYS,
+        'menses_length': MENSES_DAYS,
+        'age': AGE,
+        'bmi': BMI,
+        'pregnancies': PREGNANCIES,
+        'mean_bleeding_intensity': BLEEDING,
+    }),
+    # Days 1..cycle_length are scored, so the cycle length is a whole number of days
+    '/predict/symptoms/calendar': Schema({
+        'cycle_length': integer(10, 120),
+        'menses_length': MENSES_DAYS,
+        'age': AGE,
+        'bmi': BMI,
+        'pregnancies': PREGNANCIES,
+        'mean_bleeding_intensity': BLEEDING,
+    }),
+    '/predict/dashboard': Schema({
+        **IRREGULAR_CYCLE_FIELDS,
+        'current_cycle_day': CYCLE_DAY,
+        'mean_cycle_length': CYCLE_DAYS,
+        'estimated_day_of_ovulation': OVULATION_DAY,
+        'total_days_of_fertility': FERTILE_DAYS,
+        'cycles_logged': CYCLES_LOGGED,
+        'user_id': USER_ID,
+    }),
+}
+
+# One completed cycle logged to a user's statistics (POST /users/<user_id>/cycles)
+CYCLE_LOG = Schema({
+    'cycle_length': CYCLE_DAYS,
+    'menses_length': MENSES_DAYS,
+    'luteal_phase_length': LUTEAL_DAYS,
+}, required=('cycle_length',))
+
+
+# ===================================
+# BENCHMARK
+# ===================================
+
+def stdlib_loads(body):
+    """What the routes did before: request.get_json(), unvalidated"""
+    return json.loads(body)
+
+
+def stdlib_dumps(payload):
+    """What the routes did before: jsonify's encoder"""
+    return (json.dumps(payload, sort_keys=True, separators=(',', ':')) + '\n').encode()
+
+
+def benchmark(requests=2000, seed=0):
+    """Microseconds per request to parse (+ validate) each route's bodies and
+    serialize its responses, stdlib vs this module"""
+    import time
+    from benchmark import PayloadGenerator, load_cycles
+    from predictions import (PREDICTION_ROUTES, predict_cycle_forecast, predict_dashboard_sections,
+                             predict_first, predict_symptom_calendar)
+
+    generator = PayloadGenerator(load_cycles(), seed=seed)
+    # Routes with their own prediction function rather than a PREDICTION_ROUTES entry
+    whole_payload = {
+        '/predict/dashboard': predict_dashboard_sections,
+        '/predict/symptoms/calendar': predict_symptom_calendar,
+        '/predict/next-period/forecast': predict_cycle_forecast,
+    }
+
+    def per_request(fn, items):
+        start = time.perf_counter()
+        for item in items:
+            fn(item)
+        return (time.perf_counter() - start) / len(items) * 1e6
+
+    results = {}
+    for path, schema in SCHEMAS.items():
+        bodies = generator.bodies(path, requests)
+        payloads = [loads(body) for body in bodies[:50]]
+        if path in whole_payload:
+            responses = [whole_payload[path](schema.validate(data)) for data in payloads]
+        else:
+            route = PREDICTION_ROUTES[path]
+            responses = []
+            for data in payloads:
+                features = route.spec.row(schema.validate(data))
+                prediction = predict_first(route.model_name, route.predict, features)
+                responses.append(route.make_result(data, features[0], prediction))
+        responses = responses * (requests // len(responses))
+        results[path] = {
+            'parse_us': {'stdlib': per_request(stdlib_loads, bodies),
+                         'fast_validated': per_request(lambda body: schema.validate(loads(body)), bodies)},
+            'serialize_us': {'stdlib': per_request(stdlib_dumps, responses),
+                             'fast': per_request(dumps, responses)},
+        }
+    return results
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description='Per-request parse and serialize cost, stdlib vs fast path')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--json', help='also write the results here')
+    args = parser.parse_args()
+
+    results = benchmark(args.requests)
+    print(f"⏱️ µs per request ({'orjson' if orjson is not None else 'stdlib json'} fast path)")
+    print(f"{'route':<26}{'parse':>9}{'parse+validate':>16}{'serialize':>11}{'fast':>8}")
+    for path, result in results.items():
+        parse, serialize = result['parse_us'], result['serialize_us']
+        print(f"{path:<26}{parse['stdlib']:>9.1f}{parse['fast_validated']:>16.1f}"
+              f"{serialize['stdlib']:>11.1f}{serialize['fast']:>8.1f}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'requests': args.requests, 'orjson': orjson is not None, 'results': results},
+                      f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+# 🗃️ Luna prediction cache
+# Requests are small and repetitive (integer ages, rounded BMIs, cycle days
+# 1-45), so most rows a model sees have been seen before. Each model gets a
+# bounded LRU cache of per-row outputs, keyed on the model version and a
+# canonical form of the feature row. SingleFlight coalesces concurrent
+# identical calls that would all miss it, so a burst of one payload runs the
+# model once.
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def file_version(path):
+    """Short content hash of a model file, used to namespace its cache keys"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+class PredictionCache:
+    """Thread-safe LRU cache with a size bound and a per-entry TTL"""
+
+    def __init__(self, maxsize=4096, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Cached value for `key`, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+class CachedModel:
+    """Model wrapper that answers repeated feature rows from a PredictionCache
+
+    Only rows missing from the cache reach the model, in one vectorized call.
+    Everything other than predict/predict_proba is delegated to the model.
+    """
+
+    def __init__(self, model, version, cache):
+        self.model = model
+        self.version = version
+        self.cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def _keys(self, X):
+        if hasattr(self.model, 'split_bins'):
+            # Split intervals: exact, and collapses values that no tree tells apart
+            canonical = self.model.split_bins(X)
+        else:
+            # float32 is all the model sees; + 0.0 folds -0.0 into 0.0
+            canonical = np.asarray(X, dtype=np.float32) + np.float32(0.0)
+        return [row.tobytes() for row in canonical]
+
+    def _predict(self, method, X):
+        X = np.asarray(X, dtype=np.float32)
+        if not len(X):
+            return getattr(self.model, method)(X)
+        keys = [(self.version, method, key) for key in self._keys(X)]
+        outputs = [self.cache.get(key) for key in keys]
+        missing = [i for i, output in enumerate(outputs) if output is None]
+        if missing:
+            fresh = getattr(self.model, method)(X[missing])
+            for i, output in zip(missing, fresh):
+                if isinstance(output, np.ndarray):
+                    # Don't let one cached row pin the whole batch result
+                    output = output.copy()
+                self.cache.put(keys[i], output)
+                outputs[i] = output
+        return np.asarray(outputs)
+
+    def predict(self, X):
+        return self._predict('predict', X)
+
+    def predict_proba(self, X):
+        return self._predict('predict_proba', X)
+
+
+class _Flight:
+    __slots__ = ('running', 'result', 'error')
+
+    def __init__(self):
+        # Held by the leader until the result is in; waiters block on it
+        # (a bare lock is much cheaper to create than an Event)
+        self.running = threading.Lock()
+        self.running.acquire()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Concurrent calls with the same key share one computation
+
+    The first caller for a key runs it; callers arriving while it runs wait
+    and receive the same result (or exception). Nothing is kept once it
+    finishes - repeats after that are the PredictionCache's job.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.unique = 0
+        self.coalesced = 0
+
+    def do(self, key, compute):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.unique += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            with flight.running:
+                pass
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = compute()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.running.release()
+
+    def record(self, coalesced):
+        """Count a call coalesced elsewhere (the ASGI micro-batchers)"""
+        with self._lock:
+            if coalesced:
+                self.coalesced += 1
+            else:
+                self.unique += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'unique': self.unique,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._flights),
+            }
@@ -0,0 +1,797 @@
+# 🔮 Luna predictions
+# Everything the API does short of HTTP: model loading, feature rows, model
+# calls and response bodies. The Flask app (app.py) and the ASGI app
+# (asgi.py) are thin layers over this module, which does not import Flask,
+# so the ASGI server can answer predictions without paying for it at boot.
+
+import math
+import os
+import warnings
+from collections import namedtuple
+from datetime import date, timedelta
+
+import numpy as np
+
+from admission import SHED_REASONS, AdmissionControl
+from features import CYCLE_LENGTH, MENSES_LENGTH, IRREGULAR_CYCLE, SYMPTOMS, SPECS
+from forest_engine import CompiledForest
+from metrics import NULL_TIMER, Metrics
+from model_registry import ModelRegistry
+from model_store import ModelStore
+from payloads import PayloadError, SCHEMAS, Unauthorized
+from prediction_cache import CachedModel, PredictionCache, SingleFlight
+from symptom_table import SymptomTable
+from user_stats import RECENT_CYCLES, RunningStats, UserStatsStore, token_matches
+
+# Request counts, latencies and per-stage timings, served at /metrics
+metrics = Metrics()
+
+# Per-model prediction caches (PREDICTION_CACHE_SIZE=0 turns caching off)
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', 4096))
+PREDICTION_CACHE_TTL = float(os.environ.get('PREDICTION_CACHE_TTL', 3600))
+prediction_caches = {}
+
+# Use ABSOLUTE paths in Docker container (MODELS_DIR overrides for local runs)
+MODELS_DIR = os.environ.get('MODELS_DIR', '/app/models')
+
+# Precomputed symptom grid (build with symptom_table.py; SYMPTOM_TABLE='' turns it off)
+SYMPTOM_TABLE = os.environ.get('SYMPTOM_TABLE', os.path.join(MODELS_DIR, 'symptom_table.bin'))
+symptom_table = None
+
+# Content-addressed model store (model_store.py); models its manifest names are served
+# from it and swapped in without a restart when the manifest changes (MODEL_STORE='' turns it off)
+MODEL_STORE = os.environ.get('MODEL_STORE', os.path.join(MODELS_DIR, 'store'))
+model_store = ModelStore(MODEL_STORE) if MODEL_STORE else None
+
+# Seconds between checks of the store's manifest (0 turns the watcher off;
+# POST /admin/models/reload still reloads on demand)
+MODEL_RELOAD_INTERVAL = float(os.environ.get('MODEL_RELOAD_INTERVAL', 30))
+
+# Models loaded in the background at startup, in this order (MODEL_WARMUP='' turns it off).
+# next_period is not used by any route, so it only loads if asked for.
+MODEL_WARMUP = os.environ.get('MODEL_WARMUP', 'cycle_length,symptom_predictor,irregular_cycle,menses_length')
+
+# SQLite file of per-user cycle statistics (user_stats.py), which payloads reference
+# by user_id. Off by default: each instance would otherwise keep its own copy.
+# USER_STATS_SECRET signs the per-user tokens every use of a user_id needs;
+# without it the statistics stay off. USER_STATS_WINDOW is how many recent cycles
+# the recent-cycle features cover; keep it at the number the client sends
+USER_STATS_DB = os.environ.get('USER_STATS_DB', '')
+USER_STATS_SECRET = os.environ.get('USER_STATS_SECRET', '')
+USER_STATS_WINDOW = int(os.environ.get('USER_STATS_WINDOW', RECENT_CYCLES))
+if USER_STATS_DB and not USER_STATS_SECRET:
+    print("⚠️ USER_STATS_DB is set without USER_STATS_SECRET: user statistics stay off")
+user_stats = (UserStatsStore(USER_STATS_DB, USER_STATS_WINDOW)
+              if USER_STATS_DB and USER_STATS_SECRET else None)
+
+# Admission control (admission.py): requests each endpoint runs at once, how many more
+# may wait for a slot, and the time budget after which a request gets the degraded
+# tier instead (ADMISSION_CONCURRENCY=0 turns it off). Clients can ask for a tighter
+# budget with an X-Request-Budget-Ms header
+ADMISSION_CONCURRENCY = int(os.environ.get('ADMISSION_CONCURRENCY', 4))
+ADMISSION_QUEUE_DEPTH = int(os.environ.get('ADMISSION_QUEUE_DEPTH', 16))
+ADMISSION_BUDGET_MS = float(os.environ.get('ADMISSION_BUDGET_MS', 500))
+admission = (AdmissionControl(ADMISSION_CONCURRENCY, ADMISSION_QUEUE_DEPTH, ADMISSION_BUDGET_MS / 1000)
+             if ADMISSION_CONCURRENCY > 0 else None)
+
+def prepare_model(model_name, model, version):
+    """Checks and wrappers applied to every model as it is loaded"""
+    if isinstance(model, CompiledForest):
+        print(f"⚡ Compiled {model_name}: {model.n_estimators} trees, {model.n_nodes} nodes")
+    
+    # Serving builds float32 NumPy rows from features.py, so the column order
+    # is checked once here instead of carrying DataFrame column names per request
+    try:
+        SPECS[model_name].check(model)
+    except ValueError as e:
+        print(f"⚠️ {e}")
+    
+    if model_name == 'symptom_predictor':
+        # Travels with the model, so a request never pairs one version's table with another's forest
+        model.symptom_table = load_symptom_table(version)
+    
+    if PREDICTION_CACHE_SIZE > 0:
+        # Keys carry the file's content hash, so a new model never sees old answers
+        prediction_caches[model_name] = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL)
+        model = CachedModel(model, version, prediction_caches[model_name])
+    return model
+
+def warm_model(model_name, model):
+    """One throwaway prediction on a default row: builds the engine's split
+    edges and faults in its arrays before a request needs them"""
+    row = SPECS[model_name].row({})
+    if hasattr(model, 'split_bins'):
+        model.split_bins(row)
+    if getattr(model, 'classes_', None) is not None:
+        model.predict_proba(row)
+    else:
+        model.predict(row)
+
+def load_models():
+    """Register Luna's models for loading on first use and start the warmup thread"""
+    print(f"🎯 Looking for models in: {MODELS_DIR}")
+    registry = ModelRegistry({
+        'cycle_length': os.path.join(MODELS_DIR, 'cycle_length_model_minimal.pkl'),
+        'menses_length': os.path.join(MODELS_DIR, 'menses_length_model.pkl'),
+        'next_period': os.path.join(MODELS_DIR, 'next_period_predictor.pkl'),
+        'irregular_cycle': os.path.join(MODELS_DIR, 'irregular_cycle_detector.pkl'),
+        'symptom_predictor': os.path.join(MODELS_DIR, 'symptom_predictor.pkl')
+    }, prepare=prepare_model, warm=warm_model, store=model_store)
+    
+    for model_name, status in registry.stats().items():
+        if status == 'missing':
+            print(f"❌ Model file not found: {registry.files[model_name]}")
+    
+    warmup = [name for name in MODEL_WARMUP.split(',') if name]
+    if warmup:
+        print(f"🔥 Warming up in the background: {warmup}")
+        registry.warmup(warmup)
+    else:
+        registry.ready.set()
+    if model_store is not None and MODEL_RELOAD_INTERVAL > 0:
+        registry.watch(MODEL_RELOAD_INTERVAL)
+    return registry
+
+def load_symptom_table(version):
+    """Precomputed table for on-grid symptom requests, if one matches the model
+    version: the store's table for that version first, then SYMPTOM_TABLE"""
+    global symptom_table
+    paths = [SYMPTOM_TABLE] if SYMPTOM_TABLE else []
+    if model_store is not None:
+        paths.insert(0, model_store.object_path(version, 'table'))
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        try:
+            table = SymptomTable.load(path)
+        except Exception as e:
+            print(f"❌ Error loading symptom table: {e}")
+            continue
+        if table.model_version != version:
+            print(f"⚠️ Symptom table {path} was built for another model version, ignoring it")
+            continue
+        symptom_table = table
+        print(f"📅 Symptom table loaded: {table.values.shape[:-1]} grid, {table.values.nbytes / 1e6:.1f} MB")
+        return table
+    symptom_table = None
+    return None
+
+# Rows come from the feature specs, which own the column order
+warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+# Models load lazily; this only registers them and starts the warmup thread
+models = load_models()
+
+# Per-model coalescing of concurrent identical single-row predictions (predict_first)
+singleflights = {name: SingleFlight() for name in models.files}
+
+def readiness():
+    """Body of the readiness probe"""
+    return {
+        'ready': models.ready.is_set(),
+        'models_loaded': sorted(models.keys()),
+    }
+
+# ===================================
+# METRICS
+# Read from their owners on every /metrics scrape
+# ===================================
+
+@metrics.collector
+def model_metrics():
+    load_stats = dict(models.load_stats)
+    return [
+        ('model_loaded', 'gauge', 'Whether the model is loaded', ('model',),
+         [((name,), int(name in load_stats)) for name in models.files]),
+        ('model_load_seconds', 'gauge', 'Time taken to load the model', ('model', 'source'),
+         [((name, stats['source']), stats['load_ms'] / 1000) for name, stats in load_stats.items()]),
+        ('model_version_info', 'gauge', 'Version of the model being served', ('model', 'version'),
+         [((name, stats['version']), 1) for name, stats in load_stats.items()]),
+        ('model_reloads_total', 'counter', 'Model versions swapped in without a restart', (),
+         [((), models.reloads)]),
+    ]
+
+@metrics.collector
+def cache_metrics():
+    caches = {f'prediction_cache:{name}': cache.stats() for name, cache in prediction_caches.items()}
+    lookups = {name: (stats['hits'], stats['misses']) for name, stats in caches.items()}
+    if symptom_table is not None:
+        lookups['symptom_table'] = (symptom_table.hits, symptom_table.misses)
+    return [
+        ('cache_hits_total', 'counter', 'Rows answered from a cache or lookup table', ('cache',),
+         [((name,), hits) for name, (hits, _) in lookups.items()]),
+        ('cache_misses_total', 'counter', 'Rows a cache or lookup table had to pass on', ('cache',),
+         [((name,), misses) for name, (_, misses) in lookups.items()]),
+        ('cache_entries', 'gauge', 'Rows held by each prediction cache', ('cache',),
+         [((name,), stats['size']) for name, stats in caches.items()]),
+    ]
+
+@metrics.collector
+def singleflight_metrics():
+    flights = {name: flight.stats() for name, flight in singleflights.items()}
+    return [
+        ('singleflight_requests_total', 'counter',
+         'Single-row predictions that ran the model (unique) or shared a concurrent identical one (coalesced)',
+         ('model', 'result'),
+         [((name, result), stats[result]) for name, stats in flights.items() for result in ('unique', 'coalesced')]),
+    ]
+
+@metrics.collector
+def admission_metrics():
+    if admission is None:
+        return []
+    limiters = admission.stats()
+    return [
+        ('admission_admitted_total', 'counter', 'Requests given a slot by admission control', ('endpoint',),
+         [((endpoint,), stats['admitted']) for endpoint, stats in limiters.items()]),
+        ('admission_shed_total', 'counter', 'Requests shed to the degraded tier under load',
+         ('endpoint', 'reason'),
+         [((endpoint, reason), stats['shed'][reason]) for endpoint, stats in limiters.items()
+          for reason in SHED_REASONS]),
+        ('admission_waiting', 'gauge', 'Requests waiting for a slot', ('endpoint',),
+         [((endpoint,), stats['waiting']) for endpoint, stats in limiters.items()]),
+    ]
+
+# ===================================
+# RESPONSES
+# Shared by the single-user routes and their /batch variants
+# Feature rows come from features.py
+# ===================================
+
+def cycle_length_result(data, row, prediction):
+    return {
+        'predicted_cycle_length': round(prediction, 1),
+        'model_accuracy': '0.09 days MAE - World Champion!',
+        'confidence': 'high',
+        'explanation': f'Your cycle length: {prediction:.1f} days'
+    }
+
+def menses_length_result(data, row, prediction):
+    return {
+        'predicted_menses_length': round(prediction, 1),
+        'model_accuracy': '0.26 days MAE - Excellent!',
+        'confidence': 'high',
+        'explanation': f'Your period length: {prediction:.1f} days'
+    }
+
+def next_period_result(data, row, predicted_cycle_length):
+    current_cycle_day = data.get('current_cycle_day', 1)
+    
+    # Calculate days until next period
+    days_until = max(1, int(predicted_cycle_length - current_cycle_day))
+    if days_until <= 0:
+        days_until = int(predicted_cycle_length + days_until)
+    
+    # Determine confidence
+    cycles_logged = data.get('cycles_logged', 0)
+    confidence = 'high' if cycles_logged >= 3 else 'medium' if cycles_logged >= 1 else 'low'
+    
+    return {
+        'days_until_next_period': days_until,
+        'predicted_cycle_length': round(predicted_cycle_length, 1),
+        'confidence': confidence,
+        'explanation': f'Next period in {days_until} days (based on {predicted_cycle_length:.1f}-day cycle)',
+        'model_accuracy': '0.09 MAE Champion Model Used!'
+    }
+
+def irregular_cycle_scores(model, features):
+    """(probability, label) pairs from a single predict_proba call"""
+    proba = model.predict_proba(features)
+    # Same decision rule as RandomForestClassifier.predict, without a second pass over the trees
+    labels = model.classes_.take(np.argmax(proba, axis=1))
+    return zip(proba[:, 1], labels)
+
+def irregular_cycle_result(data, row, prediction):
+    irregular_prob, is_irregular = prediction
+    cycle_length = row[IRREGULAR_CYCLE.index('CycleLength')]
+    variability = row[IRREGULAR_CYCLE.index('CycleVariability')]
+    
+    # Generate warnings
+    warnings = []
+    recommendations = []
+    
+    if cycle_length > 35:
+        warnings.append("Long cycles detected")
+        recommendations.append("Monitor for PCOS symptoms")
+    if variability > 7:
+        warnings.append("High cycle variability") 
+        recommendations.append("Track stress and lifestyle factors")
+    if data.get('unusual_bleeding', 0):
+        warnings.append("Unusual bleeding patterns")
+        recommendations.append("Discuss with healthcare provider")
+    
+    return {
+        'is_irregular': bool(is_irregular),
+        'irregular_probability': round(irregular_prob, 3),
+        'risk_level': 'high' if irregular_prob >= 0.7 else 'medium' if irregular_prob >= 0.4 else 'low',
+        'warnings': warnings,
+        'recommendations': recommendations,
+        'model_accuracy': 'Perfect AUC 1.000!',
+        'pcos_risk_score': int(row[IRREGULAR_CYCLE.index('PCOSRiskScore')])
+    }
+
+# [cramp_intensity, flow_intensity, fatigue_level, mood_impact, overall_discomfort]
+def get_description(intensity):
+    if intensity <= 2: return 'None to minimal'
+    if intensity <= 4: return 'Mild'
+    if intensity <= 6: return 'Moderate'
+    if intensity <= 8: return 'Strong'
+    return 'Severe'
+
+def cycle_phase(cycle_day, cycle_length, menses_length):
+    """Cycle phase and user-facing message for a cycle day"""
+    if cycle_day <= menses_length:
+        phase = "menstrual"
+        phase_message = f"Day {cycle_day} of your period"
+    elif cycle_day > (cycle_length - 5):
+        phase = "pms"
+        phase_message = f"{cycle_length - cycle_day + 1} days until period"
+    elif abs(cycle_day - (cycle_length - 14)) <= 2:
+        phase = "ovulation"
+        phase_message = "Around ovulation time"
+    else:
+        phase = "follicular" if cycle_day <= (cycle_length - 14) else "luteal"
+        phase_message = f"{phase.title()} phase"
+    return phase, phase_message
+
+def cycle_phases(cycle_days, cycle_length, menses_length):
+    """cycle_phase for an array of cycle days: (phases, phase messages) arrays"""
+    days = np.asarray(cycle_days)
+    menstrual = days <= menses_length
+    pms = ~menstrual & (days > cycle_length - 5)
+    ovulation = ~menstrual & ~pms & (np.abs(days - (cycle_length - 14)) <= 2)
+    follicular = days <= cycle_length - 14
+    conditions = [menstrual, pms, ovulation, follicular]
+    phases = np.select(conditions, ['menstrual', 'pms', 'ovulation', 'follicular'], 'luteal')
+    messages = np.select(conditions, [
+        np.char.add(np.char.add('Day ', days.astype(str)), ' of your period'),
+        np.char.add((cycle_length - days + 1).astype(str), ' days until period'),
+        'Around ovulation time',
+        'Follicular phase',
+    ], 'Luteal phase')
+    return phases, messages
+
+def symptom_result(data, row, predictions):
+    cycle_day = data.get('cycle_day', 1)
+    cycle_length = data.get('cycle_length', 28)
+    menses_length = data.get('menses_length', 5)
+    
+    # Determine cycle phase for context
+    phase, phase_message = cycle_phase(cycle_day, cycle_length, menses_length)
+    
+    return {
+        'cramp_intensity': round(predictions[0], 1),
+        'flow_intensity': round(predictions[1], 1),
+        'fatigue_level': round(predictions[2], 1),
+        'mood_impact': round(predictions[3], 1),
+        'overall_discomfort': round(predictions[4], 1),
+        'descriptions': {
+            'cramps': get_description(predictions[0]),
+            'flow': get_description(predictions[1]),
+            'fatigue': get_description(predictions[2]),
+            'mood': get_description(predictions[3]),
+            'overall': get_description(predictions[4])
+        },
+        'phase': phase,
+        'phase_message': phase_message,
+        'model_accuracy': '90%+ accuracy within 1 point!',
+        'confidence': 'high' if cycle_day <= menses_length or cycle_day > (cycle_length - 5) else 'medium'
+    }
+
+# ===================================
+# BATCH SCORING
+# ===================================
+
+def score_batch(items, spec, predict, make_result, timer=NULL_TIMER, schema=None, authorization=None):
+    """
+    Score every payload with ONE model call.
+    
+    Items that fail `schema` or cannot build a numeric feature row get an
+    {'error': ...} entry in their slot instead of failing the whole batch;
+    results keep input order. `authorization` is the request's Authorization
+    header, checked against any user_id (with_user_stats).
+    """
+    results = [None] * len(items)
+    if schema is not None:
+        items = list(items)
+        for i, data in enumerate(items):
+            try:
+                items[i] = with_user_stats(schema.validate(data), authorization)
+            except PayloadError as e:
+                results[i] = {'error': str(e)}
+        valid = [i for i, result in enumerate(results) if result is None]
+        scored = [items[i] for i in valid]
+    else:
+        valid, scored = range(len(items)), items
+    features, positions, errors = spec.rows(scored)
+    positions = [valid[i] for i in positions]
+    timer.mark('features')
+    
+    for i, message in errors.items():
+        results[valid[i]] = {'error': message}
+    
+    if positions:
+        predictions = predict(features)
+        timer.mark('inference')
+        for i, row, prediction in zip(positions, features, predictions):
+            try:
+                results[i] = make_result(items[i], row, prediction)
+            except Exception as e:
+                results[i] = {'error': str(e)}
+    
+    return results
+
+def with_user_stats(data, authorization=None):
+    """Validated payload with its user_id's stored statistics filled in where
+    the payload leaves them out (an explicit recent_cycle_lengths wins).
+    `authorization` must carry the user's token (user_stats.py)"""
+    data.pop('cycle_stats', None)   # only ever set here
+    user_id = data.get('user_id')
+    if user_id is None or user_stats is None:
+        return data
+    if not token_matches(USER_STATS_SECRET, user_id, authorization):
+        raise Unauthorized([f'user_id: no valid token for {user_id}'])
+    stats = user_stats.get(user_id)
+    if stats is None:
+        return data
+    fields = stats.payload_fields()
+    if 'recent_cycle_lengths' in data:
+        fields.pop('cycle_stats', None)
+    return {**fields, **data}
+
+def predict_values(model, features):
+    return model.predict(features)
+
+def predict_symptom_values(model, features):
+    """Symptom outputs from the lookup table where it covers a row, the forest elsewhere"""
+    table = getattr(model, 'symptom_table', None)
+    if table is None:
+        return model.predict(features)
+    return table.predict(model, features)
+
+# ===================================
+# SINGLE-USER ROUTES
+# Served by the Flask routes (app.py) and the micro-batching ASGI app (asgi.py)
+# ===================================
+
+# `predict(model, features)` yields one prediction per row; `fallback` is
+# returned with the error message when anything fails; `schema` validates
+# the payload first (payloads.py)
+PredictionRoute = namedtuple('PredictionRoute',
+                             'model_name spec predict make_result fallback missing_message schema')
+
+PREDICTION_ROUTES = {
+    '/predict/cycle-length': PredictionRoute(
+        'cycle_length', CYCLE_LENGTH, predict_values, cycle_length_result,
+        {'predicted_cycle_length': 28.0, 'confidence': 'low'},
+        'Cycle length model not loaded',
+        SCHEMAS['/predict/cycle-length']),
+    '/predict/menses-length': PredictionRoute(
+        'menses_length', MENSES_LENGTH, predict_values, menses_length_result,
+        {'predicted_menses_length': 5.0, 'confidence': 'low'},
+        'Menses length model not loaded',
+        SCHEMAS['/predict/menses-length']),
+    '/predict/next-period': PredictionRoute(
+        'cycle_length', CYCLE_LENGTH, predict_values, next_period_result,
+        {'days_until_next_period': 14, 'predicted_cycle_length': 28.0, 'confidence': 'low'},
+        'Cycle length model not loaded',
+        SCHEMAS['/predict/next-period']),
+    '/detect/irregular-cycle': PredictionRoute(
+        'irregular_cycle', IRREGULAR_CYCLE, irregular_cycle_scores, irregular_cycle_result,
+        {'is_irregular': False, 'irregular_probability': 0.0, 'risk_level': 'low',
+         'warnings': [], 'recommendations': []},
+        'Irregular cycle model not loaded',
+        SCHEMAS['/detect/irregular-cycle']),
+    '/predict/symptoms': PredictionRoute(
+        'symptom_predictor', SYMPTOMS, predict_symptom_values, symptom_result,
+        {'cramp_intensity': 2, 'flow_intensity': 0, 'fatigue_level': 3, 'mood_impact': 2,
+         'overall_discomfort': 2},
+        'Symptom predictor model not loaded',
+        SCHEMAS['/predict/symptoms']),
+}
+
+def predict_first(model_name, predict, features):
+    """First prediction of `predict(model, features)` for a loaded model.
+    
+    Concurrent calls with the same feature row share one model call, so a
+    burst of identical payloads across the server's threads runs the forest
+    once and every caller gets that call's result. The key is the float32 row
+    the feature spec built, which already folds every spelling of a payload
+    ('9', 9, 9.0, a default left out) into the same bytes.
+    """
+    model = models[model_name]
+    # The model object and predict function are part of the key: a reload
+    # mid-burst starts a new flight, and irregular_cycle_scores never shares
+    # with a plain predict
+    key = (id(model), predict, features[0].tobytes())
+    return singleflights[model_name].do(key, lambda: next(iter(predict(model, features))))
+
+# ===================================
+# DASHBOARD
+# One user payload in, every model's answer out
+# ===================================
+
+def dashboard_section(build):
+    """Run one dashboard section, turning a failure into an error entry"""
+    try:
+        return build()
+    except Exception as e:
+        return {'error': str(e)}
+
+# Returned with the error message when the whole dashboard fails
+DASHBOARD_FALLBACK = {
+    'next_period': {
+        'days_until_next_period': 14,
+        'predicted_cycle_length': 28.0,
+        'confidence': 'low'
+    }
+}
+
+def predict_dashboard_sections(data, predict_one=predict_first):
+    """
+    Shared derived features are computed once and reused by every model:
+    menses length, the cycle length forest prediction and the cycle phase.
+    
+    Every model call goes through `predict_one`, which the ASGI app swaps for
+    its micro-batchers.
+    """
+    age = data.get('age', 25)
+    bmi = data.get('bmi', 25)
+    cycle_day = data.get('current_cycle_day', 1)
+    mean_cycle_length = data.get('mean_cycle_length', 28)
+    luteal_phase_length = data.get('luteal_phase_length', 14)
+    
+    # 1. Menses length: the user's own average, else the usual 5 days
+    menses_length = data.get('menses_length', 5)
+    
+    # 2. Cycle length: ONE champion forest evaluation shared by every section
+    if 'cycle_length' not in models:
+        raise RuntimeError('Cycle length model not loaded')
+    cycle_data = {
+        'LengthofMenses': menses_length,
+        'Age': age,
+        'BMI': bmi,
+        'EstimatedDayofOvulation': data.get('estimated_day_of_ovulation', mean_cycle_length - 14),
+        'LengthofLutealPhase': luteal_phase_length,
+        'TotalDaysofFertility': data.get('total_days_of_fertility', 6),
+        'current_cycle_day': cycle_day,
+        'cycles_logged': data.get('cycles_logged', 0)
+    }
+    cycle_features = CYCLE_LENGTH.row(cycle_data)
+    predicted_cycle_length = predict_one('cycle_length', predict_values, cycle_features)
+    
+    # 3. Phase on the whole-day cycle the symptom model was trained on
+    cycle_length = int(round(predicted_cycle_length))
+    phase, phase_message = cycle_phase(cycle_day, cycle_length, menses_length)
+    
+    def irregular_section():
+        if 'irregular_cycle' not in models:
+            raise RuntimeError('Irregular cycle model not loaded')
+        irregular_data = dict(data)
+        irregular_data['recent_cycle_lengths'] = data.get('recent_cycle_lengths') or [cycle_length]
+        irregular_data['menses_length'] = menses_length
+        irregular_data['luteal_phase_length'] = luteal_phase_length
+        features = IRREGULAR_CYCLE.row(irregular_data)
+        prediction = predict_one('irregular_cycle', irregular_cycle_scores, features)
+        return irregular_cycle_result(irregular_data, features[0], prediction)
+    
+    def symptom_section():
+        if 'symptom_predictor' not in models:
+            raise RuntimeError('Symptom predictor model not loaded')
+        symptom_data = {
+            'cycle_day': cycle_day,
+            'cycle_length': cycle_length,
+            'menses_length': menses_length,
+            'age': age,
+            'bmi': bmi,
+            'pregnancies': data.get('number_pregnancies', 0),
+            'mean_bleeding_intensity': data.get('bleeding_intensity', 5)
+        }
+        features = SYMPTOMS.row(symptom_data)
+        predictions = predict_one('symptom_predictor', predict_symptom_values, features)
+        return symptom_result(symptom_data, features[0], predictions)
+    
+    return {
+        'cycle': {
+            'predicted_cycle_length': round(predicted_cycle_length, 1),
+            'menses_length': menses_length,
+            'cycle_day': cycle_day,
+            'phase': phase,
+            'phase_message': phase_message
+        },
+        'next_period': dashboard_section(
+            lambda: next_period_result(cycle_data, cycle_features[0], predicted_cycle_length)),
+        'irregular_cycle': dashboard_section(irregular_section),
+        'symptoms': dashboard_section(symptom_section)
+    }
+
+# ===================================
+# DEGRADED TIER
+# What a request shed by admission control gets instead of a model call:
+# the calendar arithmetic the fallbacks above stand for, run on the same
+# feature row, through the same response builders. Microseconds, no model.
+# ===================================
+
+def heuristic_cycle_length(row):
+    # A cycle is the days up to ovulation plus the luteal phase (14 + 14 by default)
+    return float(row[CYCLE_LENGTH.index('EstimatedDayofOvulation')] + row[CYCLE_LENGTH.index('LengthofLutealPhase')])
+
+def heuristic_irregular_cycle(row):
+    # The textbook rule: outside 21-35 days, or varying by more than a week
+    irregular = (row[IRREGULAR_CYCLE.index('CycleTooShort')] or row[IRREGULAR_CYCLE.index('CycleTooLong')]
+                 or row[IRREGULAR_CYCLE.index('CycleVariability')] > 7)
+    return (1.0, 1) if irregular else (0.0, 0)
+
+# Stand-ins for one model prediction, from its feature row
+HEURISTICS = {
+    'cycle_length': heuristic_cycle_length,
+    'menses_length': lambda row: PREDICTION_ROUTES['/predict/menses-length'].fallback['predicted_menses_length'],
+    'irregular_cycle': heuristic_irregular_cycle,
+    'symptom_predictor': lambda row: [PREDICTION_ROUTES['/predict/symptoms'].fallback[key] for key in SYMPTOM_KEYS],
+}
+
+def predict_heuristic(model_name, predict, features):
+    """predict_first's signature, answered by HEURISTICS"""
+    return HEURISTICS[model_name](features[0])
+
+def mark_degraded(result):
+    """A response body built from the degraded tier, saying so"""
+    result.pop('model_accuracy', None)
+    result['confidence'] = 'low'
+    result['degraded'] = True
+    return result
+
+def degraded_result(path, data):
+    """`path`'s response body for a validated payload, without its model"""
+    route = PREDICTION_ROUTES[path]
+    features = route.spec.row(data)
+    prediction = predict_heuristic(route.model_name, route.predict, features)
+    return mark_degraded(route.make_result(data, features[0], prediction))
+
+def degraded_dashboard(data):
+    sections = predict_dashboard_sections(data, predict_heuristic)
+    for name in ('next_period', 'irregular_cycle', 'symptoms'):
+        if 'error' not in sections[name]:
+            mark_degraded(sections[name])
+    sections['degraded'] = True
+    return sections
+
+
+# ===================================
+# SYMPTOM CALENDAR
+# A whole cycle of daily symptoms from one model call
+# ===================================
+
+SYMPTOM_KEYS = ('cramp_intensity', 'flow_intensity', 'fatigue_level', 'mood_impact', 'overall_discomfort')
+DESCRIPTION_KEYS = ('cramps', 'flow', 'fatigue', 'mood', 'overall')
+
+def get_descriptions(intensities):
+    """get_description for an array of intensities"""
+    return np.select([intensities <= 2, intensities <= 4, intensities <= 6, intensities <= 8],
+                     ['None to minimal', 'Mild', 'Moderate', 'Strong'], 'Severe')
+
+def symptom_calendar_rows(data):
+    """(cycle days, feature rows) for days 1..cycle_length of one profile, as one matrix"""
+    profile = {field.name: float(field.read(data)) for field in SYMPTOMS.fields}
+    days = np.arange(1, int(profile['cycle_length']) + 1)
+    columns = {name: np.full(len(days), value) for name, value in profile.items()}
+    columns['cycle_day'] = days
+    return days, SYMPTOMS.from_columns(columns)
+
+def symptom_calendar_result(data, days, predictions):
+    """One symptom_result body per cycle day, built column-wise"""
+    cycle_length = data.get('cycle_length', 28)
+    menses_length = data.get('menses_length', 5)
+    phases, messages = cycle_phases(days, cycle_length, menses_length)
+    predictions = np.asarray(predictions, dtype=np.float64)
+    values = np.round(predictions, 1).tolist()
+    descriptions = get_descriptions(predictions).tolist()
+    confidence = np.where((days <= menses_length) | (days > cycle_length - 5), 'high', 'medium').tolist()
+    
+    return {
+        'cycle_length': cycle_length,
+        'menses_length': menses_length,
+        'days': [
+            {
+                'cycle_day': day,
+                **dict(zip(SYMPTOM_KEYS, values[i])),
+                'descriptions': dict(zip(DESCRIPTION_KEYS, descriptions[i])),
+                'phase': phase,
+                'phase_message': message,
+                'confidence': confidence[i],
+            }
+            for i, (day, phase, message) in enumerate(zip(days.tolist(), phases.tolist(), messages.tolist()))
+        ],
+        'model_accuracy': '90%+ accuracy within 1 point!'
+    }
+
+def predict_symptom_calendar(data):
+    """Symptoms for every day of the user's cycle: ONE symptom model call"""
+    if 'symptom_predictor' not in models:
+        raise RuntimeError('Symptom predictor model not loaded')
+    days, features = symptom_calendar_rows(data)
+    predictions = predict_symptom_values(models['symptom_predictor'], features)
+    return symptom_calendar_result(data, days, predictions)
+
+# ===================================
+# MULTI-CYCLE FORECAST
+# The next `horizon` period start dates with uncertainty bands. Each
+# simulated path draws every cycle's length from the cycle length forest's
+# per-tree predictions plus the user's cycle-to-cycle variation, and the
+# paths are accumulated in one array op; percentiles across them give the
+# dates.
+# ===================================
+
+# Simulated cycle sequences per forecast
+FORECAST_PATHS = int(os.environ.get('FORECAST_PATHS', 4000))
+FORECAST_PERCENTILES = (10, 50, 90)
+# Cycle-to-cycle SD of one user's cycle length when little history is
+# logged: the pooled within-user SD of models/data/menstrual_data.csv
+POPULATION_CYCLE_SD = 2.8
+# Weight of POPULATION_CYCLE_SD against the user's own history, in cycles
+PRIOR_CYCLES = 3
+# Bounds on a sampled cycle length, in days
+FORECAST_CYCLE_DAYS = (15, 90)
+
+def tree_predictions(model, features):
+    """One cycle length per tree of the forest, for a single feature row"""
+    if hasattr(model, 'predict_trees'):
+        return model.predict_trees(features)[0, :, 0]
+    return np.array([tree.predict(features)[0] for tree in model.estimators_])
+
+def cycle_length_sd(history):
+    """The user's cycle-to-cycle SD from a RunningStats of their cycle lengths,
+    shrunk toward POPULATION_CYCLE_SD while few cycles are logged"""
+    dof = max(history.count - 1, 0)
+    return math.sqrt((history.m2 + PRIOR_CYCLES * POPULATION_CYCLE_SD ** 2) / (dof + PRIOR_CYCLES))
+
+def simulate_period_starts(tree_values, sd, days_elapsed, horizon, paths=FORECAST_PATHS, seed=0):
+    """(paths, horizon) days from the current cycle's first day to each coming period start"""
+    # Fixed seed: the same request always gets the same dates
+    rng = np.random.default_rng(seed)
+    lengths = tree_values[rng.integers(len(tree_values), size=(paths, horizon))]
+    lengths = np.clip(lengths + rng.normal(0.0, sd, size=(paths, horizon)), *FORECAST_CYCLE_DAYS)
+    # The current cycle has lasted days_elapsed days, so it ends tomorrow at the earliest
+    lengths[:, 0] = np.maximum(lengths[:, 0], days_elapsed + 1)
+    return np.cumsum(lengths, axis=1)
+
+def predict_cycle_forecast(data):
+    """Percentile start dates for each of the next `horizon` periods: ONE forest
+    evaluation, then FORECAST_PATHS simulated cycle sequences"""
+    if 'cycle_length' not in models:
+        raise RuntimeError('Cycle length model not loaded')
+    today = data.get('today') or date.today()
+    last_period_start = data.get('last_period_start')
+    if last_period_start is None:
+        last_period_start = today - timedelta(days=data.get('current_cycle_day', 1) - 1)
+    elif last_period_start > today:
+        raise PayloadError(['last_period_start: must not be after today'])
+    days_elapsed = (today - last_period_start).days
+    
+    features = CYCLE_LENGTH.row(data)
+    tree_values = tree_predictions(models['cycle_length'], features)
+    # Every logged cycle when the user's statistics are stored, else the history sent
+    stats = data.get('cycle_stats')
+    sd = cycle_length_sd(stats.cycle_length if stats is not None
+                         else RunningStats.of(data.get('recent_cycle_lengths') or []))
+    starts = simulate_period_starts(tree_values, sd, days_elapsed, data.get('horizon', 6))
+    # (percentiles, horizon) whole days after last_period_start
+    offsets = np.rint(np.percentile(starts, FORECAST_PERCENTILES, axis=0)).astype(int).tolist()
+    median = offsets[FORECAST_PERCENTILES.index(50)]
+    
+    return {
+        'last_period_start': last_period_start.isoformat(),
+        'predicted_cycle_length': round(float(tree_values.mean()), 1),
+        'cycle_length_sd': round(sd, 1),
+        'periods': [
+            {
+                'cycle': k + 1,
+                'start_date': (last_period_start + timedelta(days=median[k])).isoformat(),
+                'days_until': median[k] - days_elapsed,
+                'dates': {f'p{q}': (last_period_start + timedelta(days=offset[k])).isoformat()
+                          for q, offset in zip(FORECAST_PERCENTILES, offsets)},
+            }
+            for k in range(len(median))
+        ],
+        'paths': FORECAST_PATHS
+    }
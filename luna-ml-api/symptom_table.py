@@ -0,0 +1,260 @@
+# 📅 Luna symptom lookup table
+# /predict/symptoms sees mostly discrete inputs: whole cycle days, cycle and
+# period lengths, ages and a handful of BMIs. This module evaluates the
+# symptom forest once over that grid, stores the outputs in a memory-mapped
+# file, and answers requests on the grid with an O(1) index computation.
+#
+# The table is exact, not an approximation:
+#   - cycle_day, cycle_length and menses_length feed the ratio/phase columns,
+#     so they are indexed by value and must be whole numbers in range.
+#   - age, bmi, pregnancies and mean_bleeding_intensity only feed their own
+#     columns, so they are indexed by which split interval of the forest they
+#     fall into. Any value sharing an interval with a grid value - not just the
+#     grid value itself - gets that grid point's answer, which is exactly what
+#     the forest would return.
+# Everything else is off the grid and goes to the forest.
+#
+# Build (prints build time and size; --model also takes a .bundle):
+#   python symptom_table.py --model models/symptom_predictor.pkl --out models/symptom_table.bin
+
+import argparse
+import itertools
+import json
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left
+
+import numpy as np
+
+from features import SYMPTOMS
+
+MAGIC = b'LUNASYMT'
+FORMAT_VERSION = 1
+DATA_ALIGNMENT = 64
+
+# Inputs indexed by value: (payload key, default range)
+EXACT_AXES = {
+    'cycle_day': range(1, 46),
+    'cycle_length': range(21, 41),
+    'menses_length': range(2, 9),
+}
+
+# Inputs indexed by split interval: (columns that depend only on this input, default grid)
+BINNED_AXES = {
+    'age': (('age', 'is_teenager', 'is_adult', 'is_older_adult'), range(13, 56)),
+    # Client falls back to 25 when a user has no height/weight logged
+    'bmi': (('bmi',), [25]),
+    # The app always sends 0 pregnancies and intensity 5 for symptoms
+    'pregnancies': (('pregnancies',), [0]),
+    'mean_bleeding_intensity': (('mean_bleeding_intensity',), [5]),
+}
+
+
+class SymptomTable:
+    """Memory-mapped grid of symptom forest outputs"""
+
+    def __init__(self, header, values):
+        self.header = header
+        self.values = values
+        self.model_version = header['model_version']
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._exact = [(SYMPTOMS.index(axis['name']), axis['start'], axis['stop'])
+                       for axis in header['axes'] if axis['kind'] == 'exact']
+        self._binned = [([SYMPTOMS.index(column) for column in axis['columns']], axis['edges'],
+                         axis['classes'])
+                        for axis in header['axes'] if axis['kind'] == 'binned']
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'{path} is not a symptom table')
+            (header_size,) = struct.unpack('<I', f.read(4))
+            header = json.loads(f.read(header_size))
+        if header['format_version'] != FORMAT_VERSION:
+            raise ValueError(f"{path}: table format {header['format_version']}, "
+                             f"expected {FORMAT_VERSION}")
+        values = np.memmap(path, dtype=header['dtype'], mode='r',
+                           offset=header['data_offset'], shape=tuple(header['shape']))
+        return cls(header, values)
+
+    def _index(self, row):
+        """Grid index of one feature row, or None when it is off the grid"""
+        index = []
+        for column, start, stop in self._exact:
+            value = row[column]
+            if not (start <= value < stop) or value != int(value):
+                return None
+            index.append(int(value) - start)
+        for columns, edges, classes in self._binned:
+            key = ','.join(str(bisect_left(column_edges, row[column]))
+                           for column, column_edges in zip(columns, edges))
+            slot = classes.get(key)
+            if slot is None:
+                return None
+            index.append(slot)
+        return tuple(index)
+
+    def lookup(self, features):
+        """(outputs, hit mask) for a (n, columns) feature array; misses are left as zeros"""
+        outputs = np.zeros((len(features), self.values.shape[-1]))
+        hits = np.zeros(len(features), dtype=bool)
+        for i, row in enumerate(features.tolist()):
+            index = self._index(row)
+            if index is not None:
+                outputs[i] = self.values[index]
+                hits[i] = True
+        return outputs, hits
+
+    def predict(self, model, features):
+        """Table outputs where the grid covers a row, forest outputs elsewhere"""
+        outputs, hits = self.lookup(features)
+        hit_count = int(hits.sum())
+        with self._lock:
+            self.hits += hit_count
+            self.misses += len(hits) - hit_count
+        if not hits.all():
+            outputs[~hits] = model.predict(features[~hits])
+        return outputs
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        return {
+            'grid': dict(zip([axis['name'] for axis in self.header['axes']], self.values.shape)),
+            'size_mb': round(self.values.nbytes / 1e6, 1),
+            'hits': hits,
+            'misses': misses,
+        }
+
+
+def binned_axis(model, name, columns, grid):
+    """Header entry for a split-interval axis, deduplicating grid values"""
+    positions = [SYMPTOMS.index(column) for column in columns]
+    edges = [model.split_edges[position].tolist() for position in positions]
+    rows, _, errors = SYMPTOMS.rows([{name: value} for value in grid])
+    if errors:
+        raise ValueError(f'{name}: invalid grid values {errors}')
+    classes, representatives = {}, []
+    for value, row in zip(grid, rows.tolist()):
+        key = ','.join(str(bisect_left(column_edges, row[position]))
+                       for position, column_edges in zip(positions, edges))
+        if key not in classes:
+            classes[key] = len(representatives)
+            representatives.append(value)
+    return {'name': name, 'kind': 'binned', 'columns': list(columns), 'edges': edges,
+            'classes': classes, 'grid': representatives}
+
+
+def build_table(model, model_version, exact_axes=EXACT_AXES, binned_axes=BINNED_AXES):
+    """(header, values) for every grid point, evaluated with one batched predict"""
+    # Binned inputs must not leak into the cycle-position columns
+    probe = SYMPTOMS.rows([{}, {name: 1e6 for name in binned_axes}])[0]
+    changed = {SYMPTOMS.columns[i] for i in np.flatnonzero(probe[0] != probe[1])}
+    allowed = {column for owned, _ in binned_axes.values() for column in owned}
+    if not changed <= allowed:
+        raise ValueError(f'Binned inputs also change {sorted(changed - allowed)}')
+
+    axes = [{'name': name, 'kind': 'exact', 'start': values.start, 'stop': values.stop}
+            for name, values in exact_axes.items()]
+    axes += [binned_axis(model, name, columns, list(grid))
+             for name, (columns, grid) in binned_axes.items()]
+
+    grids = [list(range(axis['start'], axis['stop'])) if axis['kind'] == 'exact' else axis['grid']
+             for axis in axes]
+    names = [axis['name'] for axis in axes]
+    payloads = [dict(zip(names, point)) for point in itertools.product(*grids)]
+    features, _, errors = SYMPTOMS.rows(payloads)
+    if errors:
+        raise ValueError(f'{len(errors)} grid points do not build a feature row')
+
+    n_outputs = model.predict(features[:1]).shape[-1]
+    shape = [len(grid) for grid in grids] + [n_outputs]
+    values = np.asarray(model.predict(features), dtype=np.float64).reshape(shape)
+    header = {
+        'format': 'luna-symptom-table',
+        'format_version': FORMAT_VERSION,
+        'model_version': model_version,
+        'columns': SYMPTOMS.columns,
+        'axes': axes,
+        'dtype': '<f8',
+        'shape': shape,
+    }
+    return header, values
+
+
+def write_table(path, header, values):
+    header = dict(header)
+    header['data_offset'] = 0
+    # Fixed point: the offset is part of the header it follows
+    while True:
+        encoded = json.dumps(header, separators=(',', ':')).encode()
+        offset = -(-(len(MAGIC) + 4 + len(encoded)) // DATA_ALIGNMENT) * DATA_ALIGNMENT
+        if header['data_offset'] == offset:
+            break
+        header['data_offset'] = offset
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(encoded)))
+        f.write(encoded)
+        f.write(b'\0' * (offset - f.tell()))
+        f.write(np.ascontiguousarray(values, dtype=header['dtype']).tobytes())
+    os.replace(tmp_path, path)
+
+
+def parse_range(text):
+    """'21:40' -> range(21, 41), '25' -> [25], '0,1,2' -> [0, 1, 2]"""
+    if ':' in text:
+        low, high = text.split(':')
+        return range(int(low), int(high) + 1)
+    return [float(value) if '.' in value else int(value) for value in text.split(',')]
+
+
+def main():
+    import warnings
+
+    from model_bundle import load_bundle
+
+    parser = argparse.ArgumentParser(description='Build the symptom lookup table')
+    parser.add_argument('--model', default='models/symptom_predictor.pkl')
+    parser.add_argument('--out', default='models/symptom_table.bin')
+    for name in list(EXACT_AXES) + list(BINNED_AXES):
+        parser.add_argument(f"--{name.replace('_', '-')}", dest=name, type=parse_range,
+                            help='grid values, e.g. 21:40 or 0,1,2')
+    args = parser.parse_args()
+    warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+    exact_axes = {name: getattr(args, name) or values for name, values in EXACT_AXES.items()}
+    for name, values in exact_axes.items():
+        if not isinstance(values, range):
+            parser.error(f'--{name} takes a low:high range')
+    binned_axes = {name: (columns, getattr(args, name) or grid)
+                   for name, (columns, grid) in BINNED_AXES.items()}
+
+    start = time.perf_counter()
+    if args.model.endswith('.bundle'):
+        model = load_bundle(args.model)
+        model_version = model.header['model_version']
+    else:
+        import joblib
+        from forest_engine import CompiledForest
+        from prediction_cache import file_version
+        model = CompiledForest.from_estimator(joblib.load(args.model))
+        model_version = file_version(args.model)
+    header, values = build_table(model, model_version, exact_axes, binned_axes)
+    write_table(args.out, header, values)
+    elapsed = time.perf_counter() - start
+
+    print(f"✅ Symptom table written to {args.out}")
+    print(f"   grid: {' x '.join(f'{axis}={n}' for axis, n in zip([a['name'] for a in header['axes']], header['shape']))}")
+    print(f"   {values.size // values.shape[-1]:,} grid points, "
+          f"{os.path.getsize(args.out) / 1e6:.1f} MB, built in {elapsed:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+# test_admission.py
+# Run with: python -m pytest test_admission.py
+
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionControl, EndpointLimiter
+
+
+def test_limiter_queues_then_sheds():
+    limiter = EndpointLimiter(concurrency=1, queue_depth=1)
+    far = time.monotonic() + 10
+    assert limiter.acquire(far) is None
+
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(limiter.acquire(far)))
+    waiter.start()
+    while limiter.stats()['waiting'] == 0:
+        time.sleep(0.001)
+    assert limiter.acquire(far) == 'queue_full'
+    limiter.release(0.01)
+    waiter.join()
+    assert results == [None] and limiter.running == 1
+
+    # The waiter now holds the slot: a short deadline gives up once it passes
+    started = time.monotonic()
+    assert limiter.acquire(started + 0.05) == 'deadline'
+    assert 0.04 < time.monotonic() - started < 1
+    # ... and straight away when a typical request would not fit in it
+    limiter.service_time = 5.0
+    started = time.monotonic()
+    assert limiter.acquire(started + 1) == 'deadline' and time.monotonic() - started < 0.5
+
+    limiter.release(0.01)
+    assert limiter.stats()['shed'] == {'queue_full': 1, 'deadline': 2}
+    assert limiter.stats()['admitted'] == 2 and limiter.running == 0
+
+    # Client budgets only ever tighten the server's
+    admission = AdmissionControl(1, 0, budget=0.5)
+    assert admission.deadline('100', start=0) == pytest.approx(0.1)
+    assert admission.deadline('60000', start=0) == admission.deadline('soon', start=0) == 0.5
+
+
+def test_shed_requests_get_the_degraded_tier(monkeypatch):
+    app_module = pytest.importorskip('app')
+    import asgi
+    import predictions
+    if 'cycle_length' not in app_module.models:
+        pytest.skip('models not available')
+    client = app_module.app.test_client()
+    monkeypatch.setattr(predictions, 'admission', AdmissionControl(1, 0, budget=1.0))
+    payloads = {
+        '/predict/cycle-length': {'EstimatedDayofOvulation': 16, 'LengthofLutealPhase': 13},
+        '/predict/next-period': {'EstimatedDayofOvulation': 16, 'LengthofLutealPhase': 14,
+                                 'current_cycle_day': 10},
+        '/detect/irregular-cycle': {'recent_cycle_lengths': [45, 30]},
+        '/predict/symptoms': {'cycle_day': 2},
+        '/predict/dashboard': {'current_cycle_day': 3},
+    }
+
+    normal = client.post('/predict/cycle-length', json=payloads['/predict/cycle-length']).get_json()
+    assert 'degraded' not in normal
+    # Every slot taken: requests are shed on arrival
+    for path in list(payloads) + ['/predict/cycle-length/batch']:
+        assert predictions.admission[path].acquire(time.monotonic()) is None
+    degraded = {path: client.post(path, json=body) for path, body in payloads.items()}
+    assert all(response.status_code == 200 and response.get_json()['degraded']
+               for response in degraded.values())
+
+    cycle_length = degraded['/predict/cycle-length'].get_json()
+    assert cycle_length['predicted_cycle_length'] == 29.0 and cycle_length['confidence'] == 'low'
+    assert 'model_accuracy' not in cycle_length
+    assert degraded['/predict/next-period'].get_json()['days_until_next_period'] == 20
+    assert degraded['/detect/irregular-cycle'].get_json()['is_irregular'] is True
+    assert degraded['/predict/symptoms'].get_json()['phase'] == 'menstrual'
+    dashboard = degraded['/predict/dashboard'].get_json()
+    assert dashboard['cycle']['predicted_cycle_length'] == 28.0 and dashboard['next_period']['degraded']
+
+    # Bulk routes have no cheap tier
+    response = client.post('/predict/cycle-length/batch', json=[{}])
+    assert response.status_code == 503 and response.headers['Retry-After'] == '1'
+    assert 'luna_admission_shed_total{endpoint="/predict/cycle-length",reason="queue_full"} 1' in \
+        client.get('/metrics').get_data(as_text=True)
+
+    # The ASGI app sheds the same requests to the same bodies
+    async def call(path, body):
+        sent, messages = [], [{'type': 'http.request', 'body': json.dumps(body).encode()}]
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        await asgi.app({'type': 'http', 'method': 'POST', 'path': path, 'headers': []}, receive, send)
+        return sent[1]['body']
+
+    for path, body in payloads.items():
+        assert asyncio.run(call(path, body)) == degraded[path].data
+
+    for path in list(payloads) + ['/predict/cycle-length/batch']:
+        predictions.admission[path].release(0.001)
+    assert client.post('/predict/cycle-length', json=payloads['/predict/cycle-length']).get_json() == normal
@@ -0,0 +1,204 @@
+# test_asgi.py
+# Run with: python -m pytest test_asgi.py
+
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from asgi import MicroBatcher
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_concurrent_rows_share_one_call():
+    calls = []
+
+    def double(rows):
+        calls.append(len(rows))
+        return list(rows[:, 0] * 2)
+
+    async def scenario():
+        batcher = MicroBatcher(double, ThreadPoolExecutor(1), max_wait=0.05, max_batch=8)
+        outputs = await asyncio.gather(*[batcher.submit(np.array([i], dtype=np.float32))
+                                         for i in range(20)])
+        return outputs, batcher.stats()
+
+    outputs, stats = run(scenario())
+    assert outputs == [2 * i for i in range(20)]
+    assert calls == [8, 8, 4]
+    assert stats['rows'] == 20 and stats['batches'] == 3
+
+
+def test_errors_reach_every_waiting_request():
+    def fail(rows):
+        raise ValueError('model exploded')
+
+    async def scenario():
+        batcher = MicroBatcher(fail, ThreadPoolExecutor(1), max_wait=0.01)
+        return await asyncio.gather(*[batcher.submit(np.zeros(1)) for _ in range(3)],
+                                    return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in run(scenario()))
+
+
+def test_identical_rows_are_scored_once():
+    calls = []
+
+    def double(rows):
+        calls.append(len(rows))
+        return list(rows[:, 0] * 2)
+
+    async def scenario():
+        batcher = MicroBatcher(double, ThreadPoolExecutor(1), max_wait=0.01)
+        rows = [np.array([i % 3], dtype=np.float32) for i in range(12)]
+        first = await asyncio.gather(*[batcher.submit(row) for row in rows])
+        # Once scored, a row is queued again
+        return first, await batcher.submit(rows[0]), batcher.stats()
+
+    outputs, again, stats = run(scenario())
+    assert outputs == [2 * (i % 3) for i in range(12)] and again == 0
+    assert calls == [3, 1] and stats['coalesced'] == 9
+
+
+def test_concurrent_identical_requests_share_one_model_evaluation(monkeypatch):
+    app_module = pytest.importorskip('app')
+    import asgi
+    import predictions
+    if 'symptom_predictor' not in app_module.models:
+        pytest.skip('models not available')
+    route = predictions.PREDICTION_ROUTES['/predict/symptoms']
+    calls = []
+
+    def counted(model, features):
+        calls.append(len(features))
+        return route.predict(model, features)
+
+    monkeypatch.setitem(predictions.PREDICTION_ROUTES, '/predict/symptoms', route._replace(predict=counted))
+    monkeypatch.setattr(predictions, 'admission', None)
+    server = asgi.LunaASGI()
+    flight = predictions.singleflights['symptom_predictor']
+    before = flight.stats()
+    # The same row, spelled three ways
+    bodies = [{'cycle_day': 9}, {'cycle_day': '9', 'age': 25}, {'cycle_day': 9.0, 'bmi': 25.0}] * 4
+
+    async def call(body):
+        sent, messages = [], [{'type': 'http.request', 'body': json.dumps(body).encode()}]
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        await server({'type': 'http', 'method': 'POST', 'path': '/predict/symptoms', 'headers': []},
+                     receive, send)
+        return sent[1]['body']
+
+    async def scenario():
+        return await asyncio.gather(*[call(body) for body in bodies])
+
+    responses = run(scenario())
+    assert calls == [1] and len(set(responses)) == 1
+    after = flight.stats()
+    assert after['unique'] - before['unique'] == 1 and after['coalesced'] - before['coalesced'] == 11
+
+
+def test_responses_match_flask():
+    app_module = pytest.importorskip('app')
+    import asgi
+    client = app_module.app.test_client()
+    payloads = [('/predict/symptoms', {'cycle_day': 3, 'cycle_length': 29, 'age': 31}),
+                ('/detect/irregular-cycle', {'recent_cycle_lengths': [26, 35, 30]}),
+                ('/predict/cycle-length', {'Age': 'not a number'}),
+                ('/predict/dashboard', {'age': 29, 'current_cycle_day': 12, 'mean_cycle_length': 30}),
+                ('/predict/dashboard', {'current_cycle_day': 'x'})]
+    if not all(route in app_module.models for route in ('symptom_predictor', 'irregular_cycle',
+                                                        'cycle_length')):
+        pytest.skip('models not available')
+
+    async def call(path, body):
+        sent, messages = [], [{'type': 'http.request', 'body': json.dumps(body).encode()}]
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        await asgi.app({'type': 'http', 'method': 'POST', 'path': path, 'headers': []}, receive, send)
+        return sent[0]['status'], sent[1]['body']
+
+    async def scenario():
+        return await asyncio.gather(*[call(path, body) for path, body in payloads])
+
+    for (path, body), (status, data) in zip(payloads, run(scenario())):
+        response = client.post(path, json=body)
+        assert (status, data) == (response.status_code, response.data)
+
+
+def test_startup_waits_for_warm_models():
+    import asgi
+    from predictions import models
+
+    async def scenario():
+        messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        await asgi.app({'type': 'lifespan'}, receive, send)
+        return sent
+
+    assert [message['type'] for message in run(scenario())] == [
+        'lifespan.startup.complete', 'lifespan.shutdown.complete']
+    assert models.ready.is_set()
+
+
+def test_asgi_boots_without_flask():
+    import subprocess
+    import sys
+    result = subprocess.run([sys.executable, '-c', 'import sys, asgi; print("flask" in sys.modules)'],
+                            capture_output=True, text=True, env={**os.environ, 'MODEL_WARMUP': ''})
+    assert result.stdout.strip().splitlines()[-1] == 'False'
+
+
+def test_unexpected_errors_get_a_json_500(monkeypatch):
+    import sqlite3
+    import asgi
+    import predictions
+    from user_stats import user_token
+
+    class BrokenStore:
+        def get(self, user_id):
+            raise sqlite3.OperationalError('database is locked')
+
+    monkeypatch.setattr(predictions, 'user_stats', BrokenStore())
+    monkeypatch.setattr(predictions, 'USER_STATS_SECRET', 'test-secret')
+    headers = [(b'authorization', f"Bearer {user_token('test-secret', 'u1')}".encode())]
+
+    async def call(path):
+        sent, messages = [], [{'type': 'http.request', 'body': b'{"user_id": "u1"}'}]
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        await asgi.app({'type': 'http', 'method': 'POST', 'path': path, 'headers': headers}, receive, send)
+        return sent[0]['status'], json.loads(sent[1]['body'])
+
+    for path in ('/detect/irregular-cycle', '/predict/dashboard'):
+        status, body = run(call(path))
+        assert status == 500 and body['error'] == 'database is locked'
+        assert predictions.metrics.in_flight.value((path,)) == 0
@@ -0,0 +1,64 @@
+# test_benchmark.py
+# Run with: python -m pytest test_benchmark.py
+
+import json
+import os
+
+import pytest
+
+from benchmark import (BATCH_ROUTES, DATA_PATH, SINGLE_ROUTES, PayloadGenerator, compare,
+                       load_cycles, percentile, run_inprocess, summarize)
+
+pytestmark = pytest.mark.skipif(not os.path.exists(DATA_PATH), reason='dataset not available')
+
+
+@pytest.fixture(scope='module')
+def cycles():
+    return load_cycles()
+
+
+def test_cycles_carry_profile_and_history(cycles):
+    assert len(cycles) > 1000
+    for cycle in cycles:
+        assert isinstance(cycle['Age'], (int, float)) and isinstance(cycle['BMI'], (int, float))
+        assert 1 <= len(cycle['history']) <= 6 and cycle['history'][-1] == cycle['LengthofCycle']
+
+
+def test_payloads_are_reproducible(cycles):
+    first = PayloadGenerator(cycles, seed=3).bodies('/predict/dashboard', 5)
+    assert first == PayloadGenerator(cycles, seed=3).bodies('/predict/dashboard', 5)
+    batch = PayloadGenerator(cycles, batch_size=7).payload('/predict/symptoms/batch')
+    assert len(batch['items']) == 7
+
+
+def test_summary_percentiles_and_errors():
+    latencies = [i / 1000 for i in range(1, 101)]
+    summary = summarize(latencies, [200] * 98 + [500, 'connection_error'], elapsed=2.0)
+    assert summary['latency_ms']['p50'] == 50 and summary['latency_ms']['p99'] == 99
+    assert summary['errors'] == 2 and summary['error_rate'] == 0.02
+    assert summary['throughput_rps'] == 50
+    assert percentile([5], 99) == 5
+
+
+def test_every_route_answers_generated_payloads(cycles):
+    app_module = pytest.importorskip('app')
+    if not all(name in app_module.models for name in app_module.models.files):
+        pytest.skip('models not available')
+    generator = PayloadGenerator(cycles, batch_size=5)
+    for route in SINGLE_ROUTES + BATCH_ROUTES:
+        summary = run_inprocess(route, generator.bodies(route, 4), concurrency=2)
+        assert summary['requests'] == 4 and summary['error_rate'] == 0, route
+
+
+def test_compare_reports(tmp_path):
+    def report(commit, p50, rps):
+        return {'meta': {'commit': commit},
+                'endpoints': {'/x': {'throughput_rps': rps, 'error_rate': 0.0,
+                                     'latency_ms': {'p50': p50, 'p95': p50, 'p99': p50}}}}
+    paths = []
+    for name, data in (('a', report('aaaa', 2.0, 100)), ('b', report('bbbb', 1.0, 150))):
+        paths.append(str(tmp_path / f'{name}.json'))
+        with open(paths[-1], 'w') as f:
+            json.dump(data, f)
+    lines = compare(*paths)
+    assert 'rps +50.0%' in lines[1] and 'p50 2.00->1.00 ms (-50.0%)' in lines[1]
@@ -0,0 +1,62 @@
+# test_forecast.py
+# Run with: python -m pytest test_forecast.py
+
+from datetime import date
+
+import numpy as np
+import pytest
+
+from predictions import POPULATION_CYCLE_SD, cycle_length_sd, simulate_period_starts
+from user_stats import RunningStats
+
+
+def test_simulated_paths():
+    tree_values = np.array([27.0, 28.0, 29.0, 30.0])
+    starts = simulate_period_starts(tree_values, 2.0, days_elapsed=5, horizon=6)
+    assert starts.shape == (4000, 6)
+    assert (np.diff(starts, axis=1) >= 15).all() and (starts[:, 0] >= 6).all()
+    # Uncertainty grows with every cycle ahead
+    spread = np.percentile(starts, 90, axis=0) - np.percentile(starts, 10, axis=0)
+    assert (np.diff(spread) > 0).all()
+    assert abs(np.median(starts[:, 5]) - 6 * 28.5) < 1
+    # Overdue: the current cycle ends tomorrow at the earliest
+    assert (simulate_period_starts(tree_values, 2.0, days_elapsed=40, horizon=2)[:, 0] >= 41).all()
+
+
+def test_cycle_length_sd_shrinks_toward_population():
+    assert cycle_length_sd(RunningStats()) == cycle_length_sd(RunningStats.of([29])) == POPULATION_CYCLE_SD
+    regular = [cycle_length_sd(RunningStats.of([28] * n)) for n in (2, 4, 12)]
+    assert regular == sorted(regular, reverse=True) and regular[-1] < 1.5
+    assert cycle_length_sd(RunningStats.of([22, 35, 26, 40, 24, 33])) > POPULATION_CYCLE_SD
+
+
+def test_forecast_route():
+    app_module = pytest.importorskip('app')
+    if 'cycle_length' not in app_module.models:
+        pytest.skip('models not available')
+    client = app_module.app.test_client()
+    payload = {'LengthofMenses': 5, 'Age': 31, 'EstimatedDayofOvulation': 15, 'LengthofLutealPhase': 13,
+               'recent_cycle_lengths': [27, 29, 31, 28], 'horizon': 4,
+               'last_period_start': '2026-10-08', 'today': '2026-10-17'}
+
+    response = client.post('/predict/next-period/forecast', json=payload)
+    assert response.status_code == 200
+    forecast = response.get_json()
+    assert forecast == client.post('/predict/next-period/forecast', json=payload).get_json()
+    periods = forecast['periods']
+    assert [period['cycle'] for period in periods] == [1, 2, 3, 4]
+    for period in periods:
+        dates = [date.fromisoformat(period['dates'][q]) for q in ('p10', 'p50', 'p90')]
+        assert dates == sorted(dates) and period['start_date'] == period['dates']['p50']
+        assert (dates[1] - date(2026, 10, 17)).days == period['days_until']
+    assert [period['days_until'] for period in periods] == sorted(period['days_until'] for period in periods)
+
+    # Without last_period_start the current cycle day places the last period
+    without_start = dict(payload, current_cycle_day=10)
+    del without_start['last_period_start']
+    assert client.post('/predict/next-period/forecast', json=without_start).get_json() == forecast
+
+    response = client.post('/predict/next-period/forecast', json=dict(payload, last_period_start='2026-10-18'))
+    assert response.status_code == 400
+    response = client.post('/predict/next-period/forecast', json=dict(payload, horizon=13, today='17/10/2026'))
+    assert response.status_code == 400 and len(response.get_json()['details']) == 2
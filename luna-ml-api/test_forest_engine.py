@@ -0,0 +1,146 @@
+# test_forest_engine.py
+# Parity checks between forest_engine.CompiledForest and scikit-learn.
+# Run with: python -m pytest test_forest_engine.py
+
+import numpy as np
+import pytest
+from sklearn.ensemble import ExtraTreesRegressor, RandomForestClassifier, RandomForestRegressor
+from sklearn.multioutput import MultiOutputRegressor
+
+import forest_engine
+from forest_engine import CompiledForest, compile_model
+
+
+@pytest.fixture(autouse=True)
+def numpy_walk(monkeypatch):
+    # Keep every batch on the flat-array walk so parity is tested there
+    monkeypatch.setattr(forest_engine, 'ESTIMATOR_MIN_ROWS', 10 ** 9)
+
+
+def make_data(n_rows=400, n_features=6, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n_rows, n_features)).astype(np.float32)
+    # A few discrete columns, like the app's integer-valued features
+    X[:, 0] = rng.integers(20, 40, size=n_rows)
+    y = X[:, 0] + 3 * X[:, 1] - X[:, 2] ** 2 + rng.normal(scale=0.5, size=n_rows)
+    return X, y
+
+
+def query_rows(X, seed=1):
+    rng = np.random.default_rng(seed)
+    # Training rows hit thresholds exactly; fresh rows cover everything else
+    fresh = rng.normal(scale=2, size=(200, X.shape[1])).astype(np.float32)
+    return np.vstack([X, fresh])
+
+
+@pytest.mark.parametrize('estimator', [
+    RandomForestRegressor(n_estimators=30, random_state=0),
+    RandomForestRegressor(n_estimators=20, max_depth=5, random_state=0),
+    ExtraTreesRegressor(n_estimators=20, random_state=0),
+])
+def test_regressor_matches_sklearn(estimator):
+    X, y = make_data()
+    estimator.fit(X, y)
+    engine = CompiledForest.from_estimator(estimator)
+    Q = query_rows(X)
+    np.testing.assert_array_equal(engine.predict(Q), estimator.predict(Q))
+
+
+def test_multi_output_forest_matches_sklearn():
+    X, y = make_data()
+    Y = np.column_stack([y, -y, X[:, 3]])
+    forest = RandomForestRegressor(n_estimators=15, random_state=0).fit(X, Y)
+    engine = CompiledForest.from_estimator(forest)
+    Q = query_rows(X)
+    np.testing.assert_array_equal(engine.predict(Q), forest.predict(Q))
+
+
+@pytest.mark.parametrize('labels', [[0, 1], ['Regular', 'Irregular', 'Unknown']])
+def test_classifier_matches_sklearn(labels):
+    X, y = make_data()
+    classes = np.array(labels)[np.digitize(y, np.quantile(y, np.linspace(0, 1, len(labels) + 1)[1:-1]))]
+    clf = RandomForestClassifier(n_estimators=40, max_depth=8, random_state=0).fit(X, classes)
+    engine = CompiledForest.from_estimator(clf)
+    Q = query_rows(X)
+    np.testing.assert_array_equal(engine.predict_proba(Q), clf.predict_proba(Q))
+    np.testing.assert_array_equal(engine.predict(Q), clf.predict(Q))
+    assert list(engine.classes_) == list(clf.classes_)
+
+
+@pytest.mark.parametrize('wrapped', [True, False], ids=['per-output-forests', 'native'])
+def test_multi_output_regressor_matches_sklearn(wrapped):
+    X, y = make_data()
+    Y = np.column_stack([y, y ** 2, X[:, 4], -y, X[:, 5] * 2])
+    model = RandomForestRegressor(n_estimators=10, max_depth=6, random_state=0)
+    if wrapped:
+        model = MultiOutputRegressor(model)
+    model.fit(X, Y)
+    engine = CompiledForest.from_estimator(model)
+    Q = query_rows(X)
+    np.testing.assert_array_equal(engine.predict(Q), model.predict(Q))
+    assert engine.n_estimators == (50 if wrapped else 10)
+
+
+def test_single_row_and_batches_agree():
+    X, y = make_data(n_rows=3000)
+    forest = RandomForestRegressor(n_estimators=10, random_state=0).fit(X, y)
+    engine = CompiledForest.from_estimator(forest)
+    batch = engine.predict(X)
+    np.testing.assert_array_equal(batch, forest.predict(X))
+    np.testing.assert_array_equal([engine.predict(row[np.newaxis])[0] for row in X[:50]], batch[:50])
+
+
+def test_large_batches_use_the_source_estimator(monkeypatch):
+    X, y = make_data()
+    clf = RandomForestClassifier(n_estimators=10, random_state=0).fit(X, y > 25)
+    engine = CompiledForest.from_estimator(clf)
+    monkeypatch.setattr(forest_engine, 'ESTIMATOR_MIN_ROWS', 100)
+    walked = engine.predict_proba(X[:99])
+    handed_off = engine.predict_proba(X[:100])
+    np.testing.assert_array_equal(handed_off[:99], walked)
+    np.testing.assert_array_equal(handed_off, clf.predict_proba(X[:100]))
+
+
+def test_per_tree_outputs_match_estimators():
+    X, y = make_data()
+    forest = RandomForestRegressor(n_estimators=8, random_state=0).fit(X, y)
+    engine = CompiledForest.from_estimator(forest)
+    per_tree = engine.predict_trees(X[:20])[:, :, 0]
+    expected = np.column_stack([tree.predict(X[:20]) for tree in forest.estimators_])
+    np.testing.assert_array_equal(per_tree, expected)
+
+
+def test_feature_names_and_shape_check():
+    X, y = make_data()
+    import pandas as pd
+    frame = pd.DataFrame(X, columns=[f'f{i}' for i in range(X.shape[1])])
+    forest = RandomForestRegressor(n_estimators=5, random_state=0).fit(frame, y)
+    engine = CompiledForest.from_estimator(forest)
+    assert list(engine.feature_names_in_) == list(frame.columns)
+    with pytest.raises(ValueError):
+        engine.predict(X[:, :3])
+
+
+def test_unsupported_models_are_left_alone():
+    from sklearn.linear_model import LinearRegression
+    X, y = make_data()
+    linear = LinearRegression().fit(X, y)
+    with pytest.raises(TypeError):
+        CompiledForest.from_estimator(linear)
+    assert compile_model(linear) is linear
+
+
+def test_split_bins_are_an_exact_canonical_form():
+    X, y = make_data()
+    forest = RandomForestRegressor(n_estimators=10, random_state=0).fit(X, y)
+    engine = CompiledForest.from_estimator(forest)
+    Q = query_rows(X)
+    bins = engine.split_bins(Q)
+    np.testing.assert_array_equal(np.vstack([engine.split_bins(row[np.newaxis]) for row in Q[:40]]),
+                                  bins[:40])
+    # Nudging a value inside its split interval changes neither bins nor prediction
+    nudged = Q.copy()
+    nudged[:, 1] = np.nextafter(nudged[:, 1], np.float32(np.inf))
+    same = (engine.split_bins(nudged) == bins).all(axis=1)
+    assert same.any()
+    np.testing.assert_array_equal(engine.predict(nudged[same]), engine.predict(Q[same]))
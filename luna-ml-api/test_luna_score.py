@@ -0,0 +1,73 @@
+# test_luna_score.py
+# Run with: python -m pytest test_luna_score.py
+
+import csv
+import json
+import os
+
+import pytest
+
+import luna_score
+from luna_score import build_parser, init_worker, score_file
+
+
+@pytest.fixture
+def client():
+    app_module = pytest.importorskip('app')
+    if 'irregular_cycle' not in app_module.models:
+        pytest.skip('models not available')
+    return app_module.app.test_client()
+
+
+def test_scores_like_the_batch_route(client, tmp_path):
+    rows = [{'user_id': f'u{i}', 'recent_cycle_lengths': json.dumps([26 + i, 30, 29 + i % 3]),
+             'unusual_bleeding': i % 2, 'age': 20 + i, 'bmi': '' if i % 4 else 23.5} for i in range(9)]
+    rows[5]['age'] = 'unknown'      # fails the schema
+    with open(tmp_path / 'users.csv', 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    # Empty cells keep the defaults, as a missing field does in a request
+    items = [{key: json.loads(value) if key == 'recent_cycle_lengths' else value
+              for key, value in row.items() if key != 'user_id' and value != ''} for row in rows]
+    expected = client.post('/detect/irregular-cycle/batch', json=items).get_json()['results']
+    assert 'error' in expected[5] and 'error' not in expected[4]
+
+    report = score_file('/detect/irregular-cycle', str(tmp_path / 'users.csv'), str(tmp_path / 'out.ndjson'),
+                        workers=2, chunk_rows=2, id_column='user_id', progress=None)
+    assert report['rows'] == 9 and report['errors'] == 1
+    with open(tmp_path / 'out.ndjson') as f:
+        results = [json.loads(line) for line in f]
+    assert [result.pop('user_id') for result in results] == [row['user_id'] for row in rows]
+    assert results == expected
+
+    score_file('/detect/irregular-cycle', str(tmp_path / 'users.csv'), str(tmp_path / 'out.csv'),
+               workers=1, chunk_rows=4, progress=None)
+    with open(tmp_path / 'out.csv') as f:
+        table = list(csv.DictReader(f))
+    assert len(table) == 9 and table[5]['error'] and not table[5]['risk_level']
+    assert [float(row['irregular_probability']) for row in table if not row['error']] == \
+        [result['irregular_probability'] for result in expected if 'error' not in result]
+    assert json.loads(table[1]['warnings']) == expected[1]['warnings']
+
+
+def test_every_route_the_cli_offers_gets_a_worker(monkeypatch):
+    # init_worker sets these for its process; put them back afterwards
+    for name in ('MODEL_WARMUP', 'MODEL_RELOAD_INTERVAL', 'PREDICTION_CACHE_SIZE'):
+        if name in os.environ:
+            monkeypatch.setenv(name, os.environ[name])
+        else:
+            monkeypatch.delenv(name, raising=False)
+    import predictions
+    route_action = next(action for action in build_parser()._actions if action.dest == 'route')
+    assert '/predict/dashboard' not in route_action.choices
+    for path in route_action.choices:
+        luna_score._worker.clear()
+        init_worker(path, None)
+        # A missing model is reported with the first chunk; anything else is a broken worker
+        if predictions.PREDICTION_ROUTES[path].model_name in predictions.models:
+            assert luna_score._worker['error'] is None
+            assert luna_score._worker['route'] is predictions.PREDICTION_ROUTES[path]
+        else:
+            assert 'not loaded' in luna_score._worker['error']
@@ -0,0 +1,110 @@
+# test_metrics.py
+# Run with: python -m pytest test_metrics.py
+
+import time
+
+import pytest
+
+from metrics import Histogram, Metrics
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram('latency', 'Latency', ('endpoint',), buckets=(0.001, 0.01))
+    for value in (0.0005, 0.001, 0.005, 0.5):
+        histogram.observe(('/a',), value)
+    samples = {(name, labels): value for name, labels, value in histogram.samples()}
+    assert samples['latency_bucket', ('/a', '0.001')] == 2
+    assert samples['latency_bucket', ('/a', '0.01')] == 3
+    assert samples['latency_bucket', ('/a', '+Inf')] == 4
+    assert samples['latency_count', ('/a',)] == 4
+    assert samples['latency_sum', ('/a',)] == pytest.approx(0.5065)
+
+
+def test_requests_errors_and_stages_render():
+    metrics = Metrics(prefix='test')
+    timer = metrics.start('/predict/x')
+    assert metrics.in_flight.value(('/predict/x',)) == 1
+    for stage in ('parse', 'features', 'inference', 'serialize'):
+        timer.mark(stage)
+    timer.finish(200)
+    metrics.start('/predict/x').finish(500)
+    metrics.collector(lambda: [('model_loaded', 'gauge', 'Loaded', ('model',), [(('a"b',), 1)])])
+
+    text = metrics.render()
+    assert 'test_requests_total{endpoint="/predict/x",status="200"} 1' in text
+    assert 'test_request_errors_total{endpoint="/predict/x",status="500"} 1' in text
+    assert 'test_requests_in_flight{endpoint="/predict/x"} 0' in text
+    assert 'test_request_stage_duration_seconds_count{endpoint="/predict/x",stage="inference"} 1' in text
+    assert 'test_request_duration_seconds_bucket{endpoint="/predict/x",le="+Inf"} 2' in text
+    assert 'test_model_loaded{model="a\\"b"} 1' in text
+    assert '# TYPE test_request_duration_seconds histogram' in text
+
+
+def test_recording_is_cheap():
+    metrics = Metrics()
+    n = 20000
+    start = time.perf_counter()
+    for _ in range(n):
+        timer = metrics.start('/predict/x')
+        for stage in ('parse', 'features', 'inference', 'serialize'):
+            timer.mark(stage)
+        timer.finish(200)
+    # A few microseconds per request; generous bound for slow CI machines
+    assert (time.perf_counter() - start) / n < 50e-6
+
+
+def test_flask_requests_are_counted_by_stage():
+    app_module = pytest.importorskip('app')
+    if 'cycle_length' not in app_module.models:
+        pytest.skip('models not available')
+    client = app_module.app.test_client()
+    client.post('/predict/cycle-length', json={'Age': 30})
+    client.post('/predict/cycle-length', json={'Age': 'not a number'})
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain')
+    text = response.get_data(as_text=True)
+    assert 'luna_requests_total{endpoint="/predict/cycle-length",status="200"}' in text
+    assert 'luna_request_errors_total{endpoint="/predict/cycle-length",status="400"}' in text
+    for stage in ('parse', 'features', 'inference', 'serialize'):
+        assert f'endpoint="/predict/cycle-length",stage="{stage}"' in text
+    assert 'luna_model_load_seconds{model="cycle_length"' in text
+
+
+def test_identical_concurrent_requests_share_one_model_call(monkeypatch):
+    import threading
+    app_module = pytest.importorskip('app')
+    if 'symptom_predictor' not in app_module.models:
+        pytest.skip('models not available')
+    route = app_module.PREDICTION_ROUTES['/predict/symptoms']
+    calls = []
+
+    def slow_predict(model, features):
+        calls.append(len(features))
+        time.sleep(0.2)
+        return route.predict(model, features)
+
+    monkeypatch.setitem(app_module.PREDICTION_ROUTES, '/predict/symptoms', route._replace(predict=slow_predict))
+    # All six in flight at once, past the default admission limit
+    monkeypatch.setattr(app_module.predictions, 'admission', None)
+    flight = app_module.predictions.singleflights['symptom_predictor']
+    before = flight.stats()
+    client = app_module.app.test_client()
+    # Same canonical features: the default profile, spelled three ways
+    payloads = [{'cycle_day': 9}, {'cycle_day': 9, 'age': 25, 'bmi': 25.0}, {'cycle_day': '9', 'cycle_length': 28}] * 2
+    responses = [None] * len(payloads)
+
+    def post(i):
+        responses[i] = client.post('/predict/symptoms', json=payloads[i]).get_json()
+    threads = [threading.Thread(target=post, args=(i,)) for i in range(len(payloads))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [1] and all(response == responses[0] for response in responses)
+    after = flight.stats()
+    assert after['unique'] - before['unique'] == 1 and after['coalesced'] - before['coalesced'] == 5
+    assert 'luna_singleflight_requests_total{model="symptom_predictor",result="coalesced"}' in \
+        client.get('/metrics').get_data(as_text=True)
@@ -0,0 +1,106 @@
+# test_model_bundle.py
+# Run with: python -m pytest test_model_bundle.py
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from sklearn.multioutput import MultiOutputRegressor
+
+from forest_engine import CompiledForest
+from model_bundle import MAGIC, load_bundle, read_header, training_metadata, write_bundle
+
+
+def make_data(seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(300, 5)).astype(np.float32)
+    X[:, 0] = rng.integers(20, 40, size=300)
+    return X, X[:, 0] + 3 * X[:, 1] - X[:, 2] ** 2
+
+
+def write(tmp_path, estimator, name='model.bundle'):
+    path = str(tmp_path / name)
+    write_bundle(path, CompiledForest.from_estimator(estimator), 'abc123',
+                 training_metadata(estimator), {'file': 'model.pkl'})
+    return path
+
+
+@pytest.mark.parametrize('make_model', [
+    lambda X, y: RandomForestRegressor(n_estimators=15, random_state=0).fit(X, y),
+    lambda X, y: RandomForestClassifier(n_estimators=15, random_state=0).fit(
+        X, np.where(y > np.median(y), 'Irregular', 'Regular')),
+    lambda X, y: MultiOutputRegressor(RandomForestRegressor(n_estimators=5, random_state=0)).fit(
+        X, np.column_stack([y, -y, X[:, 3]])),
+])
+def test_bundle_round_trip_matches_sklearn(tmp_path, make_model):
+    X, y = make_data()
+    estimator = make_model(X, y)
+    forest = load_bundle(write(tmp_path, estimator))
+    np.testing.assert_array_equal(forest.predict(X), estimator.predict(X))
+    if hasattr(estimator, 'predict_proba'):
+        np.testing.assert_array_equal(forest.predict_proba(X), estimator.predict_proba(X))
+        assert list(forest.classes_) == list(estimator.classes_)
+    assert not forest.value.flags.writeable and forest.mapped_nbytes > 0
+
+
+def test_header_records_features_version_and_training(tmp_path):
+    X, y = make_data()
+    frame = pd.DataFrame(X, columns=[f'f{i}' for i in range(X.shape[1])])
+    estimator = RandomForestRegressor(n_estimators=5, max_depth=4, random_state=0).fit(frame, y)
+    header = read_header(write(tmp_path, estimator))
+    assert header['feature_names'] == list(frame.columns)
+    assert header['input_dtype'] == '<f4' and header['model_version'] == 'abc123'
+    assert header['training']['estimator'] == 'RandomForestRegressor'
+    assert header['training']['params']['max_depth'] == 4
+    assert header['data_offset'] % 64 == 0
+    assert list(load_bundle(str(tmp_path / 'model.bundle')).feature_names_in_) == list(frame.columns)
+
+
+def test_corruption_is_detected(tmp_path):
+    X, y = make_data()
+    path = write(tmp_path, RandomForestRegressor(n_estimators=5, random_state=0).fit(X, y))
+    data = bytearray(open(path, 'rb').read())
+    data[-100] ^= 0xFF
+    open(path, 'wb').write(bytes(data))
+    with pytest.raises(ValueError, match='checksum'):
+        load_bundle(path)
+    load_bundle(path, verify=False)
+
+    # A truncated file fails the bounds check even without the checksum
+    open(path, 'wb').write(bytes(data[:len(data) // 2]))
+    with pytest.raises(ValueError, match='does not fit'):
+        load_bundle(path, verify=False)
+
+
+def test_rejects_other_files_and_versions(tmp_path):
+    other = tmp_path / 'model.pkl'
+    other.write_bytes(b'not a bundle')
+    with pytest.raises(ValueError, match='not a model bundle'):
+        load_bundle(str(other))
+
+    X, y = make_data()
+    path = write(tmp_path, RandomForestRegressor(n_estimators=3, random_state=0).fit(X, y))
+    data = open(path, 'rb').read()
+    size = int.from_bytes(data[len(MAGIC):len(MAGIC) + 4], 'little')
+    start = len(MAGIC) + 4
+    header = json.loads(data[start:start + size])
+    header['format_version'] = 2
+    # Same length, so the rest of the file stays where the header says
+    encoded = json.dumps(header, separators=(',', ':')).encode()
+    assert len(encoded) == size
+    open(path, 'wb').write(data[:start] + encoded + data[start + size:])
+    with pytest.raises(ValueError, match='format 2'):
+        load_bundle(path)
+
+
+def test_firebase_function_copies_are_current():
+    import os
+    import subprocess
+    import sys
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'luna-app', 'functions', 'sync_shared.py')
+    if not os.path.exists(script):
+        pytest.skip('luna-app not checked out')
+    result = subprocess.run([sys.executable, script, '--check'], capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout
@@ -0,0 +1,87 @@
+# test_model_registry.py
+# Run with: python -m pytest test_model_registry.py
+
+import os
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+
+import forest_engine
+from model_bundle import bundle_path, export
+from model_registry import ModelRegistry
+
+
+@pytest.fixture
+def model_file(tmp_path):
+    rng = np.random.default_rng(0)
+    X = rng.integers(1, 45, size=(300, 4)).astype(np.float32)
+    forest = RandomForestRegressor(n_estimators=10, random_state=0).fit(X, X[:, 0] - X[:, 1])
+    path = str(tmp_path / 'forest.pkl')
+    joblib.dump(forest, path)
+    return path, forest, X
+
+
+def test_models_load_on_first_access(model_file):
+    path, forest, X = model_file
+    prepared = []
+    registry = ModelRegistry({'forest': path, 'absent': path + '.missing'},
+                             prepare=lambda name, model, version: prepared.append(name) or model)
+    assert len(registry) == 0 and 'forest' in registry and 'absent' not in registry
+    np.testing.assert_array_equal(registry['forest'].predict(X), forest.predict(X))
+    registry['forest']
+    assert prepared == ['forest']
+    assert registry.stats()['forest']['source'] == 'pickle'
+    assert registry.stats()['absent'] == 'missing'
+
+
+def test_bundle_is_memory_mapped(model_file, monkeypatch):
+    path, forest, X = model_file
+    export(path)
+    registry = ModelRegistry({'forest': path})
+    model = registry['forest']
+    assert registry.stats()['forest']['source'] == 'bundle'
+    assert model.mapped_nbytes > 0 and not model.value.flags.writeable
+    assert model._estimator is None
+    np.testing.assert_array_equal(model.predict(X[:5]), forest.predict(X[:5]))
+    # Large batches load the source estimator on demand
+    monkeypatch.setattr(forest_engine, 'ESTIMATOR_MIN_ROWS', 100)
+    np.testing.assert_array_equal(model.predict(X), forest.predict(X))
+    assert model._estimator is not None
+
+
+def test_stale_bundle_falls_back_to_the_pickle(model_file):
+    path, forest, X = model_file
+    export(path)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    registry = ModelRegistry({'forest': path})
+    np.testing.assert_array_equal(registry['forest'].predict(X), forest.predict(X))
+    assert registry.stats()['forest']['source'] == 'pickle'
+    assert os.path.exists(bundle_path(path))
+
+
+def test_bundle_alone_is_served_without_the_pickle(model_file, monkeypatch):
+    path, forest, X = model_file
+    export(path)
+    os.remove(path)
+    registry = ModelRegistry({'forest': path})
+    assert 'forest' in registry
+    model = registry['forest']
+    assert registry.stats()['forest']['source'] == 'bundle'
+    # No source estimator to hand large batches to, so they stay on the engine
+    monkeypatch.setattr(forest_engine, 'ESTIMATOR_MIN_ROWS', 100)
+    np.testing.assert_array_equal(model.predict(X), forest.predict(X))
+    assert model.estimator is None
+
+
+def test_warmup_loads_in_the_background(model_file):
+    path, _, _ = model_file
+    warmed = []
+    registry = ModelRegistry({'forest': path}, warm=lambda name, model: warmed.append(name))
+    assert not registry.ready.is_set()
+    registry.warmup(['forest', 'unknown']).join(timeout=30)
+    assert registry.keys() == ['forest']
+    assert registry.ready.is_set() and warmed == ['forest']
+    assert 'warm_ms' in registry.stats()['forest']
@@ -0,0 +1,164 @@
+# test_model_store.py
+# Run with: python -m pytest test_model_store.py
+
+import json
+import os
+import threading
+import time
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+
+from model_bundle import export
+from model_registry import ModelRegistry
+from model_store import ModelStore
+
+
+@pytest.fixture
+def versions(tmp_path):
+    """Two versions of the same model: (pickle path, fitted forest) each"""
+    rng = np.random.default_rng(0)
+    X = rng.integers(1, 45, size=(300, 4)).astype(np.float32)
+    pickles = []
+    for seed, target in ((0, X[:, 0] - X[:, 1]), (1, X[:, 2] * 2)):
+        forest = RandomForestRegressor(n_estimators=10, random_state=seed).fit(X, target)
+        path = str(tmp_path / f'forest-{seed}.pkl')
+        joblib.dump(forest, path)
+        pickles.append((path, forest))
+    return pickles, X
+
+
+def test_publish_stores_by_version_and_activates(tmp_path, versions):
+    ((old_path, _), (new_path, _)), _ = versions
+    store = ModelStore(str(tmp_path / 'store'))
+    assert store.read_manifest() == {} and store.manifest_stamp() is None
+
+    old = store.publish('forest', old_path)
+    # A bundle already exported next to the pickle is stored as-is
+    new = store.publish('forest', export(new_path), activate=False)
+    assert old != new
+    assert sorted(os.listdir(store.objects)) == sorted([f'{old}.bundle', f'{new}.bundle'])
+    assert store.active('forest') == old
+
+    store.activate('forest', new)
+    with open(store.manifest_path) as f:
+        assert json.load(f)['models'] == {'forest': new}
+    with pytest.raises(KeyError):
+        store.activate('forest', 'not-a-version')
+
+
+def test_reload_swaps_in_the_active_version(tmp_path, versions):
+    ((old_path, old_forest), (new_path, new_forest)), X = versions
+    store = ModelStore(str(tmp_path / 'store'))
+    store.publish('forest', old_path)
+    warmed = []
+    registry = ModelRegistry({'forest': old_path}, store=store,
+                             warm=lambda name, model: warmed.append(name))
+    in_flight = registry['forest']
+    assert registry.stats()['forest']['source'] == 'store'
+    assert registry.reload() == {}
+
+    new = store.publish('forest', new_path)
+    assert registry.reload() == {'forest': new}
+    assert registry.versions['forest'] == new and registry.reloads == 1
+    assert warmed == ['forest', 'forest']
+    np.testing.assert_array_equal(registry['forest'].predict(X), new_forest.predict(X))
+    # A request that fetched the model before the swap finishes on the old version
+    np.testing.assert_array_equal(in_flight.predict(X), old_forest.predict(X))
+
+
+def test_failed_reload_keeps_the_old_version(tmp_path, versions):
+    ((old_path, old_forest), (new_path, _)), X = versions
+    store = ModelStore(str(tmp_path / 'store'))
+    old = store.publish('forest', old_path)
+    registry = ModelRegistry({'forest': old_path}, store=store)
+    registry['forest']
+
+    new = store.publish('forest', new_path)
+    with open(store.object_path(new), 'r+b') as f:
+        f.seek(-8, os.SEEK_END)
+        f.write(b'corrupt!')
+    assert registry.reload() == {}
+    assert registry.versions['forest'] == old
+    assert registry.reload_errors['forest']['version'] == new
+    assert 'forest' in registry and 'forest' not in registry.errors
+    np.testing.assert_array_equal(registry['forest'].predict(X), old_forest.predict(X))
+
+
+def test_watcher_picks_up_a_new_manifest_without_blocking_requests(tmp_path, versions):
+    ((old_path, _), (new_path, new_forest)), X = versions
+    store = ModelStore(str(tmp_path / 'store'))
+    store.publish('forest', old_path)
+    registry = ModelRegistry({'forest': old_path}, store=store)
+    registry['forest']
+    registry.watch(0.01)
+
+    failures = []
+    stop = threading.Event()
+
+    def serve():
+        while not stop.is_set():
+            try:
+                registry['forest'].predict(X[:1])
+            except Exception as e:
+                failures.append(e)
+
+    requests = threading.Thread(target=serve)
+    requests.start()
+    try:
+        new = store.publish('forest', new_path)
+        deadline = time.monotonic() + 30
+        while registry.versions['forest'] != new and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        stop.set()
+        requests.join()
+        registry.close()
+    assert registry.versions['forest'] == new
+    assert failures == []
+    np.testing.assert_array_equal(registry['forest'].predict(X), new_forest.predict(X))
+
+
+def test_watcher_retries_a_version_that_failed_to_load(tmp_path, versions):
+    ((old_path, _), (new_path, new_forest)), X = versions
+    store = ModelStore(str(tmp_path / 'store'))
+    old = store.publish('forest', old_path)
+    registry = ModelRegistry({'forest': old_path}, store=store)
+    registry['forest']
+
+    # Published while its object is still half written
+    new = store.publish('forest', new_path)
+    with open(store.object_path(new), 'r+b') as f:
+        intact = f.read()
+        f.seek(-8, os.SEEK_END)
+        f.write(b'corrupt!')
+    registry.watch(0.01)
+    try:
+        deadline = time.monotonic() + 30
+        while 'forest' not in registry.reload_errors and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert registry.versions['forest'] == old
+        # The upload completes; the manifest does not change again
+        with open(store.object_path(new), 'wb') as f:
+            f.write(intact)
+        while registry.versions['forest'] != new and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        registry.close()
+    assert registry.versions['forest'] == new and registry.reload_errors == {}
+    np.testing.assert_array_equal(registry['forest'].predict(X), new_forest.predict(X))
+
+
+def test_admin_reload_needs_the_token(monkeypatch):
+    app_module = pytest.importorskip('app')
+    client = app_module.app.test_client()
+    monkeypatch.setattr(app_module, 'ADMIN_TOKEN', '')
+    assert client.post('/admin/models/reload').status_code == 404
+
+    monkeypatch.setattr(app_module, 'ADMIN_TOKEN', 'secret')
+    assert client.post('/admin/models/reload').status_code == 401
+    response = client.post('/admin/models/reload', headers={'Authorization': 'Bearer secret'})
+    assert response.status_code == 200
+    assert response.get_json()['swapped'] == {}
@@ -0,0 +1,104 @@
+# test_payloads.py
+# Run with: python -m pytest test_payloads.py
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+from payloads import SCHEMAS, PayloadError, dumps, loads
+
+
+def test_schema_coerces_types():
+    data = SCHEMAS['/predict/symptoms'].validate(
+        {'cycle_day': '3', 'cycle_length': 29.0, 'age': '31.5', 'bmi': None, 'note': 'kept'})
+    assert data == {'cycle_day': 3, 'cycle_length': 29.0, 'age': 31.5, 'note': 'kept'}
+    assert isinstance(data['cycle_day'], int)
+    # The app sends fractional days; each is the day it falls in
+    assert SCHEMAS['/predict/next-period'].validate({'current_cycle_day': 12.7}) == {'current_cycle_day': 12}
+    assert SCHEMAS['/predict/symptoms'].validate({'cycle_day': '1.5'})['cycle_day'] == 1
+
+    data = SCHEMAS['/detect/irregular-cycle'].validate(
+        {'recent_cycle_lengths': [28, '30'], 'unusual_bleeding': True, 'cycle_with_peak': 0.0})
+    assert data == {'recent_cycle_lengths': [28, 30.0], 'unusual_bleeding': 1, 'cycle_with_peak': 0}
+
+
+def test_schema_lists_every_problem():
+    with pytest.raises(PayloadError) as raised:
+        SCHEMAS['/predict/dashboard'].validate({
+            'age': 'not a number', 'bmi': 500, 'current_cycle_day': 0.5,
+            'unusual_bleeding': 2, 'recent_cycle_lengths': 28, 'mean_cycle_length': 10 ** 400})
+    assert [error.split(':')[0] for error in raised.value.errors] == [
+        'recent_cycle_lengths', 'unusual_bleeding', 'age', 'bmi', 'current_cycle_day', 'mean_cycle_length']
+    for body in (b'', b'{not json', b'[1, 2]', b'{"Age": NaN}'):
+        with pytest.raises(PayloadError):
+            SCHEMAS['/predict/cycle-length'].validate(loads(body))
+
+
+def test_dumps_matches_jsonify():
+    payload = {'b': round(np.float64(8.6123), 1), 'a': [np.float32(0.5), np.int64(3), True, None],
+               'nested': {'z': 'Day 2 of your period', 'y': np.float64(28.0)}, 'n': np.array([1.5, 2])}
+    expected = json.dumps({'b': 8.6, 'a': [0.5, 3, True, None], 'nested': {'z': 'Day 2 of your period', 'y': 28.0},
+                           'n': [1.5, 2.0]}, sort_keys=True, separators=(',', ':')) + '\n'
+    assert dumps(payload) == expected.encode()
+
+
+def test_stdlib_codec_without_orjson():
+    import subprocess
+    import sys
+    script = ('import sys; sys.modules["orjson"] = None\n'
+              'import numpy as np, payloads\n'
+              'assert payloads.orjson is None\n'
+              'assert payloads.loads(b\'{"b": 1, "a": [2.5]}\') == {"a": [2.5], "b": 1}\n'
+              'print(payloads.dumps({"b": np.float64(8.6), "a": [np.int64(3)]}).decode(), end="")')
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True)
+    assert result.stdout == '{"a":[3],"b":8.6}\n'
+
+
+def test_generated_payloads_validate():
+    from benchmark import DATA_PATH, PayloadGenerator, load_cycles
+    if not os.path.exists(DATA_PATH):
+        pytest.skip('dataset not available')
+    generator = PayloadGenerator(load_cycles(), seed=1)
+    for path, schema in SCHEMAS.items():
+        for body in generator.bodies(path, 200):
+            schema.validate(loads(body))
+
+
+def test_routes_reject_bad_payloads_before_scoring(monkeypatch):
+    app_module = pytest.importorskip('app')
+    import predictions
+    if 'symptom_predictor' not in app_module.models:
+        pytest.skip('models not available')
+
+    def no_model_call(*args):
+        raise AssertionError('model called for an invalid payload')
+
+    monkeypatch.setattr(app_module, 'predict_first', no_model_call)
+    monkeypatch.setattr(predictions, 'predict_first', no_model_call)
+    client = app_module.app.test_client()
+    response = client.post('/predict/symptoms', json={'cycle_day': 0, 'age': 'x'})
+    assert response.status_code == 400
+    body = response.get_json()
+    assert len(body['details']) == 2 and body['overall_discomfort'] == 2
+    assert client.post('/predict/dashboard', data='{"age": ').status_code == 400
+
+    response = client.post('/predict/symptoms/batch', json=[{'cycle_day': 3}, {'cycle_day': -1}, 'x'])
+    results = response.get_json()['results']
+    assert response.status_code == 200 and response.get_json()['errors'] == 2
+    assert 'cramp_intensity' in results[0]
+    assert results[1]['error'].startswith('cycle_day:') and results[2]['error'] == 'Expected a JSON object'
+
+
+def test_routes_accept_the_apps_fractional_cycle_day():
+    app_module = pytest.importorskip('app')
+    if not all(name in app_module.models for name in ('cycle_length', 'symptom_predictor', 'irregular_cycle')):
+        pytest.skip('models not available')
+    client = app_module.app.test_client()
+    for path, field in (('/predict/next-period', 'current_cycle_day'), ('/predict/symptoms', 'cycle_day'),
+                        ('/predict/dashboard', 'current_cycle_day'),
+                        ('/predict/next-period/forecast', 'current_cycle_day')):
+        fractional = client.post(path, json={field: 2.5, 'today': '2026-10-17'})
+        assert fractional.status_code == 200, path
+        assert fractional.get_json() == client.post(path, json={field: 2, 'today': '2026-10-17'}).get_json()
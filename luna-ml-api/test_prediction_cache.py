@@ -0,0 +1,97 @@
+# test_prediction_cache.py
+# Run with: python -m pytest test_prediction_cache.py
+
+import threading
+import time
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+from forest_engine import CompiledForest
+from prediction_cache import CachedModel, PredictionCache, SingleFlight
+
+
+def make_data(seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.integers(1, 45, size=(300, 4)).astype(np.float32)
+    return X, X[:, 0] * 2 - X[:, 1]
+
+
+def test_lru_eviction_and_counters():
+    cache = PredictionCache(maxsize=2, ttl=60)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1          # 'b' is now least recently used
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions'], stats['size']) == (2, 1, 1, 2)
+
+
+def test_entries_expire_after_ttl():
+    cache = PredictionCache(maxsize=10, ttl=0.01)
+    cache.put('a', 1)
+    time.sleep(0.02)
+    assert cache.get('a') is None
+    assert cache.stats()['expirations'] == 1
+
+
+def test_cached_predictions_match_the_model():
+    X, y = make_data()
+    engine = CompiledForest.from_estimator(RandomForestRegressor(n_estimators=10, random_state=0).fit(X, y))
+    cached = CachedModel(engine, 'v1', PredictionCache(maxsize=1000))
+    np.testing.assert_array_equal(cached.predict(X[:50]), engine.predict(X[:50]))
+    # Second pass is served from the cache, mixed with new rows
+    np.testing.assert_array_equal(cached.predict(X[25:100]), engine.predict(X[25:100]))
+    assert cached.cache.hits >= 25
+    np.testing.assert_array_equal(cached.predict(X[7:8]), engine.predict(X[7:8]))
+
+
+def test_probabilities_and_delegated_attributes():
+    X, y = make_data()
+    engine = CompiledForest.from_estimator(
+        RandomForestClassifier(n_estimators=10, random_state=0).fit(X, y > 20))
+    cached = CachedModel(engine, 'v1', PredictionCache())
+    np.testing.assert_array_equal(cached.predict_proba(X), engine.predict_proba(X))
+    np.testing.assert_array_equal(cached.predict_proba(X), engine.predict_proba(X))
+    assert list(cached.classes_) == [False, True]
+
+
+def test_versions_do_not_share_entries():
+    X, y = make_data()
+    engine = CompiledForest.from_estimator(RandomForestRegressor(n_estimators=5, random_state=0).fit(X, y))
+    cache = PredictionCache()
+    CachedModel(engine, 'v1', cache).predict(X[:10])
+    CachedModel(engine, 'v2', cache).predict(X[:10])
+    assert cache.hits == 0 and cache.stats()['size'] == 20
+
+
+def test_singleflight_shares_one_computation():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return np.array([28.0])
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do('row', compute))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    while flight.coalesced < 7:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1 and len(results) == 8 and all(result is results[0] for result in results)
+    assert flight.stats() == {'unique': 1, 'coalesced': 7, 'in_flight': 0}
+
+    # Finished flights are forgotten, and a failure reaches every waiter
+    assert flight.do('row', lambda: 1) == 1 and flight.unique == 2
+    with pytest.raises(ZeroDivisionError):
+        flight.do('row', lambda: 1 / 0)
+    assert flight.stats()['in_flight'] == 0
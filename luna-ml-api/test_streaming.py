@@ -0,0 +1,55 @@
+# test_streaming.py
+# Run with: python -m pytest test_streaming.py
+
+import gzip
+import json
+
+import pytest
+
+
+@pytest.fixture
+def client(monkeypatch):
+    app_module = pytest.importorskip('app')
+    if 'symptom_predictor' not in app_module.models:
+        pytest.skip('models not available')
+    # Small chunks, so a short body crosses several of them
+    monkeypatch.setattr(app_module, 'STREAM_CHUNK_ROWS', 3)
+    return app_module.app.test_client()
+
+
+def payloads(n):
+    return [{'cycle_day': 1 + i % 35, 'cycle_length': 28 + i % 7, 'age': 20 + i % 25} for i in range(n)]
+
+
+def test_stream_matches_batch_line_for_line(client):
+    items = payloads(10)
+    lines = [json.dumps(item) for item in items]
+    lines[4] = '{"cycle_day": '                 # not JSON
+    lines[7] = json.dumps({'cycle_day': 0})     # out of bounds
+    body = '\n'.join(lines[:5]) + '\n\n' + '\n'.join(lines[5:])     # a blank line is skipped
+
+    response = client.post('/predict/symptoms/stream', data=body, content_type='application/x-ndjson')
+    assert response.status_code == 200 and response.mimetype == 'application/x-ndjson'
+    results = [json.loads(line) for line in response.get_data().splitlines()]
+
+    expected = client.post('/predict/symptoms/batch', json=items).get_json()['results']
+    assert len(results) == 10
+    assert results[4]['error'].startswith('Invalid JSON') and results[7]['error'].startswith('cycle_day:')
+    assert [r for i, r in enumerate(results) if i not in (4, 7)] == \
+        [r for i, r in enumerate(expected) if i not in (4, 7)]
+
+
+def test_gzip_in_and_out(client):
+    items = payloads(8)
+    body = gzip.compress(''.join(json.dumps(item) + '\n' for item in items).encode())
+    response = client.post('/predict/symptoms/stream', data=body,
+                           headers={'Content-Encoding': 'gzip', 'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    results = [json.loads(line) for line in gzip.decompress(response.get_data()).splitlines()]
+    assert results == client.post('/predict/symptoms/batch', json=items).get_json()['results']
+
+    # A truncated gzip body ends the stream with an error line
+    response = client.post('/predict/symptoms/stream', data=body[:-12], headers={'Content-Encoding': 'gzip'})
+    assert 'Unreadable request body' in response.get_data().splitlines()[-1].decode()
+    assert client.post('/predict/symptoms/stream', data=b'{}',
+                       headers={'Content-Encoding': 'br'}).status_code == 415
@@ -0,0 +1,39 @@
+# test_symptom_calendar.py
+# Run with: python -m pytest test_symptom_calendar.py
+
+import numpy as np
+import pytest
+
+from predictions import cycle_phase, cycle_phases
+
+
+def test_vectorized_phases_match_cycle_phase():
+    for cycle_length in range(10, 61):
+        for menses_length in (1, 3, 4.5, 5, 7, 12):
+            days = np.arange(1, cycle_length + 1)
+            phases, messages = cycle_phases(days, cycle_length, menses_length)
+            expected = [cycle_phase(day, cycle_length, menses_length) for day in range(1, cycle_length + 1)]
+            assert list(zip(phases.tolist(), messages.tolist())) == expected
+
+
+def test_calendar_matches_the_single_route_day_by_day():
+    app_module = pytest.importorskip('app')
+    if 'symptom_predictor' not in app_module.models:
+        pytest.skip('models not available')
+    client = app_module.app.test_client()
+
+    for profile in ({'cycle_length': 28, 'menses_length': 5, 'age': 31, 'bmi': 22.5},
+                    {'cycle_length': '35', 'menses_length': 6.5, 'pregnancies': 2, 'mean_bleeding_intensity': 7},
+                    {}):
+        response = client.post('/predict/symptoms/calendar', json=profile)
+        assert response.status_code == 200
+        calendar = response.get_json()
+        cycle_length = int(profile.get('cycle_length', 28))
+        assert [day['cycle_day'] for day in calendar['days']] == list(range(1, cycle_length + 1))
+        for day in calendar['days']:
+            single = client.post('/predict/symptoms', json={**profile, 'cycle_day': day.pop('cycle_day'),
+                                                            'cycle_length': cycle_length}).get_json()
+            assert day == {key: value for key, value in single.items() if key != 'model_accuracy'}
+
+    response = client.post('/predict/symptoms/calendar', json={'cycle_length': 28.5})
+    assert response.status_code == 400 and response.get_json()['details'][0].startswith('cycle_length:')
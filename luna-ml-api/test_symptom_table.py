@@ -0,0 +1,89 @@
+# test_symptom_table.py
+# Run with: python -m pytest test_symptom_table.py
+
+import threading
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.multioutput import MultiOutputRegressor
+
+from features import SYMPTOMS
+from forest_engine import CompiledForest
+from symptom_table import SymptomTable, build_table, write_table
+
+EXACT_AXES = {'cycle_day': range(1, 36), 'cycle_length': range(25, 31), 'menses_length': range(3, 7)}
+BINNED_AXES = {
+    'age': (('age', 'is_teenager', 'is_adult', 'is_older_adult'), range(15, 45)),
+    'bmi': (('bmi',), [22, 25]),
+    'pregnancies': (('pregnancies',), [0]),
+    'mean_bleeding_intensity': (('mean_bleeding_intensity',), [5]),
+}
+
+
+def random_payloads(n, seed):
+    rng = np.random.default_rng(seed)
+    return [{'cycle_day': int(rng.integers(0, 40)), 'cycle_length': float(rng.choice([26, 28, 29.5, 33])),
+             'menses_length': int(rng.integers(2, 8)), 'age': float(rng.choice([17, 25, 25.4, 38, 50])),
+             'bmi': float(rng.choice([22, 25, 25.0001, 31.7])), 'pregnancies': int(rng.choice([0, 0, 2])),
+             'mean_bleeding_intensity': float(rng.choice([5, 5, 6.5]))} for _ in range(n)]
+
+
+@pytest.fixture(scope='module')
+def model():
+    X = SYMPTOMS.rows(random_payloads(600, seed=0))[0]
+    Y = np.column_stack([X[:, 0] % 7, X[:, 12] / 10, X[:, 13], X[:, 16] * 3, X[:, 1] - X[:, 0]])
+    forest = MultiOutputRegressor(RandomForestRegressor(n_estimators=5, max_depth=8, random_state=0))
+    return CompiledForest.from_estimator(forest.fit(X, Y))
+
+
+@pytest.fixture(scope='module')
+def table(model, tmp_path_factory):
+    path = tmp_path_factory.mktemp('table') / 'symptom_table.bin'
+    write_table(path, *build_table(model, 'test-version', EXACT_AXES, BINNED_AXES))
+    return SymptomTable.load(path)
+
+
+def test_round_trip_header(table):
+    assert table.model_version == 'test-version'
+    assert table.values.shape[:3] == (35, 6, 4)
+    assert table.values.shape[-1] == 5
+
+
+def test_hits_match_the_forest_exactly(model, table):
+    X = SYMPTOMS.rows(random_payloads(2000, seed=1))[0]
+    outputs, hits = table.lookup(X)
+    assert hits.any() and not hits.all()
+    np.testing.assert_array_equal(outputs[hits], model.predict(X[hits]))
+    np.testing.assert_array_equal(table.predict(model, X), model.predict(X))
+
+
+def test_off_grid_rows_miss(table):
+    X = SYMPTOMS.rows([{'cycle_day': 10, 'cycle_length': 28.5}, {'cycle_day': 50},
+                       {'cycle_day': 10, 'pregnancies': 3}])[0]
+    assert not table.lookup(X)[1].any()
+
+
+def test_counts_survive_concurrent_requests(model, table):
+    X = SYMPTOMS.rows(random_payloads(50, seed=2))[0]
+    hits = int(table.lookup(X)[1].sum())
+    before = table.stats()
+
+    def predict():
+        for _ in range(20):
+            table.predict(model, X)
+    threads = [threading.Thread(target=predict) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    after = table.stats()
+    assert after['hits'] - before['hits'] == 160 * hits
+    assert after['misses'] - before['misses'] == 160 * (len(X) - hits)
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / 'not_a_table.bin'
+    path.write_bytes(b'\0' * 64)
+    with pytest.raises(ValueError):
+        SymptomTable.load(path)
@@ -0,0 +1,134 @@
+# test_user_stats.py
+# Run with: python -m pytest test_user_stats.py
+
+import threading
+
+import numpy as np
+import pytest
+
+from features import IRREGULAR_CYCLE
+from user_stats import CycleStats, RunningStats, UserStatsStore, user_token
+
+
+def test_sliding_window_matches_numpy():
+    rng = np.random.default_rng(0)
+    lengths = rng.integers(21, 40, size=40).tolist()
+    stats = CycleStats(window=5)
+    for i, length in enumerate(lengths):
+        stats.log_cycle(length, menses_length=4 + i % 3)
+        recent = lengths[max(0, i - 4):i + 1][::-1]
+        assert stats.recent_cycle_lengths() == recent and stats.last_cycle_length == length
+        assert stats.recent_stats.mean == pytest.approx(np.mean(recent))
+        assert stats.recent_stats.std() == pytest.approx(np.std(recent), abs=1e-9)
+    assert stats.cycle_length.count == 40
+    assert stats.cycle_length.std(ddof=1) == pytest.approx(np.std(lengths, ddof=1))
+    assert stats.menses_length.mean == pytest.approx(np.mean([4 + i % 3 for i in range(40)]))
+
+    # Stored statistics build the same feature row as the history they summarise
+    row = IRREGULAR_CYCLE.row({'cycle_stats': stats})
+    assert np.allclose(row, IRREGULAR_CYCLE.row({'recent_cycle_lengths': stats.recent_cycle_lengths()}))
+    assert RunningStats.of([30]).std() == 0.0
+
+
+def test_store_round_trips_and_serialises_writers(tmp_path):
+    store = UserStatsStore(str(tmp_path / 'stats.sqlite3'), window=4)
+    assert store.get('u1') is None
+
+    def log(lengths):
+        for length in lengths:
+            store.log_cycle('u1', length, luteal_phase_length=13)
+    threads = [threading.Thread(target=log, args=([26 + t] * 25,)) for t in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = UserStatsStore(str(tmp_path / 'stats.sqlite3'), window=4).get('u1')
+    assert stats.cycle_length.count == 100 and stats.cycle_length.mean == pytest.approx(27.5)
+    assert len(stats.recent_cycle_lengths()) == 4 and stats.luteal_phase_length.mean == 13
+    assert store.delete('u1') and store.get('u1') is None and not store.delete('u1')
+
+
+def test_stored_window_matches_what_the_client_sends(tmp_path):
+    # The client sends its last 6 cycle lengths, most recent first
+    lengths = [27, 33, 29, 41, 30, 26, 35, 28, 31]
+    store = UserStatsStore(str(tmp_path / 'stats.sqlite3'))
+    for length in lengths:
+        store.log_cycle('u1', length)
+    sent = lengths[::-1][:6]
+    stats = store.get('u1')
+    assert stats.recent_cycle_lengths() == sent
+    assert np.array_equal(IRREGULAR_CYCLE.row({'cycle_stats': stats}),
+                          IRREGULAR_CYCLE.row({'recent_cycle_lengths': sent}))
+
+    # Statistics kept under another window follow the store's from the next read
+    wide = UserStatsStore(str(tmp_path / 'wide.sqlite3'), window=12)
+    for length in lengths:
+        wide.log_cycle('u1', length)
+    narrow = UserStatsStore(str(tmp_path / 'wide.sqlite3'))
+    assert narrow.get('u1').recent_cycle_lengths() == sent
+    stats = narrow.log_cycle('u1', 24)
+    assert stats.recent_cycle_lengths() == [24] + sent[:5] and stats.cycle_length.count == 10
+    assert stats.recent_stats.mean == pytest.approx(np.mean([24] + sent[:5]))
+
+
+def test_predictions_reference_a_user_id(tmp_path, monkeypatch):
+    app_module = pytest.importorskip('app')
+    import predictions
+    if 'irregular_cycle' not in app_module.models:
+        pytest.skip('models not available')
+    client = app_module.app.test_client()
+    assert client.get('/users/u1/stats').status_code == 404
+
+    monkeypatch.setattr(predictions, 'user_stats', UserStatsStore(str(tmp_path / 'stats.sqlite3')))
+    monkeypatch.setattr(predictions, 'USER_STATS_SECRET', 'test-secret')
+    u1 = {'Authorization': f"Bearer {user_token('test-secret', 'u1')}"}
+    for length in (27, 33, 29, 41, 30):
+        response = client.post('/users/u1/cycles', headers=u1, json={'cycle_length': length, 'menses_length': 6,
+                                                                       'luteal_phase_length': 12})
+    assert response.get_json()['recent_cycle_lengths'] == [30, 41, 29, 33, 27]
+    assert client.post('/users/u1/cycles', headers=u1, json={'menses_length': 5}).status_code == 400
+
+    # Another user's token, or none, gets nothing
+    u2 = {'Authorization': f"Bearer {user_token('test-secret', 'u2')}"}
+    for headers in ({}, u2, {'Authorization': 'Bearer ' + 'f' * 64}):
+        assert client.get('/users/u1/stats', headers=headers).status_code == 401
+        assert client.post('/users/u1/cycles', headers=headers, json={'cycle_length': 20}).status_code == 401
+        assert client.delete('/users/u1/stats', headers=headers).status_code == 401
+        response = client.post('/detect/irregular-cycle', headers=headers, json={'user_id': 'u1'})
+        assert response.status_code == 401 and response.get_json()['details'][0].startswith('user_id:')
+    assert client.get('/users/u1/stats', headers=u1).get_json()['cycles_logged'] == 5
+
+    history = {'recent_cycle_lengths': [30, 41, 29, 33, 27], 'menses_length': 6, 'luteal_phase_length': 12}
+    by_id = client.post('/detect/irregular-cycle', headers=u1, json={'user_id': 'u1', 'age': 30}).get_json()
+    assert by_id == client.post('/detect/irregular-cycle', json={**history, 'age': 30}).get_json()
+    # Fields in the payload win over the stored ones
+    assert client.post('/detect/irregular-cycle', headers=u1,
+                       json={'user_id': 'u1', 'recent_cycle_lengths': [28]}).get_json() == \
+        client.post('/detect/irregular-cycle', json={**history, 'recent_cycle_lengths': [28]}).get_json()
+
+    batch = client.post('/detect/irregular-cycle/batch', headers=u1,
+                        json=[{'user_id': 'u1', 'age': 30}, {'user_id': 'u2'}]).get_json()
+    assert batch['results'][0] == by_id and batch['results'][1]['error'].startswith('user_id:')
+    next_period = client.post('/predict/next-period', headers=u1, json={'user_id': 'u1'}).get_json()
+    assert next_period['confidence'] == 'high'      # five cycles logged
+    forecast = {'today': '2026-10-17', 'current_cycle_day': 9}
+    assert client.post('/predict/next-period/forecast', headers=u1, json={**forecast, 'user_id': 'u1'}).get_json() == \
+        client.post('/predict/next-period/forecast', json={
+            **forecast, 'recent_cycle_lengths': history['recent_cycle_lengths'], 'LengthofMenses': 6,
+            'LengthofLutealPhase': 12}).get_json()
+
+    # Past the window, a user_id still answers as the client's last 6 lengths would
+    for length in (26, 35, 28):
+        client.post('/users/u1/cycles', headers=u1, json={'cycle_length': length, 'menses_length': 6,
+                                                          'luteal_phase_length': 12})
+    sent = {**history, 'recent_cycle_lengths': [28, 35, 26, 30, 41, 29]}
+    assert client.post('/detect/irregular-cycle', headers=u1, json={'user_id': 'u1', 'age': 30}).get_json() == \
+        client.post('/detect/irregular-cycle', json={**sent, 'age': 30}).get_json()
+
+    # A client cannot smuggle in statistics of its own
+    response = client.post('/detect/irregular-cycle', json={'cycle_stats': {'recent_stats': 1}})
+    assert response.status_code == 200
+
+    assert client.delete('/users/u1/stats', headers=u1).get_json() == {'deleted': True}
+    assert client.get('/users/u1/stats', headers=u1).status_code == 404
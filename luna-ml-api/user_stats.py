@@ -0,0 +1,236 @@
+# 📈 Luna per-user cycle statistics
+# Server-side summary of each user's logged cycles, so irregularity and
+# next-period calls can name a user_id instead of shipping (and the server
+# re-reducing) the whole history every time:
+#
+#   cycle length   Welford running mean and variance over every logged cycle
+#   recent cycles  ring buffer of the last RECENT_CYCLES lengths, with a
+#                  sliding Welford mean and variance over exactly those
+#                  (what the client computes from the lengths it sends)
+#   menses/luteal  running means of the period and luteal phase lengths
+#
+# Logging a cycle is O(1) whatever the history length: the evicted length
+# is taken out of the window statistics and the new one added. Each user's
+# state is one JSON row in a SQLite table (a local stand-in for a shared
+# key-value store), read-modified-written in one IMMEDIATE transaction so
+# concurrent writers - threads or worker processes - never lose an update.
+#
+# Statistics are health data, so every use of a user_id needs that user's
+# token: an HMAC of the id under USER_STATS_SECRET, sent as a Bearer token.
+# Whatever authenticates the user (a Cloud Function checking their Firebase
+# ID token, say) mints it with user_token(); it grants that one user only.
+
+import hashlib
+import hmac
+import json
+import math
+import sqlite3
+import threading
+import time
+
+# Lengths kept for the recent-cycle features: the client sends its last 6 cycle
+# lengths (extractUserFeatures in luna-app), so a user_id and an explicit history
+# give the same MeanCycleLength and CycleVariability
+RECENT_CYCLES = 6
+
+STATE_FORMAT = 1
+
+
+def user_token(secret, user_id):
+    """Bearer token granting access to `user_id`'s statistics"""
+    return hmac.new(secret.encode(), user_id.encode(), hashlib.sha256).hexdigest()
+
+
+def token_matches(secret, user_id, authorization):
+    """Whether an Authorization header carries `user_id`'s token"""
+    expected = f'Bearer {user_token(secret, user_id)}'.encode()
+    return hmac.compare_digest((authorization or '').encode('utf-8', 'replace'), expected)
+
+
+class RunningStats:
+    """Welford running mean and variance; remove() undoes an earlier add()"""
+
+    __slots__ = ('count', 'mean', 'm2')
+
+    def __init__(self, count=0, mean=0.0, m2=0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2    # sum of squared deviations from the mean
+
+    @classmethod
+    def of(cls, values):
+        stats = cls()
+        for value in values:
+            stats.add(value)
+        return stats
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def remove(self, value):
+        if self.count <= 1:
+            self.count, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        delta = value - self.mean
+        self.count -= 1
+        self.mean -= delta / self.count
+        # Rounding can leave a hair below zero once the window is constant
+        self.m2 = max(self.m2 - delta * (value - self.mean), 0.0)
+
+    def std(self, ddof=0):
+        """Standard deviation; ddof=0 is np.std's default"""
+        if self.count - ddof <= 0:
+            return 0.0
+        return math.sqrt(self.m2 / (self.count - ddof))
+
+    def to_list(self):
+        return [self.count, self.mean, self.m2]
+
+
+class CycleStats:
+    """One user's cycle statistics"""
+
+    def __init__(self, window=RECENT_CYCLES):
+        self.window = window
+        self.cycle_length = RunningStats()
+        self.recent = []        # ring buffer of cycle lengths, oldest at self.head once full
+        self.head = 0
+        self.recent_stats = RunningStats()
+        self.menses_length = RunningStats()
+        self.luteal_phase_length = RunningStats()
+
+    def log_cycle(self, cycle_length, menses_length=None, luteal_phase_length=None):
+        """Fold one completed cycle into the statistics"""
+        self.cycle_length.add(cycle_length)
+        if len(self.recent) < self.window:
+            self.recent.append(cycle_length)
+        else:
+            self.recent_stats.remove(self.recent[self.head])
+            self.recent[self.head] = cycle_length
+            self.head = (self.head + 1) % self.window
+        self.recent_stats.add(cycle_length)
+        if menses_length is not None:
+            self.menses_length.add(menses_length)
+        if luteal_phase_length is not None:
+            self.luteal_phase_length.add(luteal_phase_length)
+
+    def resize(self, window):
+        """Keep only the `window` most recent lengths from now on"""
+        recent = self.recent_cycle_lengths()[:window][::-1]     # oldest first
+        self.window = window
+        self.recent, self.head = recent, 0
+        self.recent_stats = RunningStats.of(recent)
+        return self
+
+    def recent_cycle_lengths(self):
+        """Recent lengths, most recent first (the order payloads send them in)"""
+        return (self.recent[self.head:] + self.recent[:self.head])[::-1]
+
+    @property
+    def last_cycle_length(self):
+        return self.recent[self.head - 1]
+
+    def payload_fields(self):
+        """Prediction payload fields these statistics stand in for"""
+        if not self.cycle_length.count:
+            return {}
+        fields = {'cycle_stats': self, 'cycles_logged': self.cycle_length.count}
+        if self.menses_length.count:
+            fields['menses_length'] = fields['LengthofMenses'] = self.menses_length.mean
+        if self.luteal_phase_length.count:
+            fields['luteal_phase_length'] = fields['LengthofLutealPhase'] = self.luteal_phase_length.mean
+        return fields
+
+    def summary(self):
+        """Response body of the user stats routes"""
+        return {
+            'cycles_logged': self.cycle_length.count,
+            'mean_cycle_length': round(self.cycle_length.mean, 2),
+            'cycle_length_std': round(self.cycle_length.std(ddof=1), 2),
+            'recent_cycle_lengths': self.recent_cycle_lengths(),
+            'recent_mean_cycle_length': round(self.recent_stats.mean, 2),
+            'recent_cycle_variability': round(self.recent_stats.std(), 2),
+            'mean_menses_length': round(self.menses_length.mean, 2) if self.menses_length.count else None,
+            'mean_luteal_phase_length': (round(self.luteal_phase_length.mean, 2)
+                                         if self.luteal_phase_length.count else None),
+        }
+
+    def to_dict(self):
+        return {
+            'format': STATE_FORMAT,
+            'window': self.window,
+            'cycle_length': self.cycle_length.to_list(),
+            'recent': self.recent,
+            'head': self.head,
+            'recent_stats': self.recent_stats.to_list(),
+            'menses_length': self.menses_length.to_list(),
+            'luteal_phase_length': self.luteal_phase_length.to_list(),
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        if state.get('format') != STATE_FORMAT:
+            raise ValueError(f"Unsupported user stats format: {state.get('format')}")
+        stats = cls(state['window'])
+        stats.cycle_length = RunningStats(*state['cycle_length'])
+        stats.recent = state['recent']
+        stats.head = state['head']
+        stats.recent_stats = RunningStats(*state['recent_stats'])
+        stats.menses_length = RunningStats(*state['menses_length'])
+        stats.luteal_phase_length = RunningStats(*state['luteal_phase_length'])
+        return stats
+
+
+class UserStatsStore:
+    """CycleStats per user id, one JSON row each in a SQLite table"""
+
+    def __init__(self, path, window=RECENT_CYCLES):
+        self.path = path
+        self.window = window
+        # sqlite3 connections are not shared across threads; each thread opens its own
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS user_stats '
+                               '(user_id TEXT PRIMARY KEY, state TEXT NOT NULL, updated REAL NOT NULL)')
+            self._local.connection = connection
+        return connection
+
+    def _read(self, connection, user_id):
+        row = connection.execute('SELECT state FROM user_stats WHERE user_id = ?', (user_id,)).fetchone()
+        if row is None:
+            return None
+        stats = CycleStats.from_dict(json.loads(row[0]))
+        # Kept under another window: the statistics follow this store's
+        return stats.resize(self.window) if stats.window != self.window else stats
+
+    def get(self, user_id):
+        """The user's CycleStats, or None before their first logged cycle"""
+        return self._read(self._connection(), user_id)
+
+    def log_cycle(self, user_id, cycle_length, menses_length=None, luteal_phase_length=None):
+        """Fold one completed cycle into the user's statistics; returns them"""
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            stats = self._read(connection, user_id) or CycleStats(self.window)
+            stats.log_cycle(cycle_length, menses_length, luteal_phase_length)
+            connection.execute('INSERT OR REPLACE INTO user_stats VALUES (?, ?, ?)',
+                               (user_id, json.dumps(stats.to_dict()), time.time()))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return stats
+
+    def delete(self, user_id):
+        """Forget a user; True if there was anything to forget"""
+        return self._connection().execute('DELETE FROM user_stats WHERE user_id = ?', (user_id,)).rowcount > 0
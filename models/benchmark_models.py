@@ -0,0 +1,272 @@
+# Model micro-benchmarks: predict latency and throughput per model and batch size,
+# per-tree cost, memory footprint, and how latency scales with forest size.
+# Separate from HTTP load (luna-ml-api/benchmark.py): this times the models alone.
+#
+# Run from the repo root, like the training scripts:
+#   python models/benchmark_models.py --out model_benchmarks.json
+#   python models/benchmark_models.py --quick            # batches up to 10k, smaller sweeps
+#
+# Every model is timed two ways: sklearn's own predict, and the flat-array
+# engine the API serves single requests and small batches with
+# (luna-ml-api/forest_engine.py, which hands batches of ESTIMATOR_MIN_ROWS or
+# more to sklearn). Input rows are built by the API's feature specs from
+# payloads drawn from models/data/menstrual_data.csv.
+#
+# The scaling sweeps refit forests with the settings of irregular_cycle_detector.py
+# (200 trees, depth 15) and symptom_predictor.py (one 150-tree forest over 5 outputs, depth 12),
+# varying n_estimators and max_depth. They are fitted on realistic rows labelled by
+# the served models, which gives trees of the same shape without rerunning the
+# training scripts' feature engineering.
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import warnings
+
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'luna-ml-api')
+sys.path.insert(0, API_DIR)
+
+from benchmark import PayloadGenerator, load_cycles  # noqa: E402
+from features import SPECS  # noqa: E402
+from forest_engine import CompiledForest  # noqa: E402
+from model_bundle import bundle_path  # noqa: E402
+
+warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+# Model -> (pickle in the served models directory, route whose payloads feed it)
+MODELS = {
+    'cycle_length': ('cycle_length_model_minimal.pkl', '/predict/cycle-length'),
+    'menses_length': ('menses_length_model.pkl', '/predict/menses-length'),
+    'next_period': ('next_period_predictor.pkl', '/predict/dashboard'),
+    'irregular_cycle': ('irregular_cycle_detector.pkl', '/detect/irregular-cycle'),
+    'symptom_predictor': ('symptom_predictor.pkl', '/predict/symptoms'),
+}
+
+BATCH_SIZES = (1, 10, 100, 1000, 10000, 100000)
+
+# Training settings the sweeps start from
+SWEEPS = {
+    'irregular_cycle': {
+        'make': lambda n_estimators, max_depth: RandomForestClassifier(
+            n_estimators=n_estimators, max_depth=max_depth, min_samples_split=5,
+            min_samples_leaf=2, random_state=42, n_jobs=1),
+        'n_estimators': 200, 'max_depth': 15,
+        'n_estimators_grid': (25, 50, 100, 200, 400), 'max_depth_grid': (5, 10, 15, 20, None),
+    },
+    'symptom_predictor': {
+        'make': lambda n_estimators, max_depth: RandomForestRegressor(
+            n_estimators=n_estimators, max_depth=max_depth, min_samples_split=5,
+            min_samples_leaf=3, random_state=42, n_jobs=1),
+        'n_estimators': 150, 'max_depth': 12,
+        'n_estimators_grid': (25, 50, 100, 150, 300), 'max_depth_grid': (4, 8, 12, 16, None),
+    },
+}
+
+
+def feature_rows(name, route, n, seed=0):
+    """n float32 rows for model `name` from generated payloads"""
+    generator = PayloadGenerator(load_cycles(), seed=seed)
+    payloads = []
+    for _ in range(n):
+        payload = generator.payload(route)
+        if name == 'next_period':
+            # The dashboard payload plus the history fields the backup model reads
+            payload.update(generator.irregular_cycle(generator.cycle()))
+        payloads.append(payload)
+    features, _, errors = SPECS[name].rows(payloads)
+    if errors:
+        raise ValueError(f'{len(errors)} generated payloads were rejected for {name}')
+    return features
+
+
+def predict_method(model):
+    """What serving calls: class probabilities for classifiers, predict otherwise"""
+    return model.predict_proba if getattr(model, 'classes_', None) is not None else model.predict
+
+
+def engine(estimator):
+    """The flat-array engine alone, without the hand-off of large batches to sklearn"""
+    forest = CompiledForest.from_estimator(estimator)
+    forest._estimator = None
+    return forest
+
+
+def time_call(fn, X, min_time):
+    """Median seconds per call over at least 3 calls and `min_time` seconds,
+    or a single call when one takes longer than that"""
+    fn(X[:1])
+    times = []
+    while len(times) < 3 or sum(times) < min_time:
+        start = time.perf_counter()
+        fn(X)
+        times.append(time.perf_counter() - start)
+        if times[-1] >= min_time:
+            break
+    return float(np.median(times))
+
+
+def peak_bytes(fn, X):
+    """Peak memory NumPy and Python allocate while running fn(X) once"""
+    tracemalloc.start()
+    try:
+        fn(X)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+# Runs in a child process: resident memory the unpickled estimator adds (sklearn
+# allocates tree nodes in C, out of tracemalloc's sight)
+LOAD_FOOTPRINT = '''
+import sys, joblib, sklearn.ensemble, sklearn.multioutput
+def rss():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * 4096
+before = rss()
+model = joblib.load(sys.argv[1])
+print(rss() - before)
+'''
+
+
+def load_footprint(path):
+    """Resident bytes the estimator at `path` takes once unpickled, where /proc is available"""
+    if not os.path.exists('/proc/self/statm'):
+        return None
+    result = subprocess.run([sys.executable, '-c', LOAD_FOOTPRINT, path],
+                            capture_output=True, text=True, check=True)
+    return int(result.stdout.strip().splitlines()[-1])
+
+
+def benchmark_model(name, path, X, batch_sizes, min_time):
+    estimator = joblib.load(path)
+    loaded_bytes = load_footprint(path)
+    compiled = engine(estimator)
+    trees = compiled.n_estimators
+    engines = {'sklearn': predict_method(estimator), 'engine': predict_method(compiled)}
+    bundle = bundle_path(path)
+    result = {
+        'estimator': type(estimator).__name__,
+        'trees': trees,
+        'nodes': compiled.n_nodes,
+        'depth': compiled.depth,
+        'features': compiled.n_features_in_,
+        'memory_mb': {
+            'pickle_file': round(os.path.getsize(path) / 1e6, 2),
+            'bundle_file': round(os.path.getsize(bundle) / 1e6, 2) if os.path.exists(bundle) else None,
+            'sklearn_loaded_rss': round(loaded_bytes / 1e6, 2) if loaded_bytes is not None else None,
+            'engine_arrays': round(sum(getattr(compiled, key).nbytes for key in
+                                       ('feature', 'threshold', 'children', 'value', 'roots')) / 1e6, 2),
+        },
+        'batches': [],
+    }
+    for batch in batch_sizes:
+        rows = X[np.arange(batch) % len(X)]
+        entry = {'batch': batch}
+        for engine_name, fn in engines.items():
+            seconds = time_call(fn, rows, min_time)
+            entry[engine_name] = {
+                'latency_ms': round(seconds * 1000, 4),
+                'rows_per_s': round(batch / seconds, 1),
+                'us_per_row_per_tree': round(seconds / batch / trees * 1e6, 5),
+            }
+        result['batches'].append(entry)
+        print(f"  {name:<18} batch {batch:>6}: sklearn {entry['sklearn']['latency_ms']:>10.3f} ms  "
+              f"engine {entry['engine']['latency_ms']:>10.3f} ms", file=sys.stderr)
+
+    largest = X[np.arange(batch_sizes[-1]) % len(X)]
+    result['memory_mb']['predict_peak'] = {
+        f'{engine_name}_batch_{batch_sizes[-1]}': round(peak_bytes(fn, largest) / 1e6, 2)
+        for engine_name, fn in engines.items()
+    }
+    faster = [entry['batch'] for entry in result['batches']
+              if entry['sklearn']['latency_ms'] < entry['engine']['latency_ms']]
+    result['sklearn_faster_from_batch'] = faster[0] if faster else None
+    return result
+
+
+def sweep(name, estimator, X, min_time, quick=False):
+    """Latency at batch 1 and 1000 as n_estimators and max_depth vary"""
+    settings = SWEEPS[name]
+    y = predict_method(estimator)(X)
+    if name == 'irregular_cycle':
+        y = estimator.classes_[np.argmax(y, axis=1)]
+    grids = {'n_estimators': settings['n_estimators_grid'], 'max_depth': settings['max_depth_grid']}
+    if quick:
+        grids = {key: values[::2] for key, values in grids.items()}
+    points = []
+    for parameter, values in grids.items():
+        for value in values:
+            params = {'n_estimators': settings['n_estimators'], 'max_depth': settings['max_depth'],
+                      parameter: value}
+            model = settings['make'](**params).fit(X, y)
+            compiled = engine(model)
+            point = {'vary': parameter, **params, 'trees': compiled.n_estimators,
+                     'nodes': compiled.n_nodes, 'depth': compiled.depth,
+                     'engine_arrays_mb': round(sum(getattr(compiled, key).nbytes for key in
+                                                   ('feature', 'threshold', 'children', 'value')) / 1e6, 2)}
+            for batch in (1, 1000):
+                rows = X[:batch]
+                for engine_name, fn in (('sklearn', predict_method(model)), ('engine', predict_method(compiled))):
+                    point[f'{engine_name}_batch_{batch}_ms'] = round(time_call(fn, rows, min_time) * 1000, 4)
+            points.append(point)
+            print(f"  {name:<18} {parameter}={value!s:<5} trees {point['trees']:>4} nodes {point['nodes']:>7}  "
+                  f"batch 1: sklearn {point['sklearn_batch_1_ms']:.2f} / engine {point['engine_batch_1_ms']:.3f} ms  "
+                  f"batch 1000: sklearn {point['sklearn_batch_1000_ms']:.1f} / engine {point['engine_batch_1000_ms']:.1f} ms",
+                  file=sys.stderr)
+    return points
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmark the Luna models')
+    parser.add_argument('--models-dir', default=os.path.join(API_DIR, 'models'))
+    parser.add_argument('--models', nargs='+', choices=list(MODELS), default=list(MODELS))
+    parser.add_argument('--min-time', type=float, default=0.2, help='seconds of timing per measurement')
+    parser.add_argument('--quick', action='store_true', help='batches up to 10k and half the sweep points')
+    parser.add_argument('--no-sweeps', action='store_true')
+    parser.add_argument('--out', help='write the JSON results here instead of stdout')
+    args = parser.parse_args()
+    batch_sizes = BATCH_SIZES[:-1] if args.quick else BATCH_SIZES
+
+    results = {
+        'meta': {
+            'python': platform.python_version(),
+            'machine': platform.platform(),
+            'cpus': os.cpu_count(),
+            'numpy': np.__version__,
+            'sklearn': __import__('sklearn').__version__,
+            'min_time_s': args.min_time,
+        },
+        'models': {},
+        'sweeps': {},
+    }
+    for name in args.models:
+        filename, route = MODELS[name]
+        path = os.path.join(args.models_dir, filename)
+        if not os.path.exists(path):
+            print(f"❌ {path} not found, skipping {name}", file=sys.stderr)
+            continue
+        print(f"⏱️ {name}", file=sys.stderr)
+        X = feature_rows(name, route, 5000)
+        results['models'][name] = benchmark_model(name, path, X, batch_sizes, args.min_time)
+        if name in SWEEPS and not args.no_sweeps:
+            results['sweeps'][name] = sweep(name, joblib.load(path), X, args.min_time, args.quick)
+
+    text = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,8 @@
 # ⚠️ Irregular Cycle Detection Model for Luna
 # This model detects PCOS, hormonal imbalances, and cycle irregularities
 
+import os
+import sys
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier
@@ -8,6 +10,10 @@ from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, confusion_matrix, roc_auc_score
 import joblib
 
+# Feature definitions shared with the serving code
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'luna-ml-api'))
+from features import IRREGULAR_CYCLE
+
 # Load the dataset
 print("📊 Loading dataset for Irregular Cycle Detection...")
 df = pd.read_csv("models/data/menstrual_data.csv")
@@ -41,71 +47,33 @@ def create_irregularity_features(df):
     df_clean = df_clean.dropna(subset=['LengthofCycle', 'Age'])
     
     # === FEATURES FOR IRREGULARITY DETECTION ===
-    features_df = pd.DataFrame()
+    # Raw columns come from the dataset; every flag and score is derived by the
+    # shared IRREGULAR_CYCLE spec, exactly as the API derives it
+    base_df = pd.DataFrame(index=df_clean.index)
     
     # 1. Cycle length characteristics
-    features_df['CycleLength'] = df_clean['LengthofCycle']
-    features_df['MeanCycleLength'] = df_clean['MeanCycleLength'].fillna(df_clean['LengthofCycle'])
+    base_df['CycleLength'] = df_clean['LengthofCycle']
+    base_df['MeanCycleLength'] = df_clean['MeanCycleLength'].fillna(df_clean['LengthofCycle'])
     
     # 2. Cycle variability (key indicator of irregularity)
-    features_df['CycleVariability'] = abs(features_df['CycleLength'] - features_df['MeanCycleLength'])
-    
-    # 3. Cycle length categories (medical standards)
-    features_df['CycleTooShort'] = (features_df['CycleLength'] < 21).astype(int)  # < 21 days
-    features_df['CycleTooLong'] = (features_df['CycleLength'] > 35).astype(int)   # > 35 days
-    features_df['CycleNormal'] = ((features_df['CycleLength'] >= 21) & 
-                                 (features_df['CycleLength'] <= 35)).astype(int)
-    
-    # 4. Ovulation indicators
-    features_df['CycleWithPeak'] = df_clean['CycleWithPeakorNot'].fillna(1)
-    features_df['NoOvulationDetected'] = (features_df['CycleWithPeak'] == 0).astype(int)
-    
-    # 5. Luteal phase characteristics
-    features_df['LutealPhaseLength'] = df_clean['LengthofLutealPhase'].fillna(14)
-    features_df['LutealPhaseTooShort'] = (features_df['LutealPhaseLength'] < 10).astype(int)
-    features_df['LutealPhaseTooLong'] = (features_df['LutealPhaseLength'] > 16).astype(int)
-    
-    # 6. Menstrual characteristics
-    features_df['MensesLength'] = df_clean['LengthofMenses'].fillna(5)
-    features_df['MensesTooShort'] = (features_df['MensesLength'] < 3).astype(int)
-    features_df['MensesTooLong'] = (features_df['MensesLength'] > 7).astype(int)
-    
-    # 7. Bleeding abnormalities
-    features_df['UnusualBleeding'] = df_clean['UnusualBleeding'].fillna(0)
-    features_df['BleedingIntensity'] = df_clean['MeanBleedingIntensity'].fillna(5)
-    features_df['VeryHeavyBleeding'] = (features_df['BleedingIntensity'] > 10).astype(int)
-    features_df['VeryLightBleeding'] = (features_df['BleedingIntensity'] < 3).astype(int)
-    
-    # 8. Demographics and risk factors
-    features_df['Age'] = df_clean['Age']
-    features_df['BMI'] = df_clean['BMI'].fillna(25)
-    features_df['UnderweightBMI'] = (features_df['BMI'] < 18.5).astype(int)
-    features_df['OverweightBMI'] = (features_df['BMI'] > 25).astype(int)
-    features_df['ObeseBMI'] = (features_df['BMI'] > 30).astype(int)
-    
-    # 9. Reproductive history
-    features_df['NumberPregnancies'] = df_clean['Numberpreg'].fillna(0)
-    features_df['NullipariousAdult'] = ((features_df['Age'] > 30) & 
-                                       (features_df['NumberPregnancies'] == 0)).astype(int)
-    
-    # 10. Age-related factors
-    features_df['TeenageYears'] = (features_df['Age'] < 20).astype(int)
-    features_df['Perimenopause'] = (features_df['Age'] > 40).astype(int)
-    
-    # 11. Complex indicators
-    features_df['PCOSRiskScore'] = (
-        features_df['CycleTooLong'] + 
-        features_df['NoOvulationDetected'] + 
-        features_df['ObeseBMI'] + 
-        features_df['UnusualBleeding']
-    )
+    base_df['CycleVariability'] = abs(base_df['CycleLength'] - base_df['MeanCycleLength'])
     
-    features_df['HormonalImbalanceScore'] = (
-        features_df['CycleVariability'] / 5 +  # Normalize variability
-        features_df['LutealPhaseTooShort'] + 
-        features_df['VeryHeavyBleeding'] + 
-        features_df['VeryLightBleeding']
-    )
+    # 3. Ovulation, luteal phase and menstrual characteristics
+    base_df['CycleWithPeak'] = df_clean['CycleWithPeakorNot'].fillna(1)
+    base_df['LutealPhaseLength'] = df_clean['LengthofLutealPhase'].fillna(14)
+    base_df['MensesLength'] = df_clean['LengthofMenses'].fillna(5)
+    
+    # 4. Bleeding abnormalities
+    base_df['UnusualBleeding'] = df_clean['UnusualBleeding'].fillna(0)
+    base_df['BleedingIntensity'] = df_clean['MeanBleedingIntensity'].fillna(5)
+    
+    # 5. Demographics and reproductive history
+    base_df['Age'] = df_clean['Age']
+    base_df['BMI'] = df_clean['BMI'].fillna(25)
+    base_df['NumberPregnancies'] = df_clean['Numberpreg'].fillna(0)
+    
+    # 6. Medical-standard flags, PCOS and hormonal scores
+    features_df = IRREGULAR_CYCLE.frame(base_df)
     
     # === CREATE TARGET VARIABLE ===
     # Define irregularity based on medical criteria
@@ -131,16 +99,7 @@ def create_irregularity_features(df):
 features_df, target = create_irregularity_features(df)
 
 # Define feature columns for the model
-feature_columns = [
-    'CycleLength', 'MeanCycleLength', 'CycleVariability',
-    'CycleTooShort', 'CycleTooLong', 'CycleWithPeak', 'NoOvulationDetected',
-    'LutealPhaseLength', 'LutealPhaseTooShort', 'LutealPhaseTooLong',
-    'MensesLength', 'MensesTooShort', 'MensesTooLong',
-    'UnusualBleeding', 'BleedingIntensity', 'VeryHeavyBleeding', 'VeryLightBleeding',
-    'Age', 'BMI', 'UnderweightBMI', 'OverweightBMI', 'ObeseBMI',
-    'NumberPregnancies', 'NullipariousAdult', 'TeenageYears', 'Perimenopause',
-    'PCOSRiskScore', 'HormonalImbalanceScore'
-]
+feature_columns = IRREGULAR_CYCLE.columns
 
 X = features_df[feature_columns]
 y = target
@@ -261,45 +220,19 @@ def assess_cycle_irregularity(
     current_cycle_length = recent_cycle_lengths[0] if recent_cycle_lengths else mean_cycle_length
     
     # Create feature vector matching training data
-    features = np.array([[
-        current_cycle_length,
-        mean_cycle_length,
-        cycle_variability,
-        1 if current_cycle_length < 21 else 0,  # CycleTooShort
-        1 if current_cycle_length > 35 else 0,  # CycleTooLong
-        1 if ovulation_detected else 0,         # CycleWithPeak
-        1 if not ovulation_detected else 0,     # NoOvulationDetected
-        luteal_phase_length,
-        1 if luteal_phase_length < 10 else 0,   # LutealPhaseTooShort
-        1 if luteal_phase_length > 16 else 0,   # LutealPhaseTooLong
-        menses_length,
-        1 if menses_length < 3 else 0,          # MensesTooShort
-        1 if menses_length > 7 else 0,          # MensesTooLong
-        1 if unusual_bleeding else 0,           # UnusualBleeding
-        bleeding_intensity,
-        1 if bleeding_intensity > 10 else 0,    # VeryHeavyBleeding
-        1 if bleeding_intensity < 3 else 0,     # VeryLightBleeding
-        age,
-        bmi,
-        1 if bmi < 18.5 else 0,                 # UnderweightBMI
-        1 if bmi > 25 else 0,                   # OverweightBMI
-        1 if bmi > 30 else 0,                   # ObeseBMI
-        number_pregnancies,
-        1 if (age > 30 and number_pregnancies == 0) else 0,  # NullipariousAdult
-        1 if age < 20 else 0,                   # TeenageYears
-        1 if age > 40 else 0,                   # Perimenopause
-        # Calculate complex scores
-        sum([
-            1 if current_cycle_length > 35 else 0,
-            1 if not ovulation_detected else 0,
-            1 if bmi > 30 else 0,
-            1 if unusual_bleeding else 0
-        ]),  # PCOSRiskScore
-        (cycle_variability / 5 + 
-         (1 if luteal_phase_length < 10 else 0) +
-         (1 if bleeding_intensity > 10 else 0) +
-         (1 if bleeding_intensity < 3 else 0))  # HormonalImbalanceScore
-    ]])
+    features = IRREGULAR_CYCLE.from_columns({
+        'CycleLength': [current_cycle_length],
+        'MeanCycleLength': [mean_cycle_length],
+        'CycleVariability': [cycle_variability],
+        'CycleWithPeak': [1 if ovulation_detected else 0],
+        'LutealPhaseLength': [luteal_phase_length],
+        'MensesLength': [menses_length],
+        'UnusualBleeding': [1 if unusual_bleeding else 0],
+        'BleedingIntensity': [bleeding_intensity],
+        'Age': [age],
+        'BMI': [bmi],
+        'NumberPregnancies': [number_pregnancies]
+    })
     
     # Get prediction and probability
     irregularity_probability = model.predict_proba(features)[0, 1]
@@ -0,0 +1,283 @@
+# Accuracy-versus-latency search for "lite" variants of the Luna models.
+# For each model this refits a grid of reduced forests (fewer trees, capped
+# depth, larger leaves), measures held-out error next to single-row latency and
+# artifact size, keeps the Pareto-optimal variants and saves the smallest one
+# within the model's error budget as a deployable pickle + bundle:
+#   <model>.lite.pkl / <model>.lite.bundle
+#
+# Run from the repo root, like the training scripts:
+#   python models/lite_models.py --report lite_models.json
+#   python models/lite_models.py --models symptom_predictor --quick
+#   python models/lite_models.py --budget cycle_length=0.2 --publish luna-ml-api/models/store
+#
+# The Firebase functions serve the lite files with LITE_MODELS=all (or a list of
+# model names); the API can serve them by activating the published versions
+# (luna-ml-api/model_store.py activate NAME VERSION).
+#
+# Error is measured two ways:
+#   cycle_length, menses_length - against the true labels of the 20% test split
+#     the training scripts hold out (same CSV, same random_state)
+#   next_period, irregular_cycle, symptom_predictor - against the served model:
+#     variants are fitted on realistic rows labelled by it (as the scaling sweeps
+#     in benchmark_models.py are), since those training scripts engineer their
+#     features inline. The error is what a user would see change by switching.
+# Every variant keeps the served model's other settings (min_samples_split,
+# class_weight, ...); only the grid parameters change.
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import warnings
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.metrics import mean_absolute_error, roc_auc_score
+from sklearn.model_selection import train_test_split
+from sklearn.multioutput import MultiOutputRegressor
+
+from benchmark_models import API_DIR, MODELS, feature_rows, predict_method, time_call
+
+from features import SPECS  # noqa: E402  (on the path via benchmark_models)
+from forest_engine import CompiledForest  # noqa: E402
+from model_bundle import bundle_path, export  # noqa: E402
+from prediction_cache import file_version  # noqa: E402
+
+warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# Model -> (training CSV, target) for the models whose training data the specs read directly
+LABELLED = {
+    'cycle_length': ('improved_cycle_length_model_data.csv', 'LengthofCycle'),
+    'menses_length': ('cleaned_menses_length_data2.csv', 'LengthofMenses'),
+}
+
+# Largest acceptable error increase over the served model, in the metric's units:
+# days of MAE, severity points (0-10) of MAE, or AUC
+BUDGETS = {
+    'cycle_length': 0.1,
+    'menses_length': 0.1,
+    'next_period': 0.25,
+    'irregular_cycle': 0.01,
+    'symptom_predictor': 0.25,
+}
+
+GRID = {
+    'n_estimators': (10, 25, 50, 100),
+    'max_depth': (4, 6, 8, 12, None),
+    'min_samples_leaf': (1, 5, 20),
+}
+QUICK_GRID = {
+    'n_estimators': (10, 50),
+    'max_depth': (6, 12, None),
+    'min_samples_leaf': (1, 20),
+}
+
+
+def holdout(name, route, rows=5000):
+    """X_train, X_test, y_train, y_test for `name`
+
+    y is the true label for LABELLED models, else the served model's output
+    (filled in by `distil`).
+    """
+    if name in LABELLED:
+        filename, target = LABELLED[name]
+        df = pd.read_csv(os.path.join(DATA_DIR, filename))
+        columns = SPECS[name].columns + [target]
+        df[columns] = df[columns].replace(r'^\s*$', pd.NA, regex=True)
+        df = df.dropna(subset=columns)
+        X = SPECS[name].frame(df).to_numpy(dtype=np.float32)
+        return train_test_split(X, df[target].to_numpy(dtype=float), test_size=0.2, random_state=42)
+    X = feature_rows(name, route, rows)
+    return train_test_split(X, np.zeros(len(X)), test_size=0.2, random_state=42)
+
+
+def distil(reference, X_train, X_test):
+    """Labels from the served model: classes for classifiers, predictions otherwise"""
+    return reference.predict(X_train), reference.predict(X_test)
+
+
+def score(model, X, y):
+    """(metric, value, loss): AUC for classifiers, MAE otherwise; loss is lower-is-better"""
+    if getattr(model, 'classes_', None) is not None:
+        auc = float(roc_auc_score(y, model.predict_proba(X)[:, 1]))
+        return 'auc', auc, 1 - auc
+    mae = float(mean_absolute_error(y, model.predict(X)))
+    return 'mae', mae, mae
+
+
+def variant_params(reference, params):
+    """`params` addressed to the forest, which MultiOutputRegressor wraps"""
+    prefix = 'estimator__' if isinstance(reference, MultiOutputRegressor) else ''
+    return {prefix + key: value for key, value in params.items()}
+
+
+def artifact_sizes(model):
+    """Bytes of the pickle and of the bundle exported from it"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'variant.pkl')
+        joblib.dump(model, path)
+        return os.path.getsize(path), os.path.getsize(export(path))
+
+
+def measure(model, X_test, y_test, min_time):
+    metric, value, loss = score(model, X_test, y_test)
+    compiled = CompiledForest.from_estimator(model)
+    row = X_test[:1]
+    pickle_bytes, bundle_bytes = artifact_sizes(model)
+    return {
+        metric: round(value, 4),
+        'loss': loss,
+        'trees': compiled.n_estimators,
+        'nodes': compiled.n_nodes,
+        'depth': compiled.depth,
+        'engine_batch_1_ms': round(time_call(predict_method(compiled), row, min_time) * 1000, 4),
+        'sklearn_batch_1_ms': round(time_call(predict_method(model), row, min_time) * 1000, 4),
+        'pickle_kb': round(pickle_bytes / 1024, 1),
+        'bundle_kb': round(bundle_bytes / 1024, 1),
+    }
+
+
+def pareto_front(points, keys=('loss', 'engine_batch_1_ms', 'bundle_kb')):
+    """Indexes of the points no other point beats on every key (lower is better)"""
+    front = []
+    for i, point in enumerate(points):
+        dominated = any(
+            all(other[key] <= point[key] for key in keys) and any(other[key] < point[key] for key in keys)
+            for j, other in enumerate(points) if j != i)
+        if not dominated:
+            front.append(i)
+    return front
+
+
+def choose(points, front, reference_loss, budget):
+    """The smallest Pareto variant within `budget` of the reference, then the fastest"""
+    within = [i for i in front if points[i]['loss'] <= reference_loss + budget]
+    if not within:
+        return None
+    return min(within, key=lambda i: (points[i]['bundle_kb'], points[i]['engine_batch_1_ms']))
+
+
+def search(name, path, grid, budget, min_time):
+    filename, route = MODELS[name]
+    reference = joblib.load(path)
+    X_train, X_test, y_train, y_test = holdout(name, route)
+    if name not in LABELLED:
+        y_train, y_test = distil(reference, X_train, X_test)
+
+    baseline = measure(reference, X_test, y_test, min_time)
+    print(f"  {name:<18} served: {baseline['trees']:>4} trees {baseline['nodes']:>7} nodes  "
+          f"loss {baseline['loss']:.4f}  engine {baseline['engine_batch_1_ms']:.3f} ms  "
+          f"{baseline['bundle_kb']:.0f} KB", file=sys.stderr)
+
+    points, models = [], []
+    for n_estimators in grid['n_estimators']:
+        for max_depth in grid['max_depth']:
+            for min_samples_leaf in grid['min_samples_leaf']:
+                params = {'n_estimators': n_estimators, 'max_depth': max_depth,
+                          'min_samples_leaf': min_samples_leaf}
+                model = clone(reference).set_params(**variant_params(reference, dict(params, n_jobs=1)))
+                model.fit(X_train, y_train)
+                point = {**params, **measure(model, X_test, y_test, min_time)}
+                points.append(point)
+                models.append(model)
+                print(f"  {name:<18} trees {n_estimators:>3} depth {max_depth!s:<4} leaf {min_samples_leaf:>2}: "
+                      f"loss {point['loss']:.4f}  engine {point['engine_batch_1_ms']:.3f} ms  "
+                      f"{point['bundle_kb']:.0f} KB", file=sys.stderr)
+
+    front = pareto_front(points)
+    for i in front:
+        points[i]['pareto'] = True
+    chosen = choose(points, front, baseline['loss'], budget)
+    return {
+        'reference': {'version': file_version(path), **baseline},
+        'evaluated_against': 'labels' if name in LABELLED else 'served model',
+        'train_rows': len(X_train),
+        'test_rows': len(X_test),
+        'budget': budget,
+        'variants': points,
+        'chosen': chosen,
+    }, (models[chosen] if chosen is not None else None)
+
+
+def parse_budgets(values):
+    budgets = dict(BUDGETS)
+    for value in values or []:
+        name, _, amount = value.partition('=')
+        if name not in BUDGETS or not amount:
+            raise SystemExit(f'--budget expects NAME=VALUE with NAME one of {", ".join(BUDGETS)}')
+        budgets[name] = float(amount)
+    return budgets
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Search reduced forests for lite model variants')
+    parser.add_argument('--models-dir', default=os.path.join(API_DIR, 'models'))
+    parser.add_argument('--out-dir', help='where the lite pickles and bundles go (default: --models-dir)')
+    parser.add_argument('--models', nargs='+', choices=list(MODELS), default=list(MODELS))
+    parser.add_argument('--budget', action='append', metavar='NAME=VALUE',
+                        help='error increase allowed over the served model (repeatable)')
+    parser.add_argument('--min-time', type=float, default=0.05, help='seconds of timing per latency measurement')
+    parser.add_argument('--quick', action='store_true', help='a 12-point grid instead of 60')
+    parser.add_argument('--publish', metavar='STORE',
+                        help='also add the lite bundles to this model store, without activating them')
+    parser.add_argument('--report', help='write the JSON report here instead of stdout')
+    args = parser.parse_args()
+    budgets = parse_budgets(args.budget)
+    grid = QUICK_GRID if args.quick else GRID
+    out_dir = args.out_dir or args.models_dir
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'machine': platform.platform(),
+            'numpy': np.__version__,
+            'sklearn': __import__('sklearn').__version__,
+            'grid': grid,
+            'min_time_s': args.min_time,
+        },
+        'models': {},
+    }
+    store = None
+    if args.publish:
+        from model_store import ModelStore
+        store = ModelStore(args.publish)
+
+    for name in args.models:
+        filename = MODELS[name][0]
+        path = os.path.join(args.models_dir, filename)
+        if not os.path.exists(path):
+            print(f"❌ {path} not found, skipping {name}", file=sys.stderr)
+            continue
+        print(f"🔍 {name}", file=sys.stderr)
+        result, lite = search(name, path, grid, budgets[name], args.min_time)
+        report['models'][name] = result
+        if lite is None:
+            print(f"⚠️ {name}: no variant within {budgets[name]} of the served model", file=sys.stderr)
+            continue
+        os.makedirs(out_dir, exist_ok=True)
+        lite_path = os.path.join(out_dir, filename.replace('.pkl', '.lite.pkl'))
+        joblib.dump(lite, lite_path)
+        result['saved'] = {'pickle': lite_path, 'bundle': export(lite_path)}
+        if store is not None:
+            result['saved']['store_version'] = store.publish(name, bundle_path(lite_path), activate=False)
+        point = result['variants'][result['chosen']]
+        print(f"✅ {name}: {point['n_estimators']} trees, depth {point['max_depth']}, "
+              f"leaf {point['min_samples_leaf']} -> {lite_path} ({point['bundle_kb']:.0f} KB vs "
+              f"{result['reference']['bundle_kb']:.0f} KB)", file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.report:
+        with open(args.report, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
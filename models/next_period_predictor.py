@@ -1,6 +1,8 @@
 # 🔮 WORKING Next Period Prediction Model for Luna
 # This model predicts the exact date of the next period start
 
+import os
+import sys
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestRegressor
@@ -8,6 +10,10 @@ from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, r2_score
 import joblib
 
+# Feature definitions shared with the serving code
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'luna-ml-api'))
+from features import NEXT_PERIOD
+
 # Load the dataset
 print("📊 Loading dataset for Next Period Prediction...")
 df = pd.read_csv("models/data/menstrual_data.csv")
@@ -49,38 +55,34 @@ def create_next_period_features(df):
         print("⚠️  Warning: Very few rows remaining. Check your data quality.")
     
     # === BUILD FEATURES ===
-    features_df = pd.DataFrame(index=df_clean.index)
+    base_df = pd.DataFrame(index=df_clean.index)
     
     # 1. Core cycle characteristics
-    features_df['CurrentCycleLength'] = df_clean['LengthofCycle']
-    features_df['MeanCycleLength'] = df_clean['MeanCycleLength'].fillna(df_clean['LengthofCycle'])
-    features_df['CycleVariability'] = abs(features_df['CurrentCycleLength'] - features_df['MeanCycleLength']).fillna(2)
+    base_df['CurrentCycleLength'] = df_clean['LengthofCycle']
+    base_df['MeanCycleLength'] = df_clean['MeanCycleLength'].fillna(df_clean['LengthofCycle'])
+    base_df['CycleVariability'] = abs(base_df['CurrentCycleLength'] - base_df['MeanCycleLength']).fillna(2)
     
     # 2. Ovulation and luteal phase
-    features_df['EstimatedDayofOvulation'] = df_clean['EstimatedDayofOvulation'].fillna(
-        features_df['CurrentCycleLength'] - 14
+    base_df['EstimatedDayofOvulation'] = df_clean['EstimatedDayofOvulation'].fillna(
+        base_df['CurrentCycleLength'] - 14
     )
-    features_df['LutealPhaseLength'] = df_clean['LengthofLutealPhase'].fillna(14)
+    base_df['LutealPhaseLength'] = df_clean['LengthofLutealPhase'].fillna(14)
     
     # 3. Menstrual characteristics
-    features_df['MensesLength'] = df_clean['LengthofMenses'].fillna(5)
-    features_df['MeanMensesLength'] = df_clean['MeanMensesLength'].fillna(features_df['MensesLength'])
+    base_df['MensesLength'] = df_clean['LengthofMenses'].fillna(5)
+    base_df['MeanMensesLength'] = df_clean['MeanMensesLength'].fillna(base_df['MensesLength'])
     
     # 4. Demographics
-    features_df['Age'] = df_clean['Age']
-    features_df['BMI'] = df_clean['BMI'].fillna(25)
-    features_df['NumberPregnancies'] = df_clean['Numberpreg'].fillna(0)
+    base_df['Age'] = df_clean['Age']
+    base_df['BMI'] = df_clean['BMI'].fillna(25)
+    base_df['NumberPregnancies'] = df_clean['Numberpreg'].fillna(0)
     
     # 5. Binary indicators (ensure they are 0 or 1)
-    features_df['CycleWithPeak'] = df_clean['CycleWithPeakorNot'].fillna(1).astype(int)
-    features_df['UnusualBleeding'] = df_clean['UnusualBleeding'].fillna(0).astype(int)
+    base_df['CycleWithPeak'] = df_clean['CycleWithPeakorNot'].fillna(1).astype(int)
+    base_df['UnusualBleeding'] = df_clean['UnusualBleeding'].fillna(0).astype(int)
     
-    # 6. Calculated ratios
-    features_df['OvulationTiming'] = features_df['EstimatedDayofOvulation'] / features_df['CurrentCycleLength']
-    features_df['LutealRatio'] = features_df['LutealPhaseLength'] / features_df['CurrentCycleLength']
-    features_df['MensesRatio'] = features_df['MensesLength'] / features_df['CurrentCycleLength']
-    features_df['AgeAdjustedCycle'] = features_df['CurrentCycleLength'] * (features_df['Age'] / 28)
-    features_df['FertilityRatio'] = 6 / features_df['CurrentCycleLength']  # 6 fertile days
+    # 6. Calculated ratios, from the shared NEXT_PERIOD spec
+    features_df = NEXT_PERIOD.frame(base_df)
     
     # ✅ FINAL CLEANUP: Remove any remaining problematic values
     features_df = features_df.replace([np.inf, -np.inf], np.nan)
@@ -93,7 +95,7 @@ def create_next_period_features(df):
     features_df = features_df.fillna(0)  # Final NaN cleanup
     
     # Target variable
-    target = features_df['CurrentCycleLength'].copy()
+    target = base_df['CurrentCycleLength'].copy()
     
     print(f"✅ Features created: {features_df.shape}")
     print(f"Target range: {target.min():.1f} - {target.max():.1f} days")
@@ -104,12 +106,7 @@ def create_next_period_features(df):
 features_df, target = create_next_period_features(df)
 
 # Define feature columns (excluding target)
-feature_columns = [
-    'MeanCycleLength', 'CycleVariability', 'EstimatedDayofOvulation',
-    'LutealPhaseLength', 'MensesLength', 'Age', 'BMI', 'NumberPregnancies',
-    'CycleWithPeak', 'UnusualBleeding', 'OvulationTiming', 'LutealRatio',
-    'MensesRatio', 'AgeAdjustedCycle', 'FertilityRatio'
-]
+feature_columns = NEXT_PERIOD.columns
 
 X = features_df[feature_columns].copy()
 y = target.copy()
@@ -208,27 +205,15 @@ def predict_next_period_date(
         model = joblib.load(model_path)
         
         # Create feature vector with reasonable defaults
-        estimated_ovulation = mean_cycle_length - 14
-        luteal_phase = 14
-        cycle_variability = 2
-        
-        features = np.array([[
-            mean_cycle_length,          # MeanCycleLength
-            cycle_variability,          # CycleVariability  
-            estimated_ovulation,        # EstimatedDayofOvulation
-            luteal_phase,              # LutealPhaseLength
-            menses_length,             # MensesLength
-            age,                       # Age
-            bmi,                       # BMI
-            0,                         # NumberPregnancies
-            1,                         # CycleWithPeak
-            0,                         # UnusualBleeding
-            estimated_ovulation / mean_cycle_length,  # OvulationTiming
-            luteal_phase / mean_cycle_length,         # LutealRatio
-            menses_length / mean_cycle_length,        # MensesRatio
-            mean_cycle_length * (age / 28),           # AgeAdjustedCycle
-            6 / mean_cycle_length                     # FertilityRatio
-        ]], dtype=float)
+        features = NEXT_PERIOD.row({
+            'mean_cycle_length': mean_cycle_length,
+            'cycle_variability': 2,
+            'estimated_day_of_ovulation': mean_cycle_length - 14,
+            'luteal_phase_length': 14,
+            'menses_length': menses_length,
+            'age': age,
+            'bmi': bmi
+        })
         
         # Predict cycle length
         predicted_cycle_length = model.predict(features)[0]
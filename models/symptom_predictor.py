@@ -1,6 +1,10 @@
 # 🎭 Daily Symptom Prediction Model for Luna
 # This model predicts daily period symptoms with intensity levels
 
+import os
+import sys
+import tempfile
+import time
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestRegressor
@@ -9,6 +13,11 @@ from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, r2_score
 import joblib
 
+# Feature definitions shared with the serving code
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'luna-ml-api'))
+from features import SYMPTOMS
+from forest_engine import CompiledForest
+
 # Load the dataset
 print("📊 Loading dataset for Symptom Prediction...")
 df = pd.read_csv("models/data/menstrual_data.csv")
@@ -71,39 +80,16 @@ def create_symptom_features(df):
         for cycle_day in range(1, int(cycle_length) + 1):
             
             # === FEATURES ===
+            # Raw inputs only; phase flags, ratios and age buckets are derived
+            # by the shared SYMPTOMS spec once all days are collected
             features = {
-                # Cycle timing features
                 'cycle_day': cycle_day,
                 'cycle_length': cycle_length,
                 'menses_length': menses_length,
-                'days_since_period_start': max(0, cycle_day - 1),
-                'days_until_next_period': max(0, cycle_length - cycle_day),
-                
-                # Cycle phase features
-                'is_period_phase': 1 if cycle_day <= menses_length else 0,
-                'is_follicular_phase': 1 if menses_length < cycle_day <= (cycle_length - 14 - 3) else 0,
-                'is_ovulation_phase': 1 if (cycle_length - 14 - 3) < cycle_day <= (cycle_length - 14 + 3) else 0,
-                'is_luteal_phase': 1 if (cycle_length - 14 + 3) < cycle_day <= (cycle_length - 5) else 0,
-                'is_pms_phase': 1 if cycle_day > (cycle_length - 5) else 0,
-                
-                # Period day specific
-                'period_day': min(cycle_day, menses_length) if cycle_day <= menses_length else 0,
-                'period_day_normalized': (min(cycle_day, menses_length) / menses_length) if cycle_day <= menses_length and menses_length > 0 else 0,
-                
-                # Personal characteristics
                 'age': age,
                 'bmi': bmi,
                 'pregnancies': row['Numberpreg'] if not pd.isna(row['Numberpreg']) else 0,
                 'mean_bleeding_intensity': mean_intensity,
-                
-                # Cycle position ratios
-                'cycle_day_ratio': cycle_day / cycle_length,
-                'ovulation_proximity': abs(cycle_day - (cycle_length - 14)) / cycle_length,
-                
-                # Age-related factors
-                'is_teenager': 1 if age < 20 else 0,
-                'is_adult': 1 if 20 <= age <= 35 else 0,
-                'is_older_adult': 1 if age > 35 else 0,
             }
             
             # === TARGETS (Symptom intensities) ===
@@ -170,7 +156,7 @@ def create_symptom_features(df):
             targets_list.append(targets)
     
     # Convert to DataFrames
-    features_df = pd.DataFrame(features_list)
+    features_df = SYMPTOMS.frame(pd.DataFrame(features_list))
     targets_df = pd.DataFrame(targets_list)
     
     print(f"✅ Created {len(features_df)} data points from {len(valid_rows)} cycles")
@@ -182,14 +168,7 @@ def create_symptom_features(df):
 features_df, targets_df = create_symptom_features(df)
 
 # Define feature columns
-feature_columns = [
-    'cycle_day', 'cycle_length', 'menses_length', 'days_since_period_start',
-    'days_until_next_period', 'is_period_phase', 'is_follicular_phase',
-    'is_ovulation_phase', 'is_luteal_phase', 'is_pms_phase',
-    'period_day', 'period_day_normalized', 'age', 'bmi', 'pregnancies',
-    'mean_bleeding_intensity', 'cycle_day_ratio', 'ovulation_proximity',
-    'is_teenager', 'is_adult', 'is_older_adult'
-]
+feature_columns = SYMPTOMS.columns
 
 # Target columns
 target_columns = ['cramp_intensity', 'flow_intensity', 'fatigue_level', 'mood_impact', 'overall_discomfort']
@@ -211,9 +190,10 @@ X_train, X_test, y_train, y_test = train_test_split(
 print(f"Training set: {X_train.shape}")
 print(f"Test set: {X_test.shape}")
 
-# Train multi-output model
+# Train one natively multi-output forest: every tree predicts all five
+# symptoms, so a prediction walks 150 trees rather than 150 per symptom
 print("🚀 Training Daily Symptom Prediction Model...")
-base_model = RandomForestRegressor(
+forest_params = dict(
     n_estimators=150,
     max_depth=12,
     min_samples_split=5,
@@ -221,40 +201,69 @@ base_model = RandomForestRegressor(
     random_state=42
 )
 
-model = MultiOutputRegressor(base_model)
+model = RandomForestRegressor(**forest_params)
 model.fit(X_train, y_train)
 
+# The previous layout, one wrapped forest per symptom, trained for comparison
+print("🚀 Training the per-symptom forests for comparison...")
+wrapped_model = MultiOutputRegressor(RandomForestRegressor(**forest_params))
+wrapped_model.fit(X_train, y_train)
+
 # Evaluate the model
 predictions = model.predict(X_test)
+wrapped_predictions = wrapped_model.predict(X_test)
 y_test_array = y_test.values
 
-print(f"\n🎯 DAILY SYMPTOM PREDICTION MODEL PERFORMANCE:")
+print(f"\n🎯 DAILY SYMPTOM PREDICTION MODEL PERFORMANCE (native | per-symptom forests):")
 
 # Calculate metrics for each symptom
 for i, symptom in enumerate(target_columns):
-    mae = mean_absolute_error(y_test_array[:, i], predictions[:, i])
-    r2 = r2_score(y_test_array[:, i], predictions[:, i])
-    
-    # Calculate accuracy within different tolerance levels
-    errors = np.abs(y_test_array[:, i] - predictions[:, i])
-    within_1 = np.sum(errors <= 1) / len(errors) * 100
-    within_2 = np.sum(errors <= 2) / len(errors) * 100
-    
     print(f"\n   {symptom.replace('_', ' ').title()}:")
-    print(f"     MAE: {mae:.2f}")
-    print(f"     R²: {r2:.3f}")
-    print(f"     Within 1 point: {within_1:.1f}%")
-    print(f"     Within 2 points: {within_2:.1f}%")
+    for label, preds in (('native', predictions), ('wrapped', wrapped_predictions)):
+        mae = mean_absolute_error(y_test_array[:, i], preds[:, i])
+        r2 = r2_score(y_test_array[:, i], preds[:, i])
+
+        # Calculate accuracy within different tolerance levels
+        errors = np.abs(y_test_array[:, i] - preds[:, i])
+        within_1 = np.sum(errors <= 1) / len(errors) * 100
+        within_2 = np.sum(errors <= 2) / len(errors) * 100
+
+        print(f"     {label:<8} MAE: {mae:.2f}  R²: {r2:.3f}  "
+              f"Within 1 point: {within_1:.1f}%  Within 2 points: {within_2:.1f}%")
 
 # Overall model performance
 overall_mae = mean_absolute_error(y_test_array, predictions)
 print(f"\n📊 Overall Performance:")
-print(f"   Average MAE across all symptoms: {overall_mae:.2f}")
-
-# Feature importance (from the first estimator as example)
+print(f"   Average MAE across all symptoms: {overall_mae:.2f} "
+      f"(per-symptom forests: {mean_absolute_error(y_test_array, wrapped_predictions):.2f})")
+
+# Inference cost and artifact size, through sklearn and through the flat-array
+# engine the API serves with
+print(f"\n⏱️ Inference and size (native | per-symptom forests):")
+single_row, batch = X_test[:1], X_test[:1000]
+for label, candidate in (('native', model), ('wrapped', wrapped_model)):
+    engine = CompiledForest.from_estimator(candidate)
+    engine._estimator = None    # time the engine alone, without its hand-off of large batches
+    timings = []
+    for predict, rows in ((candidate.predict, single_row), (engine.predict, single_row.to_numpy()),
+                          (candidate.predict, batch), (engine.predict, batch.to_numpy())):
+        predict(rows)
+        repeats = 20 if len(rows) == 1 else 3
+        start = time.perf_counter()
+        for _ in range(repeats):
+            predict(rows)
+        timings.append((time.perf_counter() - start) / repeats * 1000)
+    with tempfile.TemporaryDirectory() as tmp:
+        joblib.dump(candidate, os.path.join(tmp, 'model.pkl'))
+        pickle_mb = os.path.getsize(os.path.join(tmp, 'model.pkl')) / 1e6
+    print(f"   {label:<8} {engine.n_estimators} trees, {engine.n_nodes} nodes, pickle {pickle_mb:.1f} MB")
+    print(f"            1 row: sklearn {timings[0]:.2f} ms, engine {timings[1]:.3f} ms   "
+          f"{len(batch)} rows: sklearn {timings[2]:.1f} ms, engine {timings[3]:.1f} ms")
+
+# Feature importance
 feature_importance = pd.DataFrame({
     'feature': feature_columns,
-    'importance': model.estimators_[0].feature_importances_
+    'importance': model.feature_importances_
 }).sort_values('importance', ascending=False)
 
 print(f"\n🔍 Top 10 Most Important Features:")
@@ -300,29 +309,15 @@ def predict_daily_symptoms(
     model = joblib.load(model_path)
     
     # Create feature vector
-    features = np.array([[
-        current_cycle_day,
-        cycle_length,
-        menses_length,
-        max(0, current_cycle_day - 1),  # days_since_period_start
-        max(0, cycle_length - current_cycle_day),  # days_until_next_period
-        1 if current_cycle_day <= menses_length else 0,  # is_period_phase
-        1 if menses_length < current_cycle_day <= (cycle_length - 14 - 3) else 0,  # is_follicular_phase
-        1 if (cycle_length - 14 - 3) < current_cycle_day <= (cycle_length - 14 + 3) else 0,  # is_ovulation_phase
-        1 if (cycle_length - 14 + 3) < current_cycle_day <= (cycle_length - 5) else 0,  # is_luteal_phase
-        1 if current_cycle_day > (cycle_length - 5) else 0,  # is_pms_phase
-        min(current_cycle_day, menses_length) if current_cycle_day <= menses_length else 0,  # period_day
-        (min(current_cycle_day, menses_length) / menses_length) if current_cycle_day <= menses_length and menses_length > 0 else 0,  # period_day_normalized
-        age,
-        bmi,
-        pregnancies,
-        mean_bleeding_intensity,
-        current_cycle_day / cycle_length,  # cycle_day_ratio
-        abs(current_cycle_day - (cycle_length - 14)) / cycle_length,  # ovulation_proximity
-        1 if age < 20 else 0,  # is_teenager
-        1 if 20 <= age <= 35 else 0,  # is_adult
-        1 if age > 35 else 0  # is_older_adult
-    ]])
+    features = SYMPTOMS.row({
+        'cycle_day': current_cycle_day,
+        'cycle_length': cycle_length,
+        'menses_length': menses_length,
+        'age': age,
+        'bmi': bmi,
+        'pregnancies': pregnancies,
+        'mean_bleeding_intensity': mean_bleeding_intensity
+    })
     
     # Get predictions
     predictions = model.predict(features)[0]
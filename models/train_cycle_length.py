@@ -1,16 +1,22 @@
+import os
+import sys
 import pandas as pd
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, r2_score
 import joblib
 
+# Feature definitions shared with the serving code
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'luna-ml-api'))
+from features import CYCLE_LENGTH
+
 # Load the cleaned minimal dataset
 df = pd.read_csv("models/data/improved_cycle_length_model_data.csv")
 # Define features and target
-features = ['LengthofMenses', 'Age', 'BMI','EstimatedDayofOvulation','LengthofLutealPhase','TotalDaysofFertility']
+features = CYCLE_LENGTH.columns
 target = 'LengthofCycle'
 
-X = df[features]
+X = CYCLE_LENGTH.frame(df)
 y = df[target]
 
 # Train-test split
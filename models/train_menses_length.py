@@ -1,20 +1,20 @@
+import os
+import sys
 import pandas as pd
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, r2_score
 import joblib
 
+# Feature definitions shared with the serving code
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'luna-ml-api'))
+from features import MENSES_LENGTH
+
 # Load the cleaned dataset
 df = pd.read_csv("models/data/cleaned_menses_length_data2.csv")
 
 # Define features and target
-features = [
-    'Age',
-    'BMI',
-    'LengthofCycle',
-    'MeanBleedingIntensity',
-    'EstimatedDayofOvulation'
-]
+features = MENSES_LENGTH.columns
 target = 'LengthofMenses'
 
 # ✅ Clean up blank strings and missing values
@@ -22,7 +22,7 @@ df[features + [target]] = df[features + [target]].replace(r'^\s*$', pd.NA, regex
 df = df.dropna(subset=features + [target])
 
 # Prepare data
-X = df[features]
+X = MENSES_LENGTH.frame(df)
 y = df[target]
 
 # Split into train and test